@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批处理模式 - 无人值守地依次执行一组指令，用配置的策略代替交互确认，
+并将每个任务的结果、步骤数和耗时写入结果文件
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.wechat_guide_parser import get_wechat_guide
+from app.utils.tracing import start_trace_file
+from app.utils.metrics import start_metrics_exporters
+from app.utils.logger import get_logger
+from app.config import BATCH_MAX_STEPS, BATCH_POLICIES, TRACE_FILE
+
+# 获取日志记录器
+logger = get_logger()
+
+def policy_confirm(policies):
+    """
+    创建按策略自动确认的回调，代替交互模式下的用户输入
+
+    Args:
+        policies (dict): 事件 -> 自动继续的最大次数（None表示总是继续）
+
+    Returns:
+        callable: confirm(event, message) -> bool
+    """
+    counts = {}
+
+    def confirm(event, message):
+        limit = policies.get(event, 0)
+        counts[event] = counts.get(event, 0) + 1
+        decision = limit is None or counts[event] <= limit
+        logger.info(f"批处理策略确认 [{event}] 第{counts[event]}次: {message} -> {'继续' if decision else '停止'}")
+        print(f"{message} (批处理策略: {'继续' if decision else '停止'})")
+        return decision
+
+    return confirm
+
+def load_tasks(tasks_path):
+    """
+    读取任务列表。.jsonl文件每行一个JSON对象（至少包含instruction，可选operation_type、
+    max_steps、policies），其他文件每行一条指令，空行和#开头的行被忽略
+
+    Args:
+        tasks_path (str): 任务文件路径
+
+    Returns:
+        list: 任务字典列表
+    """
+    tasks = []
+    with open(tasks_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if tasks_path.endswith('.jsonl'):
+                try:
+                    task = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.error(f"任务文件第{line_no}行不是有效的JSON: {str(e)}")
+                    continue
+                if not task.get("instruction"):
+                    logger.error(f"任务文件第{line_no}行缺少instruction字段")
+                    continue
+            else:
+                task = {"instruction": line}
+            tasks.append(task)
+    logger.info(f"从 {tasks_path} 读取了 {len(tasks)} 个任务")
+    return tasks
+
+def run_batch(tasks, results_path, operation_type="mixed", max_steps=BATCH_MAX_STEPS, policies=None):
+    """
+    依次执行任务，每完成一个任务就把结果追加写入结果文件
+
+    Args:
+        tasks (list): 任务字典列表
+        results_path (str): 结果文件路径（JSONL）
+        operation_type (str): 默认操作方式
+        max_steps (int): 默认最大步骤数
+        policies (dict): 默认确认策略，任务中的policies会覆盖对应事件
+
+    Returns:
+        dict: 汇总信息，包含任务数、完成数、总步骤数和总耗时
+    """
+    # 只在真正执行任务时导入app.main（模型、语音、截图分析等模块），使只需要load_tasks等的进程
+    # （如任务池的调度进程）保持轻量
+    from app.main import run_task
+
+    policies = dict(BATCH_POLICIES if policies is None else policies)
+    wechat_guide = get_wechat_guide()
+    screenshots_dir = os.path.join(parent_dir, "screenshots")
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+
+    summary = {"tasks": len(tasks), "completed": 0, "steps": 0, "duration": 0.0}
+    start_time = time.time()
+
+    with open(results_path, 'a', encoding='utf-8') as results_file:
+        for index, task in enumerate(tasks, 1):
+            print(f"\n========== 批处理任务 {index}/{len(tasks)}: {task['instruction']} ==========")
+            logger.info(f"开始批处理任务 {index}/{len(tasks)}: {task['instruction']}")
+
+            task_policies = dict(policies, **task.get("policies", {}))
+            result = run_task(
+                task["instruction"],
+                task.get("operation_type", operation_type),
+                screenshots_dir,
+                wechat_guide,
+                confirm=policy_confirm(task_policies),
+                max_steps=task.get("max_steps", max_steps),
+                confirm_every=0
+            )
+            result["index"] = index
+            if "id" in task:
+                result["id"] = task["id"]
+
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results_file.flush()
+
+            summary["completed"] += int(result["stop_reason"] == "completed")
+            summary["steps"] += result["steps_executed"]
+            logger.info(f"批处理任务 {index} 结束: {result['stop_reason']}, {result['steps_executed']} 步, 耗时 {result['duration']}s")
+
+    summary["duration"] = round(time.time() - start_time, 3)
+    print(f"\n批处理结束: 共 {summary['tasks']} 个任务，完成 {summary['completed']} 个，"
+          f"共执行 {summary['steps']} 步，耗时 {summary['duration']} 秒")
+    print(f"结果已写入: {results_path}")
+    logger.info(f"批处理汇总: {summary}")
+    return summary
+
+def main(argv=None):
+    """
+    批处理命令行入口
+    """
+    parser = argparse.ArgumentParser(description="微信自动化助手批处理模式")
+    parser.add_argument("tasks", help="任务文件：每行一条指令，或.jsonl文件每行一个任务对象")
+    parser.add_argument("-o", "--output", default=os.path.join(parent_dir, "logs", "batch_results.jsonl"),
+                        help="结果文件路径（JSONL，追加写入）")
+    parser.add_argument("--operation-type", default="mixed", choices=["keyboard", "mouse", "mixed"],
+                        help="默认操作方式")
+    parser.add_argument("--max-steps", type=int, default=BATCH_MAX_STEPS, help="每个任务的默认最大步骤数")
+    args = parser.parse_args(argv)
+
+    if TRACE_FILE:
+        start_trace_file(TRACE_FILE)
+    start_metrics_exporters()
+    tasks = load_tasks(args.tasks)
+    if not tasks:
+        print("任务文件中没有可执行的任务")
+        return 1
+    run_batch(tasks, args.output, args.operation_type, args.max_steps)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""
+微信自动化助手 - 基准测试包
+"""
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+端到端基准测试 - 回放录制的会话：截图来自录制的画面（没有时使用合成画面），
+模型回复由本地替身服务按录制内容返回，键鼠操作交给null驱动，
+统计各阶段（截图、编码、保存、每轮模型调用、解析、执行、等待）的耗时、每个任务的步骤数和上传字节数
+
+会话目录结构:
+    tasks.txt         任务列表，格式同批处理模式
+    responses.jsonl   录制的模型回复（运行时设置MODEL_RECORD_PATH录制）
+    frames/*.png      录制的截图（可选，运行时screenshots目录中的截图）
+
+用法:
+    python -m app.bench.e2e [会话目录] [--repeat 3] [--json report.json] [--baseline old.json] [--trace trace.jsonl]
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+from collections import defaultdict
+
+from openai import OpenAI
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.main import run_task
+from app.bench.stub_server import ResponseStore, start_stub_server
+from app.batch import load_tasks, policy_confirm
+from app.models.model_router import set_client
+from app.controllers.input_drivers import NullDriver, set_input_driver
+from app.utils.capture_backends import ReplayCapture, SyntheticCapture, set_capture_backend
+from app.utils.speculation import TrajectoryStore, set_trajectory_store
+from app.utils.checkpoint import TaskJournal, set_task_journal
+from app.utils.wechat_guide_parser import get_wechat_guide
+from app.utils.tracing import add_sink, remove_sink, percentile, start_trace_file, stop_trace_file
+from app.utils.logger import get_logger
+from app.config import BATCH_MAX_STEPS, BATCH_POLICIES
+
+# 获取日志记录器
+logger = get_logger()
+
+DEFAULT_SESSION = os.path.join(current_dir, "sessions", "open_wechat")
+
+class StageCollector:
+    """
+    收集span的接收器，按阶段名称汇总耗时，并累计上传字节数和名义等待时间
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.bytes_sent = 0
+        self.nominal_sleep = 0.0
+
+    def __call__(self, span):
+        self.durations[span.name].append(span.duration)
+        self.bytes_sent += span.attrs.get("bytes_sent", 0)
+        if span.name == "sleep":
+            self.nominal_sleep += span.attrs.get("seconds", 0)
+
+    def summary(self):
+        """
+        Returns:
+            dict: 阶段名称 -> 次数、总耗时、平均、p50、p95（毫秒）
+        """
+        result = {}
+        for name, values in sorted(self.durations.items()):
+            result[name] = {
+                "count": len(values),
+                "total_ms": round(sum(values) * 1000, 3),
+                "mean_ms": round(sum(values) * 1000 / len(values), 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3)
+            }
+        return result
+
+def run_benchmark(session_dir=DEFAULT_SESSION, repeat=1, max_steps=BATCH_MAX_STEPS):
+    """
+    回放会话并统计各阶段耗时
+
+    Args:
+        session_dir (str): 会话目录
+        repeat (int): 重复回放次数
+        max_steps (int): 每个任务的最大步骤数
+
+    Returns:
+        dict: 基准测试报告
+    """
+    store = ResponseStore.load(os.path.join(session_dir, "responses.jsonl"))
+    tasks = load_tasks(os.path.join(session_dir, "tasks.txt"))
+    frames_dir = os.path.join(session_dir, "frames")
+
+    server = start_stub_server(store)
+    set_client(OpenAI(api_key="bench", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0))
+    set_capture_backend(ReplayCapture(frames_dir) if glob.glob(os.path.join(frames_dir, "*.png")) else SyntheticCapture())
+    set_input_driver(NullDriver())
+    wechat_guide = get_wechat_guide()
+
+    collector = StageCollector()
+    screenshots_dir = tempfile.mkdtemp(prefix="bench_screenshots_")
+    task_results = []
+    add_sink(collector)
+    start_time = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            store.reset()
+            # 录制回复按顺序回放，跳过模型调用会打乱顺序：每次回放使用空的内存轨迹缓存，
+            # 推测执行只计入准备和查找的开销，不会命中
+            set_trajectory_store(TrajectoryStore())
+            # 同理，未完成的任务不能从检查点恢复
+            set_task_journal(TaskJournal())
+            for task in tasks:
+                result = run_task(
+                    task["instruction"],
+                    task.get("operation_type", "mixed"),
+                    screenshots_dir,
+                    wechat_guide,
+                    confirm=policy_confirm(dict(BATCH_POLICIES, **task.get("policies", {}))),
+                    max_steps=task.get("max_steps", max_steps),
+                    confirm_every=0
+                )
+                task_results.append(result)
+    finally:
+        remove_sink(collector)
+        set_trajectory_store(None)
+        set_task_journal(None)
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(screenshots_dir, ignore_errors=True)
+    duration = time.perf_counter() - start_time
+
+    steps = sum(result["steps_executed"] for result in task_results)
+    return {
+        "session": os.path.basename(os.path.normpath(session_dir)),
+        "repeat": repeat,
+        "tasks": len(task_results),
+        "completed": sum(result["stop_reason"] == "completed" for result in task_results),
+        "steps": steps,
+        "steps_per_task": round(steps / len(task_results), 2) if task_results else 0.0,
+        "bytes_sent": collector.bytes_sent,
+        "bytes_per_step": round(collector.bytes_sent / steps) if steps else 0,
+        "nominal_sleep": round(collector.nominal_sleep, 3),
+        "duration": round(duration, 3),
+        "stages": collector.summary()
+    }
+
+def print_report(report, baseline=None):
+    """
+    打印基准测试报告，提供基准报告时显示各阶段平均耗时的变化
+    """
+    print(f"\n会话: {report['session']}  任务: {report['tasks']} (完成 {report['completed']})  "
+          f"步骤: {report['steps']} (每任务 {report['steps_per_task']})  耗时: {report['duration']}s")
+    print(f"上传: {report['bytes_sent']} 字节 (每步 {report['bytes_per_step']})  "
+          f"名义等待: {report['nominal_sleep']}s（null驱动未实际等待）\n")
+
+    header = f"{'阶段':<30}{'次数':>6}{'总计ms':>12}{'平均ms':>10}{'p50ms':>10}{'p95ms':>10}"
+    print(header + ("   变化" if baseline else ""))
+    for name, stage in report["stages"].items():
+        line = (f"{name:<30}{stage['count']:>6}{stage['total_ms']:>12.2f}{stage['mean_ms']:>10.3f}"
+                f"{stage['p50_ms']:>10.3f}{stage['p95_ms']:>10.3f}")
+        old = (baseline or {}).get("stages", {}).get(name)
+        if old and old["mean_ms"]:
+            line += f"   {(stage['mean_ms'] - old['mean_ms']) / old['mean_ms'] * 100:+.1f}%"
+        print(line)
+
+def main(argv=None):
+    """
+    端到端基准测试命令行入口
+    """
+    parser = argparse.ArgumentParser(description="端到端离线基准测试")
+    parser.add_argument("session", nargs="?", default=DEFAULT_SESSION, help="会话目录")
+    parser.add_argument("--repeat", type=int, default=1, help="重复回放次数")
+    parser.add_argument("--max-steps", type=int, default=BATCH_MAX_STEPS, help="每个任务的最大步骤数")
+    parser.add_argument("--json", help="把报告写入JSON文件")
+    parser.add_argument("--baseline", help="之前保存的JSON报告，用于对比")
+    parser.add_argument("--trace", help="同时把span写入JSONL追踪文件，可用 app.bench.trace_report 汇总")
+    args = parser.parse_args(argv)
+
+    trace_writer = start_trace_file(args.trace) if args.trace else None
+    try:
+        report = run_benchmark(args.session, args.repeat, args.max_steps)
+    finally:
+        if trace_writer:
+            stop_trace_file(trace_writer)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+压力测试 - 并发运行N个模拟的智能体会话，每个会话按步骤调用真实的多轮截图分析代码，
+请求发往本地模型替身服务（或指定的兼容服务），报告吞吐量和每步延迟的p50/p95/p99，
+用于在不访问DashScope的情况下调整并发数、超时和重试参数
+
+用法:
+    python -m app.bench.load --sessions 8 --steps 5 --latency lognormal:-0.7,0.4 --error-rate 0.02
+        [--rate-limit 20] [--stream] [--timeout 30] [--max-retries 2] [--base-url URL]
+"""
+
+import io
+import os
+import sys
+import time
+import base64
+import argparse
+import threading
+
+from openai import OpenAI
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.bench.stub_server import ResponseStore, start_stub_server, add_behavior_arguments, behavior_from_args
+from app.models import model_router
+from app.models.model_router import set_client, get_route_stats, reset_route_stats
+from app.models.qwen_interface import multi_round_image_analysis
+from app.utils.capture_backends import SyntheticCapture
+from app.utils.tracing import percentile
+from app.utils.logger import get_logger
+
+# 获取日志记录器
+logger = get_logger()
+
+DEFAULT_RESPONSES = os.path.join(current_dir, "sessions", "open_wechat", "responses.jsonl")
+
+def synthetic_frame():
+    """
+    生成一帧合成截图的base64数据
+    """
+    img_byte_arr = io.BytesIO()
+    SyntheticCapture().grab().save(img_byte_arr, format="PNG")
+    return base64.b64encode(img_byte_arr.getvalue()).decode("utf-8")
+
+def run_session(session_id, steps, image_data, latencies, errors, lock):
+    """
+    模拟一个智能体会话：按步骤进行多轮截图分析，记录每步耗时
+    """
+    task_context = {
+        "task": f"压力测试会话 {session_id}",
+        "operation_type": "mixed",
+        "method": "mixed",
+        "instruction": "搜索联系人张三并发送消息",
+        "steps_executed": 0,
+        "last_action": {},
+        "context": "",
+        "status": "进行中"
+    }
+    for _ in range(steps):
+        start = time.perf_counter()
+        analysis = multi_round_image_analysis(image_data, task_context)
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+            errors[0] += int("error" in analysis)
+        task_context["steps_executed"] += 1
+        steps_planned = analysis.get("steps") or []
+        task_context["last_action"] = steps_planned[0] if steps_planned else {}
+
+def run_load(sessions, steps, behavior=None, responses_path=DEFAULT_RESPONSES, base_url=None,
+             timeout=30.0, max_retries=2, stream=False):
+    """
+    运行压力测试
+
+    Args:
+        sessions (int): 并发会话数
+        steps (int): 每个会话的步骤数
+        behavior (StubBehavior): 本地替身服务的行为配置（指定base_url时不使用）
+        responses_path (str): 替身服务使用的录制回复
+        base_url (str): 已有的兼容服务地址，None表示在本进程中启动替身服务
+        timeout (float): 客户端请求超时（秒）
+        max_retries (int): 客户端最大重试次数
+        stream (bool): 是否使用流式调用
+
+    Returns:
+        dict: 压力测试报告
+    """
+    server = None
+    if base_url is None:
+        server = start_stub_server(ResponseStore.load(responses_path), behavior=behavior)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    set_client(OpenAI(api_key="bench", base_url=base_url, timeout=timeout, max_retries=max_retries))
+    # 流式开关是模块级配置，压力测试时按参数覆盖
+    model_router.MODEL_STREAMING = stream
+    reset_route_stats()
+
+    image_data = synthetic_frame()
+    latencies, errors, lock = [], [0], threading.Lock()
+    threads = [
+        threading.Thread(target=run_session, args=(i, steps, image_data, latencies, errors, lock), daemon=True)
+        for i in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    if server:
+        server.shutdown()
+        server.server_close()
+
+    route_stats = get_route_stats()
+    return {
+        "sessions": sessions,
+        "steps": len(latencies),
+        "step_errors": errors[0],
+        "duration": round(duration, 3),
+        "steps_per_second": round(len(latencies) / duration, 2) if duration else 0.0,
+        "requests": sum(stats["calls"] for stats in route_stats.values()),
+        "request_errors": sum(stats["errors"] for stats in route_stats.values()),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "ttft_avg_ms": {route: round(stats["ttft_avg"] * 1000, 1)
+                        for route, stats in route_stats.items() if stats["ttft_avg"] is not None},
+        "server": dict(behavior.stats) if server and behavior else None
+    }
+
+def main(argv=None):
+    """
+    压力测试命令行入口
+    """
+    parser = argparse.ArgumentParser(description="模型调用压力测试")
+    parser.add_argument("--sessions", type=int, default=8, help="并发会话数")
+    parser.add_argument("--steps", type=int, default=5, help="每个会话的步骤数")
+    parser.add_argument("--responses", default=DEFAULT_RESPONSES, help="替身服务使用的录制回复")
+    parser.add_argument("--base-url", default=None, help="已有的兼容服务地址，不指定时在本进程中启动替身服务")
+    parser.add_argument("--timeout", type=float, default=30.0, help="客户端请求超时（秒）")
+    parser.add_argument("--max-retries", type=int, default=2, help="客户端最大重试次数")
+    parser.add_argument("--stream", action="store_true", help="使用流式调用")
+    add_behavior_arguments(parser)
+    args = parser.parse_args(argv)
+
+    behavior = behavior_from_args(args)
+    report = run_load(args.sessions, args.steps, behavior, args.responses, args.base_url,
+                      args.timeout, args.max_retries, args.stream)
+
+    print(f"\n会话: {report['sessions']}  步骤: {report['steps']} (失败 {report['step_errors']})  "
+          f"耗时: {report['duration']}s  吞吐量: {report['steps_per_second']} 步/秒")
+    print(f"请求: {report['requests']} (失败 {report['request_errors']})  "
+          f"每步延迟 p50 {report['p50_ms']}ms  p95 {report['p95_ms']}ms  p99 {report['p99_ms']}ms")
+    if report["ttft_avg_ms"]:
+        print("平均首token延迟: " + ", ".join(f"{route} {ms}ms" for route, ms in report["ttft_avg_ms"].items()))
+    if report["server"]:
+        print(f"替身服务统计: {report['server']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
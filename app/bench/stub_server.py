@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模型替身服务 - 在本机实现与DashScope兼容模式相同的 /v1/chat/completions 接口，
+按请求对应的模型路由返回录制或编写好的回复，用于离线基准测试和压力测试，不需要访问真实模型。
+可以配置延迟分布、错误率、限流和流式响应，用来调整并发数、超时和重试参数
+
+用法:
+    python -m app.bench.stub_server responses.jsonl [--port 8766] [--latency lognormal:-0.7,0.4]
+        [--error-rate 0.02] [--rate-limit 20] [--chunk-delay 0.02]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.models import prompts
+from app.utils.logger import get_logger
+
+# 获取日志记录器
+logger = get_logger()
+
+FIELD_REPAIR_MARKER = "你上一次输出的JSON中以下字段存在问题"
+
+def _text(content):
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content or ""
+
+def classify_request(messages):
+    """
+    根据提示词判断请求对应的模型路由
+
+    Args:
+        messages (list): 请求中的对话消息
+
+    Returns:
+        str: 路由名称，无法识别时返回"unknown"
+    """
+    system = _text(messages[0]["content"]) if messages and messages[0]["role"] == "system" else ""
+    last_user = next((_text(m["content"]) for m in reversed(messages) if m["role"] == "user"), "")
+
+    if FIELD_REPAIR_MARKER in last_user:
+        return "field_repair"
+    if system == prompts.TEXT_PLANNING_SYSTEM:
+        return "text_planning"
+    if system == prompts.IMAGE_ANALYSIS_SYSTEM:
+        return "single_round_analysis"
+    if last_user.startswith(prompts.SCENE_PROMPT):
+        return "scene_classification"
+    if last_user.startswith(prompts.ELEMENTS_PROMPT.split("{")[0]):
+        return "element_localization"
+    if last_user.startswith(prompts.ACTION_PROMPT.split("{")[0]):
+        return "action_planning"
+    return "unknown"
+
+class ResponseStore:
+    """
+    录制的模型回复，按路由分组，每个路由的回复按录制顺序循环返回
+    """
+
+    def __init__(self, records=()):
+        self.records = defaultdict(list)
+        for record in records:
+            self.records[record["route"]].append(record)
+        self._next = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """
+        从JSONL录制文件加载（格式见model_router.record_response）
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            store = cls(json.loads(line) for line in f if line.strip())
+        logger.info(f"从 {path} 加载录制回复: " + ", ".join(f"{k} {len(v)}条" for k, v in store.records.items()))
+        return store
+
+    def next(self, route):
+        """
+        取出路由的下一条回复
+
+        Returns:
+            dict: 录制记录，该路由没有录制时返回None
+        """
+        with self._lock:
+            records = self.records.get(route)
+            if not records:
+                return None
+            record = records[self._next[route] % len(records)]
+            self._next[route] += 1
+            return record
+
+    def reset(self):
+        """
+        从头开始回放
+        """
+        with self._lock:
+            self._next.clear()
+
+def parse_latency(spec):
+    """
+    解析延迟分布配置（单位为秒）:
+        fixed:0.5             固定延迟
+        uniform:0.2,0.8       均匀分布
+        normal:0.6,0.1        正态分布（均值, 标准差），小于0时取0
+        lognormal:-0.7,0.4    对数正态分布（对数的均值, 标准差），贴近真实接口的长尾
+
+    Args:
+        spec (str): 延迟分布配置
+
+    Returns:
+        callable: sample(rng) -> 延迟秒数
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"无效的延迟分布配置: {spec}")
+
+class StubBehavior:
+    """
+    替身服务的行为配置：延迟分布、错误率、限流和流式输出的分块间隔
+    """
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, rate_limit=0.0, chunk_delay=0.0, seed=None):
+        """
+        Args:
+            latency (str): 首个token之前的延迟分布，见parse_latency
+            error_rate (float): 返回500错误的概率
+            rate_limit (float): 每秒允许的请求数，超过时返回429，0表示不限流
+            chunk_delay (float): 流式响应中相邻分块的间隔（秒）
+            seed (int): 随机数种子，便于复现
+        """
+        self.latency_spec = latency
+        self._sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.chunk_delay = chunk_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # 令牌桶限流，桶容量为1秒的请求数
+        self._tokens = max(rate_limit, 1.0)
+        self._refilled_at = time.monotonic()
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "streamed": 0}
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def sample_latency(self):
+        with self._lock:
+            return self._sample_latency(self._rng)
+
+    def should_fail(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def acquire(self):
+        """
+        从令牌桶中取一个令牌
+
+        Returns:
+            bool: 是否允许本次请求
+        """
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(max(self.rate_limit, 1.0), self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+def _usage_body(usage):
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+def completion_body(model, content, usage=None):
+    """
+    构建与OpenAI接口相同结构的响应体
+    """
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": _usage_body(usage)
+    }
+
+def chunk_body(completion_id, model, content=None, finish_reason=None, usage=None):
+    """
+    构建流式响应的一个分块
+    """
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage else [{"index": 0, "delta": {"content": content} if content else {},
+                                       "finish_reason": finish_reason}]
+    }
+    if usage:
+        body["usage"] = _usage_body(usage)
+    return body
+
+def make_handler(store, behavior=None):
+    """
+    创建绑定到录制回复和行为配置的HTTP请求处理类
+    """
+    behavior = behavior or StubBehavior()
+
+    class StubRequestHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "未知的接口"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            behavior.count("requests")
+
+            if not behavior.acquire():
+                behavior.count("rate_limited")
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                body = json.dumps({"error": {"message": "请求过于频繁", "code": "rate_limit"}}).encode("utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            route = classify_request(request.get("messages", []))
+            record = store.next(route)
+            if record is None:
+                logger.warning(f"替身服务没有路由 {route} 的录制回复")
+                behavior.count("errors")
+                self._send_json(500, {"error": {"message": f"没有路由 {route} 的录制回复"}})
+                return
+
+            time.sleep(behavior.sample_latency())
+            if behavior.should_fail():
+                behavior.count("errors")
+                self._send_json(500, {"error": {"message": "模拟的服务端错误", "code": "internal_error"}})
+                return
+
+            model = request.get("model", "")
+            if request.get("stream"):
+                behavior.count("streamed")
+                include_usage = (request.get("stream_options") or {}).get("include_usage")
+                self._send_stream(model, record["content"], record.get("usage") if include_usage else None)
+            else:
+                self._send_json(200, completion_body(model, record["content"], record.get("usage")))
+            behavior.count("ok")
+
+        def _send_stream(self, model, content, usage, chunks=8):
+            # 以SSE格式分块返回，最后一个分块之后可附带token用量
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            size = max(1, math.ceil(len(content) / chunks))
+            for start in range(0, len(content), size):
+                if start:
+                    time.sleep(behavior.chunk_delay)
+                self._send_event(chunk_body(completion_id, model, content[start:start + size]))
+            self._send_event(chunk_body(completion_id, model, finish_reason="stop"))
+            if usage:
+                self._send_event(chunk_body(completion_id, model, usage=usage))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _send_event(self, data):
+            self.wfile.write(b"data: " + json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            logger.debug(f"替身服务请求: {format % args}")
+
+    return StubRequestHandler
+
+def start_stub_server(store, host="127.0.0.1", port=0, behavior=None):
+    """
+    在后台线程中启动替身服务
+
+    Args:
+        store (ResponseStore): 录制的回复
+        host (str): 监听地址
+        port (int): 监听端口，0表示自动选择空闲端口
+        behavior (StubBehavior): 行为配置，默认无延迟、无错误、不限流
+
+    Returns:
+        ThreadingHTTPServer: 服务对象，base_url可由server_address得到，用完后调用shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(store, behavior))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"模型替身服务已启动: http://{host}:{server.server_address[1]}/v1")
+    return server
+
+def add_behavior_arguments(parser):
+    """
+    添加行为配置的命令行参数（替身服务和压力测试共用）
+    """
+    parser.add_argument("--latency", default="fixed:0", help="延迟分布，如 fixed:0.5、uniform:0.2,0.8、lognormal:-0.7,0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500错误的概率")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒允许的请求数，0表示不限流")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="流式响应分块间隔（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+
+def behavior_from_args(args):
+    return StubBehavior(args.latency, args.error_rate, args.rate_limit, args.chunk_delay, args.seed)
+
+def main(argv=None):
+    """
+    替身服务命令行入口
+    """
+    parser = argparse.ArgumentParser(description="本地模型替身服务")
+    parser.add_argument("responses", help="录制回复文件（JSONL）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8766, help="监听端口")
+    add_behavior_arguments(parser)
+    args = parser.parse_args(argv)
+
+    behavior = behavior_from_args(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(ResponseStore.load(args.responses), behavior))
+    print(f"模型替身服务已启动: http://{args.host}:{args.port}/v1 (设置QWEN_BASE_URL指向该地址)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"请求统计: {behavior.stats}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
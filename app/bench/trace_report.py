@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+追踪汇总 - 读取一个或多个运行时写出的JSONL追踪文件（设置TRACE_FILE生成），
+按阶段汇总所有运行的耗时百分位数，并把每个步骤的耗时拆分到各阶段，
+找出慢步骤的时间花在截图、编码、哪一轮模型调用、解析还是等待上
+
+每个span的"自身耗时"为其耗时减去直接子span的耗时，步骤内所有span的自身耗时之和等于步骤耗时，
+因此拆分结果不会重复计算嵌套的阶段
+
+用法:
+    python -m app.bench.trace_report logs/trace*.jsonl [--json summary.json]
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+from collections import defaultdict
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.tracing import percentile
+
+STEP_SPAN = "step"
+
+def load_spans(patterns):
+    """
+    读取追踪文件
+
+    Args:
+        patterns (list): 文件路径或通配符
+
+    Returns:
+        list: (运行名称, span字典) 列表，运行名称为文件名
+    """
+    spans = []
+    paths = sorted({path for pattern in patterns for path in (glob.glob(pattern) or [pattern])})
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append((os.path.basename(path), json.loads(line)))
+                except json.JSONDecodeError:
+                    # 进程被强制结束时最后一行可能不完整
+                    continue
+    return spans
+
+def self_times(records):
+    """
+    计算每个span的自身耗时（毫秒）：耗时减去直接子span的耗时
+    """
+    children = defaultdict(float)
+    for record in records:
+        if record.get("parent"):
+            children[record["parent"]] += record["duration_ms"]
+    return {record["span"]: max(record["duration_ms"] - children[record["span"]], 0.0) for record in records}
+
+def step_breakdown(records):
+    """
+    把每个步骤的耗时拆分到各阶段
+
+    Returns:
+        tuple: (步骤数, 阶段名称 -> 各步骤中该阶段自身耗时之和的列表)
+    """
+    by_id = {record["span"]: record for record in records}
+    own = self_times(records)
+    steps = {span_id for span_id, record in by_id.items() if record["name"] == STEP_SPAN}
+    per_step = defaultdict(lambda: defaultdict(float))
+
+    for span_id, record in by_id.items():
+        # 向上找到所属的步骤
+        node = record
+        while node is not None and node["name"] != STEP_SPAN:
+            node = by_id.get(node.get("parent"))
+        if node is None:
+            continue
+        stage = "(步骤自身)" if record["span"] == node["span"] else record["name"]
+        per_step[node["span"]][stage] += own[span_id]
+
+    names = {name for breakdown in per_step.values() for name in breakdown}
+    stages = defaultdict(list)
+    for step_id in steps:
+        breakdown = per_step.get(step_id, {})
+        for stage in names:
+            stages[stage].append(breakdown.get(stage, 0.0))
+    return len(steps), stages
+
+def summarize(spans):
+    """
+    汇总追踪记录
+
+    Args:
+        spans (list): load_spans的返回值
+
+    Returns:
+        dict: 运行列表、各阶段耗时百分位数、步骤耗时拆分和重试统计
+    """
+    records = [record for _, record in spans]
+    durations = defaultdict(list)
+    retries = defaultdict(int)
+    for record in records:
+        durations[record["name"]].append(record["duration_ms"])
+        retries[record["name"]] += record.get("attrs", {}).get("retries", 0) or 0
+
+    stages = {}
+    for name, values in sorted(durations.items()):
+        stages[name] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p90_ms": round(percentile(values, 90), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(max(values), 3),
+            "retries": retries[name]
+        }
+
+    step_count, breakdown = step_breakdown(records)
+    step_total = sum(durations.get(STEP_SPAN, []))
+    steps = {}
+    for stage, values in sorted(breakdown.items(), key=lambda item: -sum(item[1])):
+        steps[stage] = {
+            "mean_ms": round(sum(values) / step_count, 3) if step_count else 0.0,
+            "p95_ms": round(percentile(values, 95), 3),
+            "share": round(sum(values) / step_total, 4) if step_total else 0.0
+        }
+
+    return {
+        "runs": sorted({run for run, _ in spans}),
+        "tasks": len(durations.get("task", [])),
+        "steps": step_count,
+        "stages": stages,
+        "step_breakdown": steps
+    }
+
+def print_summary(summary):
+    """
+    打印追踪汇总
+    """
+    print(f"\n运行: {len(summary['runs'])}  任务: {summary['tasks']}  步骤: {summary['steps']}\n")
+    print(f"{'阶段':<30}{'次数':>7}{'平均ms':>10}{'p50ms':>10}{'p90ms':>10}{'p95ms':>10}{'p99ms':>10}{'最大ms':>10}{'重试':>6}")
+    for name, stage in summary["stages"].items():
+        print(f"{name:<30}{stage['count']:>7}{stage['mean_ms']:>10.2f}{stage['p50_ms']:>10.2f}{stage['p90_ms']:>10.2f}"
+              f"{stage['p95_ms']:>10.2f}{stage['p99_ms']:>10.2f}{stage['max_ms']:>10.2f}{stage['retries']:>6}")
+
+    if summary["step_breakdown"]:
+        print(f"\n每步耗时拆分\n{'阶段':<30}{'每步平均ms':>12}{'p95ms':>10}{'占比':>8}")
+        for name, stage in summary["step_breakdown"].items():
+            print(f"{name:<30}{stage['mean_ms']:>12.2f}{stage['p95_ms']:>10.2f}{stage['share']:>8.1%}")
+
+def main(argv=None):
+    """
+    追踪汇总命令行入口
+    """
+    parser = argparse.ArgumentParser(description="汇总JSONL追踪文件中各阶段的耗时")
+    parser.add_argument("traces", nargs="+", help="追踪文件路径或通配符，可指定多次运行的文件")
+    parser.add_argument("--json", help="把汇总结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.traces)
+    if not spans:
+        print("追踪文件中没有记录")
+        return 1
+    summary = summarize(spans)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
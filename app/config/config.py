@@ -9,10 +9,37 @@ load_dotenv()
 
 # API配置
 QWEN_API_KEY = os.environ.get("QWEN_API_KEY", "")
+QWEN_BASE_URL = os.environ.get("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 
 # 模型配置
 QWEN_MAX_MODEL = "qwen-max"
 QWEN_VL_MODEL = "qwen-vl-plus"
+QWEN_VL_LITE_MODEL = "qwen2.5-vl-3b-instruct"
+
+# 模型路由：每个子任务使用能胜任的最便宜模型和图像尺寸
+# image_max_side 为上传图像最长边的像素上限，None 表示原始分辨率（需要坐标的子任务必须使用原图）
+MODEL_ROUTES = {
+    "scene_classification": {"model": QWEN_VL_LITE_MODEL, "image_max_side": 768},
+    "element_localization": {"model": QWEN_VL_MODEL, "image_max_side": None},
+    "action_planning": {"model": QWEN_VL_MODEL, "image_max_side": None},
+    "single_round_analysis": {"model": QWEN_VL_MODEL, "image_max_side": None},
+    "field_repair": {"model": QWEN_VL_MODEL},
+    "text_planning": {"model": QWEN_MAX_MODEL},
+}
+
+# 模型单价（元/千tokens，依次为输入和输出），用于估算各路由的调用成本
+MODEL_PRICES = {
+    QWEN_MAX_MODEL: (0.0024, 0.0096),
+    QWEN_VL_MODEL: (0.0015, 0.0045),
+    QWEN_VL_LITE_MODEL: (0.0012, 0.0036),
+}
+CACHED_TOKEN_PRICE_RATIO = 0.4  # 命中服务端前缀缓存的输入token按该比例计价
+
+# 使用流式调用以测量首token延迟（TTFT），用于评估提示词前缀缓存的效果
+MODEL_STREAMING = os.environ.get("MODEL_STREAMING", "0") == "1"
+
+# 设置后把每次模型调用的路由和回复追加写入该JSONL文件，供离线基准测试回放
+MODEL_RECORD_PATH = os.environ.get("MODEL_RECORD_PATH", "")
 
 # 界面设置
 WINDOW_WIDTH = 800
@@ -21,16 +48,158 @@ WINDOW_TITLE = "微信自动化助手"
 
 # 语音识别设置
 SPEECH_LANG = "zh-CN"
+SPEECH_BACKEND = os.environ.get("SPEECH_BACKEND", "google")  # google（在线，说完后整段识别）/vosk（离线，流式输出部分结果）
+SPEECH_SAMPLE_RATE = 16000  # 麦克风采样率，vosk模型按16kHz训练
+SPEECH_CHUNK_SECONDS = 0.1  # 每次读取并送入识别器的音频长度（秒）
+SPEECH_CALIBRATION_SECONDS = 0.5  # 环境噪声校准录制的时长（秒）
+SPEECH_CALIBRATION_TTL = 300  # 噪声校准结果的有效期（秒），期间的识别不再重新校准
+SPEECH_ENERGY_RATIO = 1.5  # 语音能量阈值为环境噪声能量的倍数
+SPEECH_PAUSE_SECONDS = 0.8  # 说话后静音超过该时长视为说完
+SPEECH_PHRASE_LIMIT = 15  # 单次录音的最长时长（秒）
+SPEECH_STABLE_SECONDS = 0.6  # 部分识别结果持续不变超过该时长视为稳定，可以提前开始分析指令
+SPEECH_STABLE_MIN_CHARS = 4  # 稳定的部分识别结果至少包含的字符数
 
 # 其他通用设置
 DEFAULT_TIMEOUT = 30  # 超时时间（秒）
 DEFAULT_RETRY = 3  # 重试次数
 OPERATION_DELAY = 0.5  # 操作之间的默认延迟（秒）
+FIELD_REASK_MAX_ROUNDS = 1  # 分析结果字段有缺陷时，针对性追问的最大轮数
+GUIDE_TOKEN_BUDGET = 300  # 注入提示词的微信操作指南的token预算
+
+# 输入驱动配置
+INPUT_DRIVER = os.environ.get("INPUT_DRIVER", "pyautogui")  # pyautogui/xdotool/null，null不操作系统，用于基准测试
+INPUT_PAUSE = 1  # pyautogui每次操作之后的暂停（秒）
+NULL_DRIVER_SCREEN_SIZE = (1920, 1080)  # null驱动报告的屏幕尺寸
+
+# 批处理模式配置
+BATCH_MAX_STEPS = 15  # 每个任务的最大步骤数
+# 批处理时代替交互确认的策略：每个任务中该事件最多自动选择"继续"的次数，None表示总是继续，0表示直接停止
+BATCH_POLICIES = {
+    "env_not_ready": 1,  # 环境未就绪且无法返回桌面
+    "no_steps": 2,  # 分析结果中没有可执行的操作
+    "action_failed": 2,  # 操作执行失败
+    "checkpoint": None,  # 每隔几步的确认
+}
+
+# 本地任务服务配置
+SERVICE_HOST = "127.0.0.1"  # 只监听本机，桌面同一时间只能执行一个任务
+SERVICE_PORT = int(os.environ.get("SERVICE_PORT", "8765"))
+SERVICE_MAX_FINISHED_JOBS = 1000  # 内存中保留的已结束任务数
+
+# 多桌面并行执行配置（Linux，每个工作进程独占一个Xvfb虚拟显示器）
+POOL_WORKERS = int(os.environ.get("POOL_WORKERS", str(os.cpu_count() or 1)))  # 工作进程数
+POOL_DISPLAY_BASE = 90  # 第i个工作进程使用显示器 :POOL_DISPLAY_BASE+i
+POOL_SCREEN_SIZE = "1280x800x24"  # 虚拟显示器的 宽x高x色深
+POOL_XVFB_COMMAND = os.environ.get("POOL_XVFB_COMMAND", "Xvfb")
+POOL_TARGET_APP = os.environ.get("POOL_TARGET_APP", "")  # 每个显示器上启动的目标应用命令，为空时启动内置的替身窗口
+POOL_POLL_INTERVAL = 1.0  # 调度器等待结果的间隔（秒），每次等待超时后检查工作进程是否存活
+POOL_TASK_TIMEOUT = int(os.environ.get("POOL_TASK_TIMEOUT", "900"))  # 单个任务的最长执行时间（秒），超时结束该工作进程，0表示不限制
 
 # 日志配置
 LOG_LEVEL = "INFO"
 LOG_FILE = "wechat_assistant.log"
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "1") != "0"  # 日志通过队列交给后台线程写出，不在调用线程中做格式化和I/O
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", "500"))  # 日志中模型回复等大段文本的最大字符数，0表示不截断
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))  # 记录大段文本内容的比例，未抽中时只记录长度
+
+# 运行指标导出配置（Prometheus文本格式）
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # 大于0时在该端口提供 /metrics
+METRICS_FILE = os.environ.get("METRICS_FILE", "")  # 设置后定期把指标写入该文件
+METRICS_DUMP_INTERVAL = 15.0  # 写入指标文件的间隔（秒）
+TRACE_FILE = os.environ.get("TRACE_FILE", "")  # 设置后把任务、步骤和各阶段的span写入该JSONL文件
 
 # 路径配置
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-WECHAT_GUIDE_PATH = os.path.join(BASE_DIR, "WeChat.md") 
\ No newline at end of file
+WECHAT_GUIDE_PATH = os.path.join(BASE_DIR, "WeChat.md")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+WECHAT_GUIDE_CACHE_PATH = os.path.join(CACHE_DIR, "wechat_guide_index.json")  # 解析后的指南索引缓存
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", os.path.join(BASE_DIR, "models", "vosk-model-small-cn-0.22"))  # vosk离线语音模型目录
+
+# 截图后端配置
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "pil")  # pil/mss/replay/synthetic
+CAPTURE_REPLAY_DIR = os.environ.get("CAPTURE_REPLAY_DIR", os.path.join(BASE_DIR, "screenshots"))  # replay后端读取录制截图的目录
+CAPTURE_SYNTHETIC_SIZE = (1920, 1080)  # synthetic后端生成的画面尺寸
+
+# 性能剖析配置（run.py --profile）
+PROFILE_DIR = os.path.join(BASE_DIR, "logs", "profile")  # 剖析结果目录，每次运行一个子目录
+PROFILE_SAMPLE_INTERVAL = 0.005  # CPU采样间隔（秒）
+PROFILE_MEMORY_FRAMES = 1  # tracemalloc记录的调用栈深度
+PROFILE_TOP_N = 10  # 内存报告中每个阶段列出的分配位置数
+PROFILE_STAGE_SNAPSHOTS = 2  # 每个阶段前几次做tracemalloc快照以找出分配位置
+
+# 本地场景识别配置
+SCENE_REFERENCE_DIR = os.path.join(BASE_DIR, "scenes")  # 每个子目录为一个场景标签，存放该场景的参考截图
+SCENE_INDEX_PATH = os.path.join(SCENE_REFERENCE_DIR, "scene_index.npz")  # 预先计算的指纹索引
+SCENE_MATCH_THRESHOLD = 0.12  # 指纹距离低于该阈值时使用本地识别结果，跳过场景识别模型调用
+SCENE_LABELS = {
+    "desktop": {"description": "当前在Windows桌面，可以看到桌面图标和任务栏，没有应用窗口遮挡", "environment_ready": True},
+    "wechat_login": {"description": "当前最主要的界面是微信登录窗口，需要点击登录按钮进入微信", "environment_ready": True},
+    "wechat_main": {"description": "当前最主要的界面是微信主界面，左侧为会话列表，右侧为聊天窗口", "environment_ready": True},
+    "wechat_search": {"description": "当前最主要的界面是微信搜索界面，搜索框已激活并显示搜索结果", "environment_ready": True},
+} 
+
+# 推测执行配置：执行操作、等待界面稳定的同时，按预期的下一场景从轨迹缓存中准备下一步，
+# 截图与缓存中的画面一致时直接使用缓存的分析结果，不调用模型
+# 整屏指纹只反映布局和配色，内容不同的界面（如会话列表中的不同联系人）距离也可能很小，因此默认关闭；
+# 启用后，带坐标的操作还要求坐标周围的区域与缓存时逐像素一致
+SPECULATION_ENABLED = os.environ.get("SPECULATION_ENABLED", "0") == "1"
+TRAJECTORY_CACHE_PATH = os.environ.get("TRAJECTORY_CACHE_PATH", os.path.join(CACHE_DIR, "trajectories.jsonl"))
+SPECULATION_MATCH_THRESHOLD = 0.05  # 截图与缓存画面的指纹距离低于该阈值才使用缓存的分析结果（比场景识别严格）
+SPECULATION_REGION_SIZE = (160, 40)  # 带坐标的操作在坐标周围保存并比较的区域（宽, 高）
+SPECULATION_REGION_PIXEL_DIFF = 24  # 区域中灰度变化超过该值的像素视为不同
+SPECULATION_REGION_MAX_PIXELS = 2  # 区域中不同的像素超过该数量时不使用缓存的分析结果（名称只差一个字时也只有十几个像素不同）
+SPECULATION_MAX_ENTRIES = 3  # 每个轨迹位置（指令、已执行步骤数、上一步操作）最多缓存的画面数
+
+# 新消息监视配置（任务服务 --watch）：只采样会话列表区域，用像素差和颜色判断是否有新消息，有变化时才产生事件
+WATCHER_MODE = os.environ.get("WATCHER_MODE", "")  # operator: 记录事件供操作员查看（GET /events）；acknowledge: 提交自动回复任务；为空不监视
+WATCHER_INTERVAL = float(os.environ.get("WATCHER_INTERVAL", "1.0"))  # 采样间隔（秒）
+WATCHER_REGION = None  # 会话列表区域 (left, top, width, height)，None表示按屏幕尺寸估算（合成画面的布局：宽度1/18到1/4之间、搜索框以下）
+WATCHER_ROW_HEIGHT = 64  # 会话列表每行的高度（像素）
+WATCHER_SAMPLE_STRIDE = 2  # 每隔几个像素取一个，降低比较的开销
+WATCHER_BADGE_COLOR = (250, 81, 81)  # 未读角标的颜色（RGB）
+WATCHER_BADGE_TOLERANCE = 40  # 各通道与角标颜色的最大差值
+WATCHER_BADGE_MIN_PIXELS = 40  # 一行中至少有多少个（全分辨率）角标颜色的像素才认为有未读角标
+WATCHER_ROW_DIFF_THRESHOLD = 6.0  # 一行像素的平均变化超过该值认为该行内容变化
+WATCHER_MAX_EVENTS = 200  # 内存中保留的最近事件数
+WATCHER_ACK_MESSAGE = "收到，稍后回复"  # 自动回复的消息，按事件中记录的名称笔画重新找到该会话后发送
+WATCHER_ACK_PRIORITY = 10  # 自动回复任务的优先级
+WATCHER_ACK_DEADLINE = 300  # 自动回复任务的截止时间（秒），过期的回复不再执行
+
+# 确定性操作（app/controllers/skills.py）配置：按WeChat.md的键盘流程直接执行固定的操作序列，不调用模型
+SKILL_SEARCH_WAIT = 0.8  # 输入联系人后等待搜索结果的时间（秒）
+SKILL_OPEN_WAIT = 0.5  # 进入聊天后等待聊天窗口切换的时间（秒）
+SKILL_SEND_WAIT = 0.5  # 发送后等待消息出现在聊天记录中的时间（秒）
+SKILL_TYPE_INTERVAL = 0.0  # 输入文本时每个字符之间的间隔（秒），0表示整段输入
+SKILL_INPUT_REGION = None  # 聊天输入框区域 (left, top, width, height)，None表示按屏幕尺寸估算（合成画面的布局：宽度1/4以右、高度3/4以下）
+SKILL_VERIFY_PIXEL_DIFF = 32  # 像素任一通道变化超过该值认为该像素变化
+SKILL_VERIFY_MIN_PIXELS = 50  # 输入框中至少有多少个像素变化才认为输入了文本
+
+# 群发配置（python -m app.fanout）
+FANOUT_MAX_CONSECUTIVE_FAILURES = 3  # 连续多少个联系人发送失败（或未通过校验）后停止，避免界面异常时继续向错误的窗口输入
+FANOUT_PREPARE_INSTRUCTION = "打开微信，停留在微信主界面"  # --prepare 时群发开始前由模型执行一次的准备任务
+
+# 消息发送队列配置（任务服务 POST /messages）：同一联系人的消息合并后在一次打开的聊天中依次发送
+SEND_QUEUE_WINDOW = float(os.environ.get("SEND_QUEUE_WINDOW", "2.0"))  # 某个联系人的第一条消息到达后，等待多久再合并发送（秒）
+SEND_QUEUE_PRIORITY = 5  # 合并后的发送任务在任务队列中的默认优先级
+SEND_QUEUE_MAX_MESSAGES = 1000  # 内存中保留的已结束消息数
+
+# 联系人导航索引配置：记录联系人在会话列表中的行指纹，联系人可见时直接点击该行，跳过Ctrl+F搜索
+CONTACT_INDEX_ENABLED = os.environ.get("CONTACT_INDEX_ENABLED", "1") != "0"
+CONTACT_INDEX_PATH = os.environ.get("CONTACT_INDEX_PATH", os.path.join(CACHE_DIR, "contact_index.json"))
+CONTACT_ROW_KEY_BOX = (0.0, 0.0, 0.7, 0.55)  # 行中用于计算指纹的部分（相对行宽高的 左, 上, 右, 下），只取头像和名称，不含时间和消息预览
+CONTACT_MATCH_THRESHOLD = 0.12  # 粗筛：行的差值哈希与联系人的距离低于该阈值才逐像素比较笔画
+CONTACT_NAME_BOX = (0.23, 0.0, 0.7, 0.55)  # 行中名称的部分（相对行宽高），逐像素比较笔画，不含头像（头像的中间色调随选中背景变化）
+CONTACT_INK_LEVEL = 0.5  # 与背景的差值达到区域内最大差值的该比例的像素记为笔画，选中与未选中的背景得到相同的笔画
+CONTACT_MATCH_SHIFT = 1  # 比较笔画时允许的错位（像素）
+CONTACT_MATCH_MAX_PIXELS = 1  # 笔画最多有几个像素不同才认为是该联系人（"Bob"与"Rob"相差约10个像素）
+CONTACT_HEADER_REGION = None  # 聊天窗口标题区域 (left, top, width, height)，点击进入后与记录的标题比较，None表示按屏幕尺寸估算
+CONTACT_SELECTED_MIN_DIFF = 8.0  # 选中行的背景与其他行背景的平均差值至少为多少才认为识别到了选中行
+CONTACT_INDEX_MAX_ENTRIES = 500  # 最多记录的联系人数，超过时删除最久未使用的
+
+# 任务检查点配置：每一步把任务状态写入日志文件，进程中断后重新执行同一指令时从检查点恢复
+CHECKPOINT_ENABLED = os.environ.get("CHECKPOINT_ENABLED", "1") != "0"
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", os.path.join(CACHE_DIR, "task_journal.jsonl"))
+CHECKPOINT_MAX_AGE = 1800  # 超过该时长（秒）的检查点不再恢复
+CHECKPOINT_MATCH_THRESHOLD = 0.05  # 当前截图与检查点画面的指纹距离低于该阈值时直接使用检查点中的分析结果
+CHECKPOINT_SUMMARY_STEPS = 20  # 检查点中保留的最近已执行操作数
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+输入驱动 - 统一的键盘鼠标操作接口，可切换后端:
+    pyautogui  默认后端，跨平台
+    xdotool    X11下通过xdotool（XTest扩展）注入输入，不需要在进程内连接显示器
+    null       不操作系统，只记录操作并立即返回，用于无显示器环境下的基准测试和压力测试
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import threading
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.logger import get_logger
+from app.utils.tracing import span
+from app.config import INPUT_DRIVER, INPUT_PAUSE, NULL_DRIVER_SCREEN_SIZE
+
+# 获取日志记录器
+logger = get_logger()
+
+_driver = None
+_driver_lock = threading.Lock()
+
+class InputDriver:
+    """
+    输入驱动接口。按键名使用pyautogui的命名（如'enter'、'ctrl'、'win'），
+    坐标以屏幕左上角为原点
+    """
+
+    name = "base"
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        raise NotImplementedError
+
+    def write(self, text, interval=0.0):
+        raise NotImplementedError
+
+    def key_down(self, key):
+        raise NotImplementedError
+
+    def key_up(self, key):
+        raise NotImplementedError
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        raise NotImplementedError
+
+    def move(self, x, y, duration=0.0):
+        raise NotImplementedError
+
+    def drag(self, x, y, button="left", duration=0.0):
+        """
+        按住按钮从当前位置拖动到 (x, y)
+        """
+        raise NotImplementedError
+
+    def scroll(self, amount):
+        raise NotImplementedError
+
+    def position(self):
+        raise NotImplementedError
+
+    def size(self):
+        raise NotImplementedError
+
+    def wait(self, seconds):
+        """
+        等待界面响应。真实后端会休眠，null后端立即返回
+        """
+        if seconds > 0:
+            with span("sleep", seconds=seconds):
+                time.sleep(seconds)
+
+class PyAutoGUIDriver(InputDriver):
+    """
+    基于pyautogui的输入驱动
+    """
+
+    name = "pyautogui"
+
+    def __init__(self, pause=INPUT_PAUSE):
+        import pyautogui
+        self._gui = pyautogui
+        # 设置安全措施，避免失控（移动到屏幕角落会触发失败保护）
+        pyautogui.FAILSAFE = True
+        # 设置操作之间的延迟
+        pyautogui.PAUSE = pause
+
+    def press(self, key):
+        self._gui.press(key)
+
+    def hotkey(self, *keys):
+        self._gui.hotkey(*keys)
+
+    def write(self, text, interval=0.0):
+        self._gui.write(text, interval=interval)
+
+    def key_down(self, key):
+        self._gui.keyDown(key)
+
+    def key_up(self, key):
+        self._gui.keyUp(key)
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        self._gui.click(x=x, y=y, clicks=clicks, button=button)
+
+    def move(self, x, y, duration=0.0):
+        self._gui.moveTo(x, y, duration=duration)
+
+    def drag(self, x, y, button="left", duration=0.0):
+        self._gui.dragTo(x, y, duration=duration, button=button)
+
+    def scroll(self, amount):
+        self._gui.scroll(amount)
+
+    def position(self):
+        x, y = self._gui.position()
+        return x, y
+
+    def size(self):
+        width, height = self._gui.size()
+        return width, height
+
+class XdotoolDriver(InputDriver):
+    """
+    基于xdotool命令的输入驱动（X11），通过XTest扩展注入输入，使用当前的$DISPLAY
+    """
+
+    name = "xdotool"
+
+    # pyautogui按键名 -> X keysym
+    KEY_NAMES = {
+        "enter": "Return", "return": "Return", "esc": "Escape", "escape": "Escape",
+        "tab": "Tab", "space": "space", "backspace": "BackSpace", "delete": "Delete", "del": "Delete",
+        "up": "Up", "down": "Down", "left": "Left", "right": "Right",
+        "home": "Home", "end": "End", "pageup": "Prior", "pagedown": "Next", "insert": "Insert",
+        "ctrl": "ctrl", "ctrlleft": "Control_L", "ctrlright": "Control_R",
+        "alt": "alt", "altleft": "Alt_L", "altright": "Alt_R",
+        "shift": "shift", "shiftleft": "Shift_L", "shiftright": "Shift_R",
+        "win": "super", "winleft": "Super_L", "winright": "Super_R", "command": "super",
+        "capslock": "Caps_Lock", "printscreen": "Print",
+    }
+    BUTTONS = {"left": "1", "middle": "2", "right": "3"}
+
+    def __init__(self, command="xdotool"):
+        self.command = shutil.which(command)
+        if not self.command:
+            raise RuntimeError(f"找不到 {command} 命令")
+
+    def _run(self, *args):
+        completed = subprocess.run([self.command, *args], capture_output=True, text=True, check=True)
+        return completed.stdout
+
+    def _key(self, key):
+        key = str(key)
+        if key.lower() in self.KEY_NAMES:
+            return self.KEY_NAMES[key.lower()]
+        if len(key) > 1 and key[0] in "fF" and key[1:].isdigit():
+            return key.upper()
+        return key
+
+    def press(self, key):
+        self._run("key", "--clearmodifiers", self._key(key))
+
+    def hotkey(self, *keys):
+        self._run("key", "--clearmodifiers", "+".join(self._key(key) for key in keys))
+
+    def write(self, text, interval=0.0):
+        self._run("type", "--delay", str(int(interval * 1000)), "--", text)
+
+    def key_down(self, key):
+        self._run("keydown", self._key(key))
+
+    def key_up(self, key):
+        self._run("keyup", self._key(key))
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        # xdotool支持在一条命令中串联多个子命令
+        args = ["mousemove", str(int(x)), str(int(y))] if x is not None and y is not None else []
+        self._run(*args, "click", "--repeat", str(clicks), self.BUTTONS.get(button, "1"))
+
+    def move(self, x, y, duration=0.0):
+        self._run("mousemove", str(int(x)), str(int(y)))
+
+    def drag(self, x, y, button="left", duration=0.0):
+        button = self.BUTTONS.get(button, "1")
+        self._run("mousedown", button, "mousemove", str(int(x)), str(int(y)), "mouseup", button)
+
+    def scroll(self, amount):
+        # X11中按钮4为向上滚动，5为向下滚动，与pyautogui一致正数向上
+        if amount:
+            self._run("click", "--repeat", str(abs(int(amount))), "4" if amount > 0 else "5")
+
+    def position(self):
+        values = dict(line.split("=", 1) for line in self._run("getmouselocation", "--shell").split())
+        return int(values["X"]), int(values["Y"])
+
+    def size(self):
+        width, height = self._run("getdisplaygeometry").split()
+        return int(width), int(height)
+
+class NullDriver(InputDriver):
+    """
+    空输入驱动：不操作系统，只记录操作，所有等待立即返回。
+    actions中保存 (操作名, 参数) 记录，可用于检查执行了哪些操作
+    """
+
+    name = "null"
+
+    def __init__(self, screen_size=NULL_DRIVER_SCREEN_SIZE):
+        self.screen_size = tuple(screen_size)
+        self.actions = []
+        self.waited = 0.0
+        self._position = (self.screen_size[0] // 2, self.screen_size[1] // 2)
+
+    def _record(self, name, *args):
+        self.actions.append((name, args))
+
+    def press(self, key):
+        self._record("press", key)
+
+    def hotkey(self, *keys):
+        self._record("hotkey", *keys)
+
+    def write(self, text, interval=0.0):
+        self._record("write", text)
+
+    def key_down(self, key):
+        self._record("key_down", key)
+
+    def key_up(self, key):
+        self._record("key_up", key)
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        if x is not None and y is not None:
+            self._position = (x, y)
+        self._record("click", *self._position, button, clicks)
+
+    def move(self, x, y, duration=0.0):
+        self._position = (x, y)
+        self._record("move", x, y)
+
+    def drag(self, x, y, button="left", duration=0.0):
+        self._record("drag", *self._position, x, y, button)
+        self._position = (x, y)
+
+    def scroll(self, amount):
+        self._record("scroll", amount)
+
+    def position(self):
+        return self._position
+
+    def size(self):
+        return self.screen_size
+
+    def wait(self, seconds):
+        # 只累计等待时间，便于估算真实驱动下的耗时
+        self.waited += max(seconds, 0)
+        with span("sleep", seconds=seconds, skipped=True):
+            pass
+
+INPUT_DRIVERS = {
+    "pyautogui": PyAutoGUIDriver,
+    "xdotool": XdotoolDriver,
+    "null": NullDriver,
+}
+
+def create_input_driver(name):
+    """
+    创建输入驱动
+
+    Args:
+        name (str): 驱动名称，见INPUT_DRIVERS
+
+    Returns:
+        InputDriver: 输入驱动实例
+    """
+    if name not in INPUT_DRIVERS:
+        raise ValueError(f"未知的输入驱动: {name}，可选: {', '.join(INPUT_DRIVERS)}")
+    driver = INPUT_DRIVERS[name]()
+    logger.info(f"使用输入驱动: {name}")
+    return driver
+
+def get_input_driver():
+    """
+    获取当前进程使用的输入驱动（首次调用时按INPUT_DRIVER配置创建）
+
+    Returns:
+        InputDriver: 输入驱动实例
+    """
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = create_input_driver(INPUT_DRIVER)
+    return _driver
+
+def set_input_driver(driver):
+    """
+    替换当前进程使用的输入驱动
+
+    Args:
+        driver (InputDriver或str): 驱动实例或驱动名称
+
+    Returns:
+        InputDriver: 新的输入驱动
+    """
+    global _driver
+    with _driver_lock:
+        _driver = create_input_driver(driver) if isinstance(driver, str) else driver
+    return _driver
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+确定性操作（技能）- 按WeChat.md中的键盘流程直接执行固定的操作序列，不截图分析、不调用模型，
+用局部截图校验结果:
+    open_chat   联系人在会话列表中可见时直接点击该行并核对聊天窗口标题（见联系人导航索引），否则Ctrl+F搜索联系人，回车进入聊天
+    open_row    按名称的笔画在会话列表中找到某个会话（如未读会话）并点击进入
+    send_text   在输入框中输入消息并发送，校验输入框先出现文本、发送后恢复为空
+
+适合目标明确、界面流程固定的重复操作（如群发），每次只需几次键盘操作和几次区域截图
+"""
+
+import os
+import sys
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.controllers.action_executor import execute_action
+from app.controllers.input_drivers import get_input_driver
+from app.utils.capture_backends import get_capture_backend
+from app.utils.tracing import span
+from app.utils.metrics import counter
+from app.utils.logger import get_logger
+from app.config import (
+    SKILL_SEARCH_WAIT, SKILL_OPEN_WAIT, SKILL_SEND_WAIT, SKILL_TYPE_INTERVAL, SKILL_INPUT_REGION,
+    SKILL_VERIFY_PIXEL_DIFF, SKILL_VERIFY_MIN_PIXELS, CONTACT_INDEX_ENABLED
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+SKILL_RUNS = counter("wechat_skill_runs_total", "确定性操作的执行次数", ("skill", "outcome"))
+
+class SkillError(Exception):
+    """
+    确定性操作中的键盘鼠标操作执行失败
+    """
+
+def default_input_region(screen_size):
+    """
+    按屏幕尺寸估算聊天输入框区域
+
+    Args:
+        screen_size (tuple): (宽, 高)
+
+    Returns:
+        tuple: (left, top, width, height)
+    """
+    width, height = screen_size
+    left, top = width // 4, height * 3 // 4
+    return left, top, width - left, height - top
+
+def changed_pixels(before, after, pixel_diff=SKILL_VERIFY_PIXEL_DIFF):
+    """
+    统计两张同一区域截图中变化的像素数
+
+    Args:
+        before (PIL.Image.Image): 之前的截图
+        after (PIL.Image.Image): 之后的截图
+        pixel_diff (int): 任一通道变化超过该值认为像素变化
+
+    Returns:
+        int: 变化的像素数，尺寸不同时返回全部像素数
+    """
+    import numpy as np
+    a = np.asarray(before.convert("RGB"), dtype=np.int16)
+    b = np.asarray(after.convert("RGB"), dtype=np.int16)
+    if a.shape != b.shape:
+        return a.shape[0] * a.shape[1]
+    return int(np.count_nonzero((np.abs(a - b) > pixel_diff).any(axis=2)))
+
+def _run(action, driver):
+    # 不重试：重复输入或回车可能导致消息重复发送
+    if not execute_action(action, driver):
+        raise SkillError(f"操作失败: {action['description']}")
+
+class ChatSkills:
+    """
+    微信聊天的确定性操作
+
+    Args:
+        driver (InputDriver): 输入驱动，默认使用当前进程的输入驱动
+        input_region (tuple): 聊天输入框区域，None表示按配置或屏幕尺寸估算
+        verify (bool): 是否用输入框截图校验发送结果
+        use_index (bool): 是否使用联系人导航索引
+        contact_index (ContactIndex): 联系人导航索引，默认使用当前进程的索引
+    """
+
+    def __init__(self, driver=None, input_region=SKILL_INPUT_REGION, verify=True, use_index=CONTACT_INDEX_ENABLED,
+                 contact_index=None):
+        self.driver = driver or get_input_driver()
+        self.input_region = tuple(input_region) if input_region else None
+        self.verify = verify
+        self.use_index = use_index
+        self._contact_index = contact_index
+        # 当前聊天的联系人、进入方式（index/search），以及搜索进入后待学习的选中行指纹
+        self._opened = None
+        self._pending_learn = None
+
+    def _index(self):
+        if not self.use_index:
+            return None
+        if self._contact_index is None:
+            # 联系人导航索引依赖NumPy，只在第一次使用时导入
+            from app.utils.contact_index import get_contact_index
+            self._contact_index = get_contact_index()
+        return self._contact_index
+
+    def _open_from_list(self, recipient):
+        """
+        联系人在会话列表中可见时直接点击该行，并核对聊天窗口标题
+
+        Returns:
+            bool: 是否已点击进入；点击后选中的不是该行或标题与记录的不一致时返回False，由调用方改用搜索
+        """
+        index = self._index()
+        if index is None or recipient not in index.entries:
+            return False
+        try:
+            row = index.locate(recipient)
+            if row is None:
+                return False
+            x, y = index.row_center(row)
+            _run({"description": f"点击会话列表中的 {recipient}", "type": "mouse", "action": "click", "x": x, "y": y,
+                  "delay": SKILL_OPEN_WAIT}, self.driver)
+            selected = index.selected_row(index.capture_rows())
+            header_matched = index.verify_header(recipient)
+        except SkillError:
+            raise
+        except Exception as e:
+            logger.warning(f"按联系人导航索引进入聊天失败，改用搜索: {str(e)}")
+            return False
+        if selected is not None and selected != row:
+            logger.warning(f"点击第 {row + 1} 行后选中的是第 {selected + 1} 行，改用搜索进入与 {recipient} 的聊天")
+            return False
+        if not header_matched:
+            logger.warning(f"点击第 {row + 1} 行后聊天窗口标题与记录的不一致，改用搜索进入与 {recipient} 的聊天")
+            return False
+        return True
+
+    def _grab_input(self):
+        try:
+            backend = get_capture_backend()
+            if self.input_region is None:
+                self.input_region = default_input_region(backend.grab().size)
+                logger.info(f"聊天输入框区域: {self.input_region}")
+            return backend.grab(self.input_region)
+        except Exception as e:
+            raise SkillError(f"截取输入框失败: {str(e)}") from e
+
+    def open_chat(self, recipient):
+        """
+        进入与联系人的聊天：联系人在会话列表中可见时直接点击该行，否则通过Ctrl+F搜索
+
+        Args:
+            recipient (str): 联系人名称
+
+        Raises:
+            SkillError: 操作执行失败
+        """
+        with span("skill", skill="open_chat", recipient=recipient) as skill_span:
+            self._opened, self._pending_learn = None, None
+            try:
+                if self._open_from_list(recipient):
+                    self._opened = (recipient, "index")
+                    skill_span.set("via", "index")
+                    SKILL_RUNS.labels("open_chat", "ok").inc()
+                    return
+                _run({"description": "打开搜索", "type": "keyboard", "action": "hotkey", "value": "ctrl+f"},
+                     self.driver)
+                _run({"description": f"输入联系人 {recipient}", "type": "keyboard", "action": "write",
+                      "value": recipient, "interval": SKILL_TYPE_INTERVAL, "delay": SKILL_SEARCH_WAIT}, self.driver)
+                _run({"description": f"进入与 {recipient} 的聊天", "type": "keyboard", "action": "press",
+                      "value": "enter", "delay": SKILL_OPEN_WAIT}, self.driver)
+            except SkillError:
+                SKILL_RUNS.labels("open_chat", "failed").inc()
+                raise
+            self._opened = (recipient, "search")
+            skill_span.set("via", "search")
+            index = self._index()
+            if index is not None:
+                try:
+                    # 发送校验通过后才记录，确认进入的是正确的聊天
+                    self._pending_learn = index.selected_fingerprint()
+                except Exception as e:
+                    logger.warning(f"截取会话列表失败: {str(e)}")
+            SKILL_RUNS.labels("open_chat", "ok").inc()
+
+    def open_row(self, ink):
+        """
+        进入会话列表中名称笔画与ink一致的会话（如新消息监视记录的未读会话），
+        会话列表重新排序后按笔画重新查找，不按记录时的行号点击
+
+        Args:
+            ink (numpy.ndarray): 该行名称的笔画
+
+        Returns:
+            int: 点击的行号
+
+        Raises:
+            SkillError: 会话不在列表中、操作失败或点击后该行已不是这个会话
+        """
+        # 笔画比较依赖NumPy，只在第一次使用时导入
+        from app.utils.contact_index import get_contact_index, find_row
+        index = self._contact_index if self._contact_index is not None else get_contact_index()
+        with span("skill", skill="open_row") as skill_span:
+            self._opened, self._pending_learn = None, None
+            try:
+                row = find_row(ink, index.capture_rows())
+                if row is None:
+                    raise SkillError("会话列表中找不到该会话")
+                skill_span.set("row", row)
+                x, y = index.row_center(row)
+                _run({"description": f"点击会话列表第 {row + 1} 行", "type": "mouse", "action": "click",
+                      "x": x, "y": y, "delay": SKILL_OPEN_WAIT}, self.driver)
+                # 点击前后会话可能移动：点击后该行必须仍是这个会话，且是选中行（能识别时）
+                rows = index.capture_rows()
+                selected = index.selected_row(rows)
+                if find_row(ink, rows[row:row + 1]) is None or (selected is not None and selected != row):
+                    raise SkillError(f"点击第 {row + 1} 行后进入的不是该会话")
+            except SkillError:
+                SKILL_RUNS.labels("open_row", "failed").inc()
+                raise
+            SKILL_RUNS.labels("open_row", "ok").inc()
+            return row
+
+    def send_text(self, message):
+        """
+        在当前聊天中输入并发送消息
+
+        Args:
+            message (str): 消息内容
+
+        Returns:
+            bool: 是否通过校验（输入后输入框出现文本、发送后恢复原状）；不校验时返回None
+
+        Raises:
+            SkillError: 操作执行失败
+        """
+        with span("skill", skill="send_text") as skill_span:
+            try:
+                before = self._grab_input() if self.verify else None
+                _run({"description": "输入消息", "type": "keyboard", "action": "write", "value": message,
+                      "interval": SKILL_TYPE_INTERVAL, "delay": 0.1}, self.driver)
+                typed = self._grab_input() if self.verify else None
+                _run({"description": "发送消息", "type": "keyboard", "action": "press", "value": "enter",
+                      "delay": SKILL_SEND_WAIT}, self.driver)
+            except SkillError:
+                SKILL_RUNS.labels("send_text", "failed").inc()
+                raise
+            if not self.verify:
+                SKILL_RUNS.labels("send_text", "unverified").inc()
+                return None
+
+            typed_pixels = changed_pixels(before, typed)
+            left_pixels = changed_pixels(before, self._grab_input())
+            verified = typed_pixels >= SKILL_VERIFY_MIN_PIXELS and left_pixels < SKILL_VERIFY_MIN_PIXELS
+            skill_span.set("verified", verified)
+            if not verified:
+                logger.warning(f"发送校验未通过: 输入后变化 {typed_pixels} 像素，发送后仍有 {left_pixels} 像素与输入前不同")
+            self._update_index(verified)
+            SKILL_RUNS.labels("send_text", "ok" if verified else "unverified").inc()
+            return verified
+
+    def _update_index(self, verified):
+        # 搜索进入且发送校验通过时记录联系人的行指纹；点击进入但校验未通过时可能点错了行，删除该联系人的记录
+        index = self._index()
+        if index is None or self._opened is None:
+            return
+        recipient, via = self._opened
+        if verified and via == "search" and self._pending_learn is not None:
+            index.learn(recipient, *self._pending_learn)
+            self._pending_learn = None
+        elif not verified and via == "index":
+            logger.warning(f"点击会话列表进入与 {recipient} 的聊天后发送校验未通过，删除该联系人的导航记录")
+            index.forget(recipient)
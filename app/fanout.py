@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+群发 - 把同一条消息依次发送给一组联系人。操作流程只规划一次（WeChat.md中的键盘搜索流程），
+每个联系人直接执行 搜索 -> 进入聊天 -> 输入 -> 发送，用输入框的局部截图校验结果，
+不再为每个联系人单独分析指令和截图调用模型
+
+用法:
+    python -m app.fanout contacts.txt -m "周五下午三点开会" [-o results.jsonl]
+    python -m app.fanout --to 张三,李四 --message-file notice.txt --prepare
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.controllers.skills import ChatSkills, SkillError
+from app.utils.tracing import span, start_trace_file
+from app.utils.metrics import counter, histogram, start_metrics_exporters
+from app.utils.logger import get_logger
+from app.config import FANOUT_MAX_CONSECUTIVE_FAILURES, FANOUT_PREPARE_INSTRUCTION, BATCH_POLICIES, TRACE_FILE
+
+# 获取日志记录器
+logger = get_logger()
+
+FANOUT_RECIPIENTS = counter("wechat_fanout_recipients_total", "群发中处理的联系人数", ("status",))
+FANOUT_RECIPIENT_LATENCY = histogram("wechat_fanout_recipient_seconds", "群发中每个联系人的耗时")
+
+def load_recipients(path):
+    """
+    读取联系人列表，每行一个联系人，空行和#开头的行被忽略，重复的联系人只保留第一次
+
+    Args:
+        path (str): 联系人文件路径
+
+    Returns:
+        list: 联系人名称列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        names = [line.strip() for line in f]
+    return list(dict.fromkeys(name for name in names if name and not name.startswith('#')))
+
+def prepare_wechat():
+    """
+    群发开始前由模型执行一次准备任务（打开微信主界面），之后的联系人都不再调用模型
+
+    Returns:
+        bool: 准备任务是否完成
+    """
+    # 只有准备任务需要模型和截图分析，使用--prepare时才导入app.main
+    from app.main import run_task
+    from app.batch import policy_confirm
+    result = run_task(FANOUT_PREPARE_INSTRUCTION, "keyboard", confirm=policy_confirm(BATCH_POLICIES), confirm_every=0)
+    return result["stop_reason"] == "completed"
+
+def send_to(skills, recipient, message):
+    """
+    向一个联系人发送消息
+
+    Returns:
+        dict: {recipient, status, duration, error}，status为 sent（已发送并通过校验）、
+              unverified（已发送但未校验或校验未通过）、failed（操作失败）
+    """
+    start = time.perf_counter()
+    record = {"recipient": recipient, "status": None, "duration": 0.0, "error": None}
+    with span("recipient", recipient=recipient) as recipient_span:
+        try:
+            skills.open_chat(recipient)
+            verified = skills.send_text(message)
+            record["status"] = "sent" if verified else "unverified"
+        except SkillError as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+        except Exception as e:
+            # 截图、校验等意外错误只影响这个联系人，记为失败后继续群发
+            logger.error(f"向 {recipient} 发送消息时出错: {str(e)}")
+            record["status"] = "failed"
+            record["error"] = f"{type(e).__name__}: {str(e)}"
+        recipient_span.set("status", record["status"])
+    record["duration"] = round(time.perf_counter() - start, 3)
+    FANOUT_RECIPIENTS.labels(record["status"]).inc()
+    FANOUT_RECIPIENT_LATENCY.observe(record["duration"])
+    return record
+
+def run_fanout(recipients, message, results_path, verify=True, skills=None,
+               max_consecutive_failures=FANOUT_MAX_CONSECUTIVE_FAILURES):
+    """
+    依次向联系人发送同一条消息，每处理完一个联系人就把结果追加写入结果文件。
+    连续多个联系人失败（启用校验时包括未通过校验）时停止，剩余联系人记为skipped
+
+    Args:
+        recipients (list): 联系人名称列表
+        message (str): 消息内容
+        results_path (str): 结果文件路径（JSONL）
+        verify (bool): 是否校验发送结果
+        skills (ChatSkills): 确定性操作，默认按verify创建
+        max_consecutive_failures (int): 连续失败的上限，0表示不限制
+
+    Returns:
+        dict: 汇总信息，包含联系人数、各状态的数量、总耗时和每分钟处理的联系人数
+    """
+    skills = skills or ChatSkills(verify=verify)
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+
+    summary = {"recipients": len(recipients), "sent": 0, "unverified": 0, "failed": 0, "skipped": 0,
+               "duration": 0.0, "recipients_per_minute": 0.0}
+    consecutive_failures = 0
+    start_time = time.time()
+
+    with span("fanout", recipients=len(recipients)), open(results_path, 'a', encoding='utf-8') as results_file:
+        for index, recipient in enumerate(recipients, 1):
+            if max_consecutive_failures and consecutive_failures >= max_consecutive_failures:
+                record = {"recipient": recipient, "status": "skipped", "duration": 0.0,
+                          "error": f"连续 {consecutive_failures} 个联系人发送失败或未通过校验，已停止群发"}
+                FANOUT_RECIPIENTS.labels("skipped").inc()
+            else:
+                record = send_to(skills, recipient, message)
+                failed = record["status"] == "failed" or (verify and record["status"] == "unverified")
+                consecutive_failures = consecutive_failures + 1 if failed else 0
+                print(f"[{index}/{len(recipients)}] {recipient}: {record['status']} ({record['duration']}s)")
+            record["index"] = index
+            summary[record["status"]] += 1
+            results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results_file.flush()
+
+    summary["duration"] = round(time.time() - start_time, 3)
+    processed = summary["recipients"] - summary["skipped"]
+    if summary["duration"] > 0:
+        summary["recipients_per_minute"] = round(processed / summary["duration"] * 60, 1)
+    if summary["skipped"]:
+        logger.warning(f"连续 {max_consecutive_failures} 个联系人发送失败或未通过校验，跳过剩余 {summary['skipped']} 个联系人")
+    print(f"\n群发结束: 共 {summary['recipients']} 个联系人，已发送 {summary['sent']} 个，未校验 {summary['unverified']} 个，"
+          f"失败 {summary['failed']} 个，跳过 {summary['skipped']} 个，耗时 {summary['duration']} 秒，"
+          f"每分钟 {summary['recipients_per_minute']} 个联系人")
+    print(f"结果已写入: {results_path}")
+    logger.info(f"群发汇总: {summary}")
+    return summary
+
+def main(argv=None):
+    """
+    群发命令行入口
+    """
+    parser = argparse.ArgumentParser(description="微信自动化助手群发")
+    parser.add_argument("contacts", nargs="?", help="联系人文件，每行一个联系人")
+    parser.add_argument("--to", help="逗号分隔的联系人列表（代替联系人文件）")
+    message_group = parser.add_mutually_exclusive_group(required=True)
+    message_group.add_argument("-m", "--message", help="消息内容")
+    message_group.add_argument("--message-file", help="从文件读取消息内容")
+    parser.add_argument("-o", "--output", default=os.path.join(parent_dir, "logs", "fanout_results.jsonl"),
+                        help="结果文件路径（JSONL，追加写入）")
+    parser.add_argument("--prepare", action="store_true", help=f"开始前由模型执行一次准备任务：{FANOUT_PREPARE_INSTRUCTION}")
+    parser.add_argument("--no-verify", action="store_true", help="不截取输入框校验发送结果")
+    args = parser.parse_args(argv)
+
+    if args.to:
+        recipients = list(dict.fromkeys(name.strip() for name in args.to.split(",") if name.strip()))
+    elif args.contacts:
+        recipients = load_recipients(args.contacts)
+    else:
+        parser.error("需要联系人文件或 --to")
+    if args.message_file:
+        with open(args.message_file, 'r', encoding='utf-8') as f:
+            message = f.read().strip()
+    else:
+        message = args.message.strip()
+    if not recipients or not message:
+        print("没有联系人或消息内容为空")
+        return 1
+
+    if TRACE_FILE:
+        start_trace_file(TRACE_FILE)
+    start_metrics_exporters()
+    if args.prepare and not prepare_wechat():
+        print("准备任务未完成，已停止群发")
+        return 1
+    summary = run_fanout(recipients, message, args.output, verify=not args.no_verify)
+    return 0 if summary["failed"] == 0 and summary["skipped"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
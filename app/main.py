@@ -5,7 +5,6 @@ import os
 import time
 import sys
 import base64
-from datetime import datetime
 import traceback
 
 # 将项目根目录添加到Python路径
@@ -13,21 +12,30 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from app.utils.voice_recognition import recognize_speech
-from app.utils.screen_capture import capture_screen, save_screen_capture, get_screen_capture
-from app.utils.input_control import perform_keyboard_action, perform_mouse_action
-from app.models.qwen_interface import analyze_text, analyze_image, multi_round_image_analysis
-from app.utils.wechat_guide_parser import get_wechat_guide
+from app.utils.screen_capture import capture_screen
+from app.utils.voice_recognition import recognize_speech, EarlyStart
+from app.models.qwen_interface import analyze_text, analyze_image, multi_round_image_analysis, executable_steps
+from app.models.model_router import get_route_stats
+from app.utils.wechat_guide_parser import get_wechat_guide, select_guide_sections
 from app.utils.logger import get_logger
-from app.controllers.action_executor import execute_action
-import pyautogui
+from app.controllers.action_executor import execute_action, is_failsafe_error, FAILSAFE_TRIGGERS
+from app.controllers.input_drivers import get_input_driver
+from app.utils.speculation import Speculator, get_trajectory_store
+from app.utils.checkpoint import get_task_journal, checkpoint_matches
+from app.utils.tracing import span, start_trace_file
+from app.utils.metrics import counter, histogram, start_metrics_exporters
+from app.config import TRACE_FILE
 
 # 获取日志记录器
 logger = get_logger()
 
-# 设置PyAutoGUI安全参数
-pyautogui.PAUSE = 1  # 每次操作之间暂停1秒
-pyautogui.FAILSAFE = True  # 保持故障安全机制开启
+STEP_LATENCY = histogram("wechat_step_seconds", "每轮循环（截图、分析、执行）的耗时")
+ACTION_RETRIES = counter("wechat_action_retries_total", "safe_execute_action的重试次数")
+ACTIONS = counter("wechat_actions_total", "safe_execute_action执行的操作次数", ("outcome",))
+TASKS = counter("wechat_tasks_total", "结束的任务数", ("stop_reason",))
+
+# 以这些原因结束的任务保留检查点，交互模式中再次输入同一指令时可以选择从检查点恢复
+RESUMABLE_STOP_REASONS = ("error", "analysis_failed", "screenshot_failed")
 
 def save_base64_image(base64_string, file_path="screenshot.png"):
     """
@@ -71,7 +79,8 @@ def get_screenshot(screenshots_dir):
             os.makedirs(screenshots_dir)
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         screenshot_path = os.path.join(screenshots_dir, f"screenshot_{timestamp}.png")
-        save_base64_image(img_base64, screenshot_path)
+        with span("save"):
+            save_base64_image(img_base64, screenshot_path)
         return img_base64, screenshot_path
     except Exception as e:
         logger.error(f"截图失败: {str(e)}")
@@ -89,8 +98,19 @@ def safe_execute_action(action, task_context=None):
     Returns:
         bool: 操作是否成功
     """
+    with span("action", action=action.get("action"), description=action.get("description")) as action_span:
+        success = _execute_with_retries(action, action_span)
+        action_span.set("success", success)
+        ACTIONS.labels("ok" if success else "failed").inc()
+        return success
+
+def _execute_with_retries(action, action_span):
+    """
+    执行操作，失败时逐渐增加等待时间重试，重试次数记录到action_span
+    """
     max_attempts = 3
     attempts = 0
+    driver = get_input_driver()
     
     while attempts < max_attempts:
         try:
@@ -98,36 +118,39 @@ def safe_execute_action(action, task_context=None):
             print(f"执行操作: {action['description']}")
             
             # 添加小延迟
-            time.sleep(0.5)
+            driver.wait(0.5)
             
             # 检查是否为返回桌面的快捷操作
             if action.get('action') == 'hotkey' and action.get('value') == 'win+d':
                 logger.info("执行返回桌面操作 (Win+D)")
-                pyautogui.hotkey('win', 'd')
-                time.sleep(1)  # 等待动画完成
+                driver.hotkey('win', 'd')
+                driver.wait(1)  # 等待动画完成
                 return True
                 
             # 普通操作执行
-            execute_action(action)
+            execute_action(action, driver)
             logger.info(f"操作执行完成: {action['description']}")
             print(f"操作执行完成")
             
             # 等待操作结果显示
-            time.sleep(1.5)
+            driver.wait(1.5)
             return True
             
         except Exception as e:
             attempts += 1
+            action_span.set("retries", attempts)
+            ACTION_RETRIES.inc()
             error_msg = str(e)
             logger.error(f"执行操作失败 (尝试 {attempts}/{max_attempts}): {error_msg}")
             
             # 检查是否是PyAutoGUI的FAILSAFE错误
-            if "PyAutoGUI fail-safe triggered" in error_msg:
+            if is_failsafe_error(e):
+                FAILSAFE_TRIGGERS.inc()
                 logger.warning("检测到PyAutoGUI安全机制触发，尝试恢复鼠标位置")
                 try:
                     # 将鼠标移动到屏幕中心，避免触发FAILSAFE
-                    screen_width, screen_height = pyautogui.size()
-                    pyautogui.moveTo(screen_width/2, screen_height/2, duration=0.5)
+                    screen_width, screen_height = driver.size()
+                    driver.move(screen_width/2, screen_height/2, duration=0.5)
                     print("已将鼠标移回屏幕中心")
                 except Exception as move_err:
                     logger.error(f"移动鼠标失败: {str(move_err)}")
@@ -137,7 +160,7 @@ def safe_execute_action(action, task_context=None):
                 wait_time = attempts * 1.5  # 逐渐增加等待时间
                 logger.info(f"等待 {wait_time} 秒后重试")
                 print(f"操作失败，等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
+                driver.wait(wait_time)
             else:
                 print(f"执行操作失败: {error_msg}")
                 print("已达到最大重试次数，跳过此操作")
@@ -147,7 +170,7 @@ def safe_execute_action(action, task_context=None):
                     print("尝试使用替代方法显示桌面...")
                     try:
                         # 尝试使用Win+M最小化所有窗口
-                        pyautogui.hotkey('win', 'm')
+                        driver.hotkey('win', 'm')
                         return True
                     except Exception as alt_err:
                         logger.error(f"替代方法也失败: {str(alt_err)}")
@@ -177,94 +200,178 @@ def is_desktop_task(task):
     # 如果任务包含这些关键词，可能需要从桌面开始
     return any(keyword in task for keyword in desktop_keywords)
 
-def main():
+def ask_user(event, message):
     """
-    微信助手主程序，控制整个流程
+    交互模式下的确认方式：打印提示并询问用户是否继续
+    
+    Args:
+        event (str): 需要确认的事件，见run_task
+        message (str): 提示信息
+        
+    Returns:
+        bool: 用户是否选择继续
     """
-    logger.info("微信自动化助手启动")
-    print("欢迎使用微信自动化助手")
+    print(message)
+    return input("输入'y'继续，其他退出: ").lower() == 'y'
+
+def run_task(user_input, operation_type="mixed", screenshots_dir=None, wechat_guide=None,
+             confirm=ask_user, max_steps=15, confirm_every=3, text_analysis=None, resume=False):
+    """
+    执行一个任务：分析指令，然后循环截图、分析界面、执行下一步操作，直到任务完成或停止
     
-    # 创建截图保存目录
-    screenshots_dir = os.path.join(parent_dir, "screenshots")
+    需要人工决定的地方通过confirm回调处理，事件包括:
+        env_not_ready  - 环境未就绪且无法返回桌面，是否仍继续
+        no_steps       - 分析结果中没有可执行的操作，是否重新分析
+        action_failed  - 操作执行失败，是否继续任务
+        checkpoint     - 每执行confirm_every步，是否继续
+    
+    Args:
+        user_input (str): 用户指令
+        operation_type (str): 操作方式 keyboard/mouse/mixed
+        screenshots_dir (str): 截图保存目录
+        wechat_guide (dict): 微信操作指南
+        confirm (callable): confirm(event, message) -> bool，返回是否继续
+        max_steps (int): 最大步骤数，防止无限循环
+        confirm_every (int): 每执行多少步确认一次，0表示不确认
+        text_analysis (dict): 已完成的指令分析结果（如语音输入时提前分析的结果），None表示由本函数分析
+        resume (bool): 是否从同一指令未完成的检查点恢复。只有明确重新执行中断的任务时才设置
+                       （交互模式中由用户确认）；服务、批处理等提交的同一指令是新的任务，不恢复
+        
+    Returns:
+        dict: 任务结果，包含 instruction、task、status、stop_reason、steps_executed、
+              step_count、rounds、duration、error
+    """
+    with span("task", instruction=user_input, operation_type=operation_type) as task_span:
+        result = _run_task(user_input, operation_type, screenshots_dir, wechat_guide, confirm, max_steps, confirm_every,
+                           text_analysis, resume)
+        task_span.set("stop_reason", result["stop_reason"])
+        task_span.set("steps_executed", result["steps_executed"])
+        TASKS.labels(result["stop_reason"]).inc()
+        return result
+
+def _run_task(user_input, operation_type, screenshots_dir, wechat_guide, confirm, max_steps, confirm_every, text_analysis,
+              resume):
+    """
+    run_task的实现，参数和返回值见run_task
+    """
+    if screenshots_dir is None:
+        screenshots_dir = os.path.join(parent_dir, "screenshots")
     os.makedirs(screenshots_dir, exist_ok=True)
     
-    task_completed = False
+    start_time = time.time()
+    result = {
+        "instruction": user_input,
+        "task": user_input,
+        "status": "进行中",
+        "stop_reason": None,
+        "steps_executed": 0,
+        "step_count": 0,
+        "rounds": 0,
+        "duration": 0.0,
+        "error": None
+    }
     
-    while not task_completed:
-        # 1. 获取用户输入（语音或文字）
-        user_input = input("请输入您的指令（输入'exit'退出）: ")
-        logger.info(f"用户输入: {user_input}")
+    # 3. 初始化任务上下文
+    task_context = {
+        "task": user_input,
+        "operation_type": operation_type,
+        "method": operation_type,
+        "instruction": user_input,
+        "steps_executed": 0,
+        "last_action": {},
+        "context": "",
+        "guide": select_guide_sections(wechat_guide, user_input, operation_type),
+        "summary": [],
+        "status": "进行中"
+    }
+    step_count = 0
+    rounds = 0
+    
+    # 每一步的状态写入检查点日志；明确要求恢复时从同一指令上次中断处继续，不再重新分析指令，
+    # 否则是新的任务，开始时覆盖旧的检查点
+    journal = get_task_journal()
+    checkpoint = journal.resume(user_input, operation_type) if journal and resume and text_analysis is None else None
+    
+    try:
+        # 4. 初始文本分析
+        if checkpoint is not None:
+            logger.info(f"从检查点恢复任务: 已执行 {checkpoint['steps_executed']} 步")
+            print(f"从上次中断处恢复任务（已执行 {checkpoint['steps_executed']} 步）")
+            text_analysis = checkpoint["text_analysis"]
+            task_context["steps_executed"] = checkpoint["steps_executed"]
+            task_context["last_action"] = checkpoint["last_action"]
+            task_context["summary"] = checkpoint.get("summary", [])
+            if checkpoint.get("in_flight"):
+                # 中断时该操作可能已执行也可能没有，交给模型按当前界面判断，避免重复输入或发送
+                task_context["summary"].append(f"{checkpoint['in_flight'].get('description', '')}（中断时正在执行，可能已完成）")
+            # 中断前执行的步骤计入最大步骤数，反复中断恢复的任务不会无限执行下去
+            step_count = checkpoint["steps_executed"]
+        elif text_analysis is None:
+            logger.info(f"开始分析用户输入: {user_input}")
+            print("正在分析您的指令...")
+            text_analysis = analyze_text(user_input, wechat_guide, operation_type)
         
-        if user_input.lower() == 'exit':
-            logger.info("用户选择退出程序")
-            task_completed = True
-            continue
+        if "error" in text_analysis:
+            logger.error(f"文本分析失败: {text_analysis['error']}")
+            print(f"分析指令时出错: {text_analysis['error']}")
+            result["stop_reason"] = "analysis_failed"
+            result["error"] = text_analysis["error"]
+            return result
         
-        # 2. 确定操作类型
-        print("请选择操作方式:")
-        print("1. 键盘操作")
-        print("2. 鼠标操作")
-        print("3. 混合操作 (默认)")
-        operation_choice = input("请选择 (1/2/3): ").strip()
+        # 更新任务上下文
+        task_context["task"] = text_analysis.get("task", user_input)
+        task_context["context"] = text_analysis.get("context", "")
+        result["task"] = task_context["task"]
+        if journal and checkpoint is None:
+            journal.start(user_input, operation_type, text_analysis)
         
-        if operation_choice == '1':
-            operation_type = "keyboard"
-        elif operation_choice == '2':
-            operation_type = "mouse"
-        else:
-            operation_type = "mixed"
+        logger.info(f"文本分析完成: {task_context['task']}")
+        print(f"任务: {task_context['task']}")
         
-        print(f"已选择: {operation_type} 操作方式")
+        # 5. 开始执行循环
+        # 返回桌面、重新分析等不计入步骤数的轮次也需要上限
+        max_rounds = max_steps * 2
+        # 按轨迹缓存推测下一步，界面与缓存一致时跳过模型分析
+        speculator = Speculator(get_trajectory_store())
         
-        try:
-            # 3. 初始化任务上下文
-            task_context = {
-                "task": user_input,
-                "operation_type": operation_type,
-                "method": operation_type,
-                "instruction": user_input,
-                "steps_executed": 0,
-                "last_action": {},
-                "context": "",
-                "status": "进行中"
-            }
-            
-            # 4. 初始文本分析
-            logger.info(f"开始分析用户输入: {user_input}")
-            print("正在分析您的指令...")
-            text_analysis = analyze_text(user_input)
-            
-            if "error" in text_analysis:
-                logger.error(f"文本分析失败: {text_analysis['error']}")
-                print(f"分析指令时出错: {text_analysis['error']}")
-                continue
-            
-            # 更新任务上下文
-            task_context["task"] = text_analysis.get("task", user_input)
-            task_context["context"] = text_analysis.get("context", "")
+        while step_count < max_steps and rounds < max_rounds and task_context["status"] == "进行中":
+            rounds += 1
             
-            logger.info(f"文本分析完成: {task_context['task']}")
-            print(f"任务: {task_context['task']}")
-            
-            # 5. 开始执行循环
-            max_steps = 15  # 最大步骤数，防止无限循环
-            step_count = 0
-            
-            while step_count < max_steps and task_context["status"] == "进行中":
+            with span("step", round=rounds, step=step_count + 1) as step_span, STEP_LATENCY.time():
                 # 5.1 获取当前屏幕截图
                 print("\n第 " + str(step_count + 1) + " 轮循环")
                 print("获取当前界面...")
                 img_base64, screenshot_path = get_screenshot(screenshots_dir)
                 if not img_base64:
                     print("无法获取屏幕截图，操作中止")
+                    result["stop_reason"] = "screenshot_failed"
                     break
-                
+            
                 print(f"已获取屏幕截图: {screenshot_path}")
-                
-                # 5.2 使用多轮对话分析当前屏幕，规划下一步操作
-                print("使用多轮对话分析当前界面...")
-                image_analysis = multi_round_image_analysis(img_base64, task_context)
-                
+            
+                fingerprint = None
+                if journal:
+                    from app.utils.scene_index import compute_fingerprint
+                    from app.utils.screen_capture import get_frame_image
+                    fingerprint = compute_fingerprint(get_frame_image(img_base64))
+            
+                # 5.2 使用多轮对话分析当前屏幕，规划下一步操作（界面与检查点或轨迹缓存一致时直接使用保存的结果）
+                image_analysis = None
+                if checkpoint is not None:
+                    if checkpoint_matches(checkpoint, fingerprint):
+                        print("界面与检查点一致，使用中断前的分析结果")
+                        image_analysis = dict(checkpoint["analysis"], resumed=True)
+                        step_span.set("resumed", True)
+                    checkpoint = None
+                if image_analysis is None:
+                    image_analysis = speculator.lookup(img_base64, task_context)
+                if image_analysis is None:
+                    print("使用多轮对话分析当前界面...")
+                    image_analysis = multi_round_image_analysis(img_base64, task_context)
+                elif image_analysis.get("speculative"):
+                    print("界面与轨迹缓存一致，使用预先准备的分析结果")
+                step_span.set("speculative", bool(image_analysis.get("speculative")))
+            
                 if "error" in image_analysis:
                     logger.error(f"图像多轮分析失败: {image_analysis['error']}")
                     print(f"分析界面时出错: {image_analysis['error']}")
@@ -273,70 +380,74 @@ def main():
                     image_analysis = analyze_image(img_base64, task_context)
                     if "error" in image_analysis:
                         print(f"备选分析也失败: {image_analysis['error']}")
+                        result["stop_reason"] = "analysis_failed"
+                        result["error"] = image_analysis["error"]
                         break
-                
+            
                 # 显示多轮对话分析结果
                 print("\n------ 多轮对话分析结果 ------")
-                
+            
                 # 显示当前场景
                 current_scene = image_analysis.get("current_scene", "未提供场景描述")
                 print(f"当前场景: {current_scene}")
-                
+            
                 # 显示环境状态
                 env_ready = image_analysis.get("environment_ready", False)
                 print(f"环境就绪状态: {'✓' if env_ready else '✗'}")
                 if not env_ready:
                     print("注意: 当前环境尚未准备好执行任务，需要先进行环境准备")
-                
+            
                 # 显示目标元素
                 target_elements = image_analysis.get("target_elements", [])
                 if target_elements:
                     print(f"任务目标元素: {', '.join(target_elements)}")
-                
+            
                 # 显示找到的元素
                 elements_found = image_analysis.get("elements_found", [])
                 if elements_found:
                     print("找到的元素:")
                     for element in elements_found:
                         print(f"  - {element.get('element', '未命名元素')} 位置:({element.get('x', 0)}, {element.get('y', 0)})")
-                
+            
                 # 显示未找到的元素
                 elements_not_found = image_analysis.get("elements_not_found", [])
                 if elements_not_found:
                     print(f"未找到的元素: {', '.join(elements_not_found)}")
-                
+            
                 # 显示分析推理
                 reasoning = image_analysis.get("reasoning", "")
                 if reasoning:
                     print(f"分析推理: {reasoning}")
-                
+            
                 # 显示预期下一场景
                 next_scene = image_analysis.get("next_expected_scene", "")
                 if next_scene:
                     print(f"预期下一场景: {next_scene}")
-                
+            
                 print("---------------------------\n")
-                
+            
                 # 更新任务状态
                 task_context["status"] = image_analysis.get("status", "进行中")
-                
+                step_span.set("status", task_context["status"])
+            
                 # 打印更多任务状态信息，方便调试
                 print(f"当前任务状态: {task_context['status']}")
                 print(f"已执行步骤数: {task_context['steps_executed']}")
                 if task_context["status"] == "已完成":
                     print("大模型判断任务已完成!")
-                    
+                
                     # 对于特定任务，额外验证任务是否真的完成
                     if "打开" in task_context["task"] and task_context["steps_executed"] == 0:
                         print("警告: 对于'打开应用'任务，如果没有执行任何步骤就判断为完成，这可能是错误的")
                         print("继续执行任务...")
                         task_context["status"] = "进行中"
-                
+            
                 # 检查任务是否完成
                 if task_context["status"] == "已完成":
                     print("任务已完成!")
+                    result["stop_reason"] = "completed"
                     break
-                
+            
                 # 检查环境状态
                 env_ready = image_analysis.get("environment_ready", False)
                 if not env_ready:
@@ -349,26 +460,34 @@ def main():
                         "value": "win+d",
                         "delay": 1.0
                     }
-                    
+                
                     if safe_execute_action(return_desktop_action, task_context):
                         # 更新任务上下文
                         task_context["steps_executed"] += 1
                         task_context["last_action"] = return_desktop_action
+                        task_context["summary"].append(return_desktop_action["description"])
+                        if journal:
+                            journal.action(task_context)
                         print("已返回桌面")
                         # 跳过本轮剩余部分，进入下一轮循环
                         continue
                     else:
                         print("无法返回桌面，操作可能受限")
-                        print("是否仍要继续？")
-                        retry = input("输入'y'继续，其他退出: ").lower()
-                        if retry != 'y':
+                        if not confirm("env_not_ready", "是否仍要继续？"):
+                            result["stop_reason"] = "stopped"
                             break
-                
+            
                 # 获取下一步操作
                 steps = image_analysis.get("steps", [])
+                if "steps" in image_analysis.get("field_defects", {}):
+                    # 追问次数用完后仍有缺陷的步骤（缺少坐标、不支持的操作等）不执行，第一步就有缺陷时按没有操作处理
+                    steps = executable_steps(steps)
+                    image_analysis["steps"] = steps
+                    logger.warning(f"分析结果的操作步骤仍有缺陷，只保留前 {len(steps)} 个可执行的步骤: "
+                                   f"{image_analysis['field_defects']['steps']}")
                 if not steps:
                     logger.warning("未找到下一步操作")
-                    
+                
                     # 检查是否需要从桌面开始
                     if is_desktop_task(task_context.get("task", "")) and task_context["steps_executed"] == 0:
                         print("当前任务可能需要从桌面开始，尝试返回桌面...")
@@ -379,62 +498,168 @@ def main():
                             "value": "win+d",
                             "delay": 1.0
                         }
-                        
+                    
                         if safe_execute_action(return_desktop_action, task_context):
                             # 更新任务上下文
                             task_context["steps_executed"] += 1
                             task_context["last_action"] = return_desktop_action
+                            task_context["summary"].append(return_desktop_action["description"])
+                            if journal:
+                                journal.action(task_context)
                             print("已返回桌面")
                             # 跳过本轮剩余部分，进入下一轮循环
                             continue
                         else:
                             print("无法返回桌面")
-                    
+                
                     print("分析结果中没有找到可执行的操作")
-                    print("是否继续尝试？")
-                    retry = input("输入'y'继续，其他退出: ").lower()
-                    if retry == 'y':
+                    if confirm("no_steps", "是否继续尝试？"):
                         continue
                     else:
+                        result["stop_reason"] = "stopped"
                         break
-                
+            
                 # 5.3 只执行下一步操作
                 next_action = steps[0]
-                
+                step_span.set("action", next_action.get("action"))
+                if journal:
+                    journal.step(task_context, fingerprint, image_analysis)
+                # 执行操作和等待界面稳定的同时，在后台准备下一步的候选
+                speculator.prepare(task_context, image_analysis, next_action)
+            
                 # 执行操作
                 if safe_execute_action(next_action, task_context):
+                    speculator.commit(image_analysis)
                     # 更新任务上下文
                     task_context["steps_executed"] += 1
                     task_context["last_action"] = next_action
+                    task_context["summary"].append(next_action.get("description", ""))
+                    if journal:
+                        journal.action(task_context)
                     print(f"操作成功: {next_action['description']}")
                 else:
+                    speculator.reject()
                     print(f"操作失败: {next_action['description']}")
-                    print("是否继续任务？")
-                    retry = input("输入'y'继续，其他退出: ").lower()
-                    if retry != 'y':
+                    if not confirm("action_failed", "是否继续任务？"):
+                        result["stop_reason"] = "stopped"
                         break
-                
+            
                 # 增加步骤计数
                 step_count += 1
-                
-                # 每3步询问用户是否继续
-                if step_count % 3 == 0 and step_count < max_steps:
-                    print(f"已执行{step_count}步操作，是否继续？")
-                    continue_task = input("输入'y'继续，其他退出: ").lower()
-                    if continue_task != 'y':
+            
+                # 每隔几步询问是否继续
+                if confirm_every and step_count % confirm_every == 0 and step_count < max_steps:
+                    if not confirm("checkpoint", f"已执行{step_count}步操作，是否继续？"):
                         print("用户选择停止操作")
+                        result["stop_reason"] = "stopped"
                         break
-            
-            # 任务结束
-            if step_count >= max_steps and task_context["status"] == "进行中":
-                print(f"已达到最大步骤数 {max_steps}，操作停止")
-            
-            print(f"操作流程结束，共执行了 {task_context['steps_executed']} 步操作")
-            
-        except Exception as e:
-            logger.error(f"执行过程中发生错误: {str(e)}")
-            print(f"执行过程中发生错误: {str(e)}")
-            traceback.print_exc()  # 打印完整的错误堆栈
+        
+        # 任务结束
+        if result["stop_reason"] is None and task_context["status"] == "进行中":
+            print(f"已达到最大步骤数 {max_steps}，操作停止")
+            result["stop_reason"] = "max_steps"
+        
+        print(f"操作流程结束，共执行了 {task_context['steps_executed']} 步操作")
+        for route, stats in get_route_stats().items():
+            logger.info(f"路由 {route} ({stats['model']}): 调用 {stats['calls']} 次, 平均耗时 {stats['latency_avg']:.2f}s, 前缀缓存命中率 {stats['cache_hit_ratio']:.0%}, 累计成本 {stats['cost']:.4f}元")
+        
+    except Exception as e:
+        logger.error(f"执行过程中发生错误: {str(e)}")
+        print(f"执行过程中发生错误: {str(e)}")
+        traceback.print_exc()  # 打印完整的错误堆栈
+        result["stop_reason"] = "error"
+        result["error"] = str(e)
+    
+    result["status"] = task_context["status"]
+    if result["stop_reason"] is None:
+        result["stop_reason"] = "completed" if task_context["status"] == "已完成" else task_context["status"]
+    result["steps_executed"] = task_context["steps_executed"]
+    result["step_count"] = step_count
+    result["rounds"] = rounds
+    result["duration"] = round(time.time() - start_time, 3)
+    # 出错中止（如网络错误）的任务保留检查点，重新执行时恢复；其他原因结束的任务不再恢复
+    if journal and result["stop_reason"] not in RESUMABLE_STOP_REASONS:
+        journal.end(user_input, operation_type)
+    return result
+
+def choose_operation_type():
+    """
+    询问用户选择操作方式
+
+    Returns:
+        str: keyboard/mouse/mixed
+    """
+    print("请选择操作方式:")
+    print("1. 键盘操作")
+    print("2. 鼠标操作")
+    print("3. 混合操作 (默认)")
+    operation_choice = input("请选择 (1/2/3): ").strip()
+    
+    if operation_choice == '1':
+        operation_type = "keyboard"
+    elif operation_choice == '2':
+        operation_type = "mouse"
+    else:
+        operation_type = "mixed"
+    
+    print(f"已选择: {operation_type} 操作方式")
+    return operation_type
+
+def main():
+    """
+    微信助手主程序，控制整个流程
+    """
+    logger.info("微信自动化助手启动")
+    if TRACE_FILE:
+        start_trace_file(TRACE_FILE)
+    start_metrics_exporters()
+    print("欢迎使用微信自动化助手")
+    
+    # 创建截图保存目录
+    screenshots_dir = os.path.join(parent_dir, "screenshots")
+    os.makedirs(screenshots_dir, exist_ok=True)
+    
+    # 读取微信操作指南，每个任务只注入与指令相关的部分
+    wechat_guide = get_wechat_guide()
+    
+    task_completed = False
+    
+    while not task_completed:
+        # 1. 获取用户输入（语音或文字）
+        user_input = input("请输入您的指令（输入'v'语音输入，输入'exit'退出）: ")
+        logger.info(f"用户输入: {user_input}")
+        
+        if user_input.lower() == 'exit':
+            logger.info("用户选择退出程序")
+            task_completed = True
+            continue
+        
+        text_analysis = None
+        if user_input.strip().lower() == 'v':
+            # 2. 语音输入时先确定操作类型，部分识别结果稳定后即可在用户说完之前开始分析指令
+            operation_type = choose_operation_type()
+            early_analysis = EarlyStart(lambda text: analyze_text(text, wechat_guide, operation_type))
+            user_input = recognize_speech(on_stable=early_analysis)
+            if not user_input:
+                continue
+            logger.info(f"语音指令: {user_input}")
+            print("正在分析您的指令...")
+            text_analysis = early_analysis.result(user_input)
+        else:
+            # 2. 确定操作类型
+            operation_type = choose_operation_type()
+        
+        # 同一指令上次中断时由用户决定是继续还是重新执行（重新执行可能重复发送已发出的消息，继续则不会）
+        resume = False
+        journal = get_task_journal()
+        checkpoint = journal.resume(user_input, operation_type) if journal and text_analysis is None else None
+        if checkpoint is not None:
+            print(f"该指令上次中断时已执行 {checkpoint['steps_executed']} 步")
+            resume = input("输入'y'从中断处继续，其他重新执行: ").lower() == 'y'
+        
+        # 3~5. 执行任务，需要决定的地方询问用户
+        run_task(user_input, operation_type, screenshots_dir, wechat_guide, confirm=ask_user,
+                 text_analysis=text_analysis, resume=resume)
         
         # 询问是否继续新任务
         print("是否继续执行新的任务？")
@@ -448,4 +673,4 @@ def main():
     logger.info("微信自动化助手退出")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
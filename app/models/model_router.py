@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模型路由 - 将每个子任务（场景识别、元素定位、行动规划、文本规划等）发送到
+能胜任的最便宜模型和图像尺寸，并记录每个路由的延迟和成本
+"""
+
+import base64
+import io
+import json
+import inspect
+import threading
+import time
+import sys
+import os
+from types import SimpleNamespace
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.logger import get_logger
+from app.utils.tracing import span
+from app.utils.metrics import counter, histogram
+from app.config import (
+    QWEN_API_KEY, QWEN_BASE_URL, MODEL_ROUTES, MODEL_PRICES, CACHED_TOKEN_PRICE_RATIO, MODEL_STREAMING,
+    MODEL_RECORD_PATH
+)
+from app.models.prompts import PROMPT_VERSION
+
+# 获取日志记录器
+logger = get_logger()
+
+_client = None
+_client_lock = threading.Lock()
+
+# 每个路由的统计数据
+_route_stats = {}
+_stats_lock = threading.Lock()
+
+_record_lock = threading.Lock()
+
+# 客户端类型 -> create是否接受stream_options
+_stream_options_support = {}
+
+MODEL_CALLS = counter("wechat_model_calls_total", "模型调用次数", ("route", "outcome"))
+MODEL_LATENCY = histogram("wechat_model_latency_seconds", "模型调用耗时", ("route",))
+MODEL_RETRIES = counter("wechat_model_retries_total", "模型客户端自动重试次数", ("route",))
+MODEL_BYTES_SENT = counter("wechat_model_bytes_sent_total", "上传给模型的请求字节数", ("route",))
+MODEL_PROMPT_TOKENS = counter("wechat_model_prompt_tokens_total", "输入token数", ("route",))
+MODEL_CACHED_TOKENS = counter("wechat_model_cached_tokens_total", "命中前缀缓存的输入token数", ("route",))
+MODEL_COMPLETION_TOKENS = counter("wechat_model_completion_tokens_total", "输出token数", ("route",))
+
+def get_client():
+    """
+    获取共享的模型客户端（首次调用时创建）
+
+    Returns:
+        OpenAI: 兼容OpenAI接口的DashScope客户端
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # openai导入需要近一秒，只在第一次调用模型时付出
+                from openai import OpenAI
+                _client = OpenAI(api_key=QWEN_API_KEY or "QWEN_API_KEY", base_url=QWEN_BASE_URL)
+    return _client
+
+def set_client(client):
+    """
+    替换共享的模型客户端，例如指向本地的测试服务
+
+    Args:
+        client (OpenAI): 模型客户端
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+def get_route(route):
+    """
+    获取路由配置
+
+    Args:
+        route (str): 路由名称，见config.MODEL_ROUTES
+
+    Returns:
+        dict: 路由配置，包含model和image_max_side
+    """
+    if route not in MODEL_ROUTES:
+        raise ValueError(f"未知的模型路由: {route}")
+    return MODEL_ROUTES[route]
+
+def resize_image(image_data, max_side):
+    """
+    按最长边缩小base64图像
+
+    Args:
+        image_data (str): base64编码的PNG图像
+        max_side (int): 最长边像素上限，None表示不缩放
+
+    Returns:
+        tuple: (base64编码的图像, MIME类型)
+    """
+    if not max_side:
+        return image_data, "image/png"
+
+    from PIL import Image
+    image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+    if max(image.size) <= max_side:
+        return image_data, "image/png"
+
+    scale = max_side / max(image.size)
+    resized = image.convert("RGB").resize(
+        (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+        Image.BILINEAR
+    )
+    img_byte_arr = io.BytesIO()
+    resized.save(img_byte_arr, format="JPEG", quality=85)
+    logger.debug(f"图像已缩小: {image.size} -> {resized.size}")
+    return base64.b64encode(img_byte_arr.getvalue()).decode("utf-8"), "image/jpeg"
+
+def image_content(image_data, route):
+    """
+    按路由配置的图像尺寸构建消息中的图像内容
+
+    Args:
+        image_data (str): base64编码的PNG截图
+        route (str): 路由名称
+
+    Returns:
+        dict: 消息内容中的image_url部分
+    """
+    with span("resize", route=route):
+        data, mime_type = resize_image(image_data, get_route(route).get("image_max_side"))
+    return {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{data}"}}
+
+def chat_completion(route, messages, client=None, **kwargs):
+    """
+    通过指定路由调用模型，并记录延迟、token用量和估算成本
+
+    Args:
+        route (str): 路由名称
+        messages (list): 对话消息
+        client (OpenAI): 模型客户端，默认使用共享客户端
+        **kwargs: 透传给chat.completions.create的其他参数
+
+    Returns:
+        ChatCompletion: 模型响应
+    """
+    model = get_route(route)["model"]
+    client = client or get_client()
+    bytes_sent = payload_size(messages)
+
+    with span(f"model.{route}", model=model, bytes_sent=bytes_sent) as s:
+        start = time.perf_counter()
+        ttft = None
+        try:
+            if MODEL_STREAMING:
+                completion, ttft, retries = _stream_completion(client, model, messages, start, **kwargs)
+            else:
+                # 通过原始响应取得客户端自动重试的次数
+                raw = client.chat.completions.with_raw_response.create(model=model, messages=messages, **kwargs)
+                completion, retries = raw.parse(), _retries_taken(raw)
+        except Exception:
+            _record(route, model, time.perf_counter() - start, None, bytes_sent, error=True)
+            raise
+        usage = getattr(completion, "usage", None)
+        _record(route, model, time.perf_counter() - start, usage, bytes_sent, ttft=ttft)
+        s.set("retries", retries)
+        MODEL_RETRIES.labels(route).inc(retries)
+        s.set("prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        s.set("completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+    if MODEL_RECORD_PATH:
+        record_response(MODEL_RECORD_PATH, route, model, completion)
+    return completion
+
+def payload_size(messages):
+    """
+    估算请求中消息内容的字节数（文本按UTF-8计算，图像按data URL长度计算）
+
+    Args:
+        messages (list): 对话消息
+
+    Returns:
+        int: 字节数
+    """
+    size = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            size += len(content.encode("utf-8"))
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    size += len(part["text"].encode("utf-8"))
+                elif part.get("type") == "image_url":
+                    size += len(part["image_url"]["url"])
+    return size
+
+def record_response(path, route, model, completion):
+    """
+    将模型回复追加写入录制文件，供离线基准测试回放
+
+    Args:
+        path (str): 录制文件路径（JSONL）
+        route (str): 路由名称
+        model (str): 模型名称
+        completion: 模型响应
+    """
+    usage = getattr(completion, "usage", None)
+    record = {
+        "route": route,
+        "model": model,
+        "content": completion.choices[0].message.content,
+        "usage": {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+        }
+    }
+    with _record_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _stream_completion(client, model, messages, start, **kwargs):
+    """
+    以流式方式调用模型，拼接完整回复并测量首token延迟
+
+    Returns:
+        tuple: (与非流式响应结构相同的对象, 首token延迟秒数, 客户端重试次数)
+    """
+    if _accepts_stream_options(client):
+        kwargs.setdefault("stream_options", {"include_usage": True})
+    raw = client.chat.completions.with_raw_response.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        **kwargs
+    )
+    stream = raw.parse()
+    parts = []
+    ttft = None
+    usage = None
+    for chunk in stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                parts.append(delta)
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+    message = SimpleNamespace(content="".join(parts))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage), ttft, _retries_taken(raw)
+
+def _retries_taken(raw):
+    """
+    原始响应中记录的客户端自动重试次数（openai 1.12.0的原始响应没有retries_taken，此时按0计）
+    """
+    return getattr(raw, "retries_taken", 0) or 0
+
+def _accepts_stream_options(client):
+    """
+    判断客户端的create是否接受stream_options参数（openai 1.26之前的版本不支持，
+    传入会抛出TypeError，此时流式调用不返回token用量）
+    """
+    key = type(client.chat.completions)
+    if key not in _stream_options_support:
+        try:
+            parameters = inspect.signature(client.chat.completions.create).parameters.values()
+        except (TypeError, ValueError):
+            parameters = ()
+        _stream_options_support[key] = any(
+            parameter.name == "stream_options" or parameter.kind is inspect.Parameter.VAR_KEYWORD
+            for parameter in parameters
+        )
+        if not _stream_options_support[key]:
+            logger.warning("当前openai客户端不支持stream_options，流式调用不统计token用量和成本")
+    return _stream_options_support[key]
+
+def _record(route, model, latency, usage, bytes_sent=0, error=False, ttft=None):
+    """
+    记录一次路由调用
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = ((prompt_tokens - cached_tokens + cached_tokens * CACHED_TOKEN_PRICE_RATIO) / 1000 * input_price
+            + completion_tokens / 1000 * output_price)
+
+    with _stats_lock:
+        stats = _route_stats.setdefault(route, {
+            "model": model,
+            "calls": 0,
+            "errors": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+            "ttft_total": 0.0,
+            "ttft_count": 0,
+            "bytes_sent": 0,
+            "cost": 0.0
+        })
+        stats["model"] = model
+        stats["prompt_version"] = PROMPT_VERSION
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["bytes_sent"] += bytes_sent
+        if ttft is not None:
+            stats["ttft_total"] += ttft
+            stats["ttft_count"] += 1
+        stats["cost"] += cost
+
+    MODEL_CALLS.labels(route, "error" if error else "ok").inc()
+    MODEL_LATENCY.labels(route).observe(latency)
+    MODEL_BYTES_SENT.labels(route).inc(bytes_sent)
+    if not error:
+        MODEL_PROMPT_TOKENS.labels(route).inc(prompt_tokens)
+        MODEL_CACHED_TOKENS.labels(route).inc(cached_tokens)
+        MODEL_COMPLETION_TOKENS.labels(route).inc(completion_tokens)
+
+    if error:
+        logger.warning(f"模型路由 {route} ({model}) 调用失败，耗时 {latency:.2f}s")
+    else:
+        ttft_text = f", 首token {ttft:.2f}s" if ttft is not None else ""
+        logger.info(f"模型路由 {route} ({model}) 耗时 {latency:.2f}s{ttft_text}, tokens {prompt_tokens}(缓存 {cached_tokens})/{completion_tokens}, 估算成本 {cost:.5f}元")
+
+def get_route_stats():
+    """
+    获取各路由的统计数据
+
+    Returns:
+        dict: 路由名称 -> 调用次数、错误次数、平均/最大延迟、平均首token延迟、
+              token用量、前缀缓存命中率、上传字节数和累计成本
+    """
+    with _stats_lock:
+        result = {}
+        for route, stats in _route_stats.items():
+            result[route] = dict(stats)
+            result[route]["latency_avg"] = stats["latency_total"] / stats["calls"] if stats["calls"] else 0.0
+            result[route]["ttft_avg"] = stats["ttft_total"] / stats["ttft_count"] if stats["ttft_count"] else None
+            result[route]["cache_hit_ratio"] = (
+                stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+            )
+        return result
+
+def reset_route_stats():
+    """
+    清空各路由的统计数据
+    """
+    with _stats_lock:
+        _route_stats.clear()
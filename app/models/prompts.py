@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+提示词模板 - 静态部分（系统提示、输出格式、分析指南）在导入时拼接好，
+每次请求只在末尾追加少量动态内容（任务、上一步操作、已执行步骤数等），
+使请求的前缀保持不变，便于模型服务端复用已缓存的前缀
+
+修改任何静态部分时都要更新 PROMPT_VERSION，以便区分不同版本的缓存命中和效果数据
+"""
+
+import json
+
+PROMPT_VERSION = "2"
+
+# ---------- 公共格式说明 ----------
+
+STEP_SCHEMA = """"steps": [
+    {
+      "description": "下一步操作的详细描述",
+      "type": "keyboard/mouse",  // 只能是这两种类型
+      "action": "press/hotkey/write/click/move/drag/scroll",  // 只能是这些操作
+      "value": "按键名或文本内容",
+      "x": X坐标,
+      "y": Y坐标,
+      "delay": 延迟秒数
+    }
+  ]"""
+
+STEP_TYPE_RULES = """操作类型必须是以下之一：
+- 键盘操作: type为"keyboard"，action为"press"/"hotkey"/"write"
+- 鼠标操作: type为"mouse"，action为"click"/"move"/"drag"/"scroll"
+不要使用其他类型的操作，如check_environment等，因为程序无法执行它们。"""
+
+# ---------- 文本指令规划 ----------
+
+TEXT_PLANNING_SYSTEM = "\n\n".join([
+    "你是一个专业的自动化助手，专门规划详细的键盘鼠标操作步骤。你需要给出详细的键盘鼠标操作步骤，包括按键名、坐标、动作、延迟等。",
+    "请分析用户指令，参考提供的微信操作指南，并输出一个JSON格式的操作计划。",
+    """请输出包含以下字段的JSON：
+{
+  "task": "任务描述",
+  "operation_type": "launch/search/chat/other",
+  "method": "keyboard/mouse/mixed",
+  """ + STEP_SCHEMA + """
+}""",
+    "只需输出JSON，不要有其他内容。",
+])
+
+TEXT_PLANNING_SUFFIX = "{guide_content}\n\n用户指令: {user_input}"
+
+# ---------- 单轮截图分析 ----------
+
+IMAGE_ANALYSIS_SYSTEM = "\n\n".join([
+    "你是一个专业的自动化助手，负责分析屏幕截图。输入是一张截图，输出是界面分析内容。当前界面是什么？"
+    "当前界面有什么？界面有哪些button，有什么功能？以左上角为0，其xy坐标是多少？有哪些窗口，有什么功能？",
+    "请分析屏幕截图，根据当前任务目标有针对性地寻找并识别关键元素，然后规划下一步操作。",
+    """针对性分析指南:
+1. 首先明确当前任务需要寻找的特定元素（如图标、按钮、输入框、特定文本等）
+2. 仔细分析图像中是否存在这些目标元素，给出具体坐标位置
+3. 如果找到目标元素，提供精确的操作方法（点击、输入等）
+4. 如果未找到目标元素，分析可能的原因并提供获取该元素的具体操作步骤
+5. 提供操作理由，说明为什么这是最佳的下一步操作
+
+例如：
+- 如果任务是"打开微信"，应首先寻找微信图标，若找到则点击，若未找到则提供搜索微信或打开开始菜单的操作
+- 如果任务是"发消息给联系人"，应首先确认是否已在微信界面，然后寻找联系人列表、搜索框等""",
+    STEP_TYPE_RULES,
+    """请生成一个包含以下内容的JSON：
+{
+  "task": "当前任务描述",
+  "target_elements": ["目标元素1", "目标元素2"], // 当前任务需要寻找的关键元素
+  "status": "进行中/已完成/需要用户确认/失败",
+  "elements_found": [
+    {
+      "element": "已找到的元素描述",
+      "x": X坐标,
+      "y": Y坐标,
+      "confidence": 置信度
+    }
+  ],
+  "elements_not_found": ["未找到的元素1", "未找到的元素2"], // 需要但未找到的元素
+  """ + STEP_SCHEMA + """,
+  "reasoning": "分析逻辑和操作理由，说明为什么这是最佳的下一步操作"
+}""",
+    "只需输出JSON，不要有其他内容。确保你的分析和操作建议非常针对性，直接服务于当前任务目标。",
+])
+
+IMAGE_ANALYSIS_SUFFIX = """当前任务上下文:
+- 任务: {task}
+- 操作类型: {operation_type}
+- 方法: {method}
+- 已执行步骤数: {steps_executed}
+- 用户原始指令: {instruction}
+- 上一步操作: {last_action}
+- 附加说明: {context}"""
+
+# ---------- 多轮对话截图分析 ----------
+
+SCENE_PROMPT = """首先识别当前屏幕场景。请详细分析这个屏幕截图，回答以下问题：
+1. 当前是否在Windows桌面？如果不是，当前环境是什么？
+2. 是否可以看到以下任何界面元素：开始菜单、任务栏、桌面图标、应用窗口？
+3. 当前屏幕最主要/最突出的应用或界面是什么？
+
+请仅回答上述问题，简明扼要地描述您在图像中看到的内容。"""
+
+# 多轮对话共用的系统提示，包含所有轮次的静态说明，跨步骤保持不变
+MULTI_ROUND_SYSTEM = "\n\n".join([
+    "你是一个专业的自动化助手，通过多轮对话分析屏幕截图：第一轮识别场景，第二轮识别任务相关的元素及坐标，第三轮规划下一步操作。截图以左上角为坐标原点。",
+    """识别元素时请回答：
+1. 根据任务，我们需要寻找哪些特定元素？请列出完成任务所需的关键元素。
+2. 这些元素在当前屏幕上是否可见？对于每个元素，给出以下信息：
+   a. 元素名称
+   b. 是否可见
+   c. 如果可见，它的大致位置坐标(x,y)
+3. 如果关键元素不可见，需要执行什么操作才能看到它们？
+请详细且具体地回答，这将帮助确定下一步操作。""",
+    """规划操作时，考虑到当前环境和任务目标，请规划一个具体的操作步骤，确保操作安全且有效。特别注意：
+1. 如果当前不在Windows桌面，且任务需要从桌面开始，请先提供返回桌面的操作（如使用Win+D快捷键）
+2. 如果需要点击元素，请确保元素在当前屏幕可见，并提供准确的坐标
+3. 对于不可见的元素，请提供合适的操作序列来访问它们
+4. 考虑任务上下文和已执行步骤，避免重复操作""",
+    STEP_TYPE_RULES,
+    """规划操作时请生成一个标准JSON格式的操作计划，包含以下内容：
+{
+  "task": "当前任务描述",
+  "current_scene": "当前场景描述",
+  "target_elements": ["目标元素1", "目标元素2"],
+  "status": "进行中/已完成/需要用户确认/失败",
+  "environment_ready": true/false,  // 当前环境是否已准备好执行任务
+  "elements_found": [
+    {
+      "element": "已找到的元素描述",
+      "x": X坐标,
+      "y": Y坐标,
+      "confidence": 置信度
+    }
+  ],
+  "elements_not_found": ["未找到的元素1", "未找到的元素2"],
+  """ + STEP_SCHEMA + """,
+  "reasoning": "分析逻辑和操作理由",
+  "next_expected_scene": "执行操作后预期的场景"
+}
+规划操作时只需输出JSON，不要有其他内容。确保JSON格式正确，且操作步骤非常具体和精确。""",
+])
+
+ELEMENTS_PROMPT = "基于任务要求，请按说明识别屏幕上的特定元素。\n\n任务信息: {task}"
+
+ACTION_PROMPT = """基于当前场景和目标元素分析，请按说明规划下一步具体操作，并输出JSON。
+
+任务信息: {task}
+已执行步骤数: {steps_executed}
+上一步操作: {last_action}"""
+
+ACTION_GUIDE_SUFFIX = "\n参考操作指南:\n{guide}"
+
+def text_planning_suffix(user_input, guide_content=""):
+    """
+    文本指令规划的动态部分
+    """
+    return TEXT_PLANNING_SUFFIX.format(guide_content=guide_content, user_input=user_input).strip()
+
+def image_analysis_suffix(task_context):
+    """
+    单轮截图分析的动态部分
+    """
+    return IMAGE_ANALYSIS_SUFFIX.format(
+        task=task_context.get('task', '未知任务'),
+        operation_type=task_context.get('operation_type', 'unknown'),
+        method=task_context.get('method', 'mixed'),
+        steps_executed=task_context.get('steps_executed', 0),
+        instruction=task_context.get('instruction', ''),
+        last_action=json.dumps(task_context.get('last_action', {}), ensure_ascii=False),
+        context=task_context.get('context', '')
+    )
+
+def elements_prompt(task_context):
+    """
+    多轮分析第二轮（元素识别）的动态部分
+    """
+    return ELEMENTS_PROMPT.format(task=task_context.get('task', '未知任务'))
+
+def action_prompt(task_context):
+    """
+    多轮分析第三轮（行动规划）的动态部分
+    """
+    prompt = ACTION_PROMPT.format(
+        task=task_context.get('task', '未知任务'),
+        steps_executed=task_context.get('steps_executed', 0),
+        last_action=json.dumps(task_context.get('last_action', {}), ensure_ascii=False)
+    )
+    if task_context.get('guide'):
+        prompt += ACTION_GUIDE_SUFFIX.format(guide=task_context['guide'])
+    return prompt
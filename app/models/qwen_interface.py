@@ -3,15 +3,8 @@
 
 import os
 import json
-import base64
-import requests
 import re
-from PIL import Image
-from io import BytesIO
-import time
-from openai import OpenAI
 import sys
-import os
 
 # 将项目根目录添加到Python路径以解决导入问题
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,11 +12,21 @@ parent_dir = os.path.dirname(os.path.dirname(current_dir))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-from app.utils.logger import get_logger
+from app.utils.logger import get_logger, payload
+from app.config import FIELD_REASK_MAX_ROUNDS
+from app.models.model_router import get_client, chat_completion, image_content
+from app.models import prompts
+from app.utils.wechat_guide_parser import select_guide_sections
+from app.utils.tracing import span
+from app.utils.metrics import counter
 
 # 获取日志记录器
 logger = get_logger()
 
+SCENE_LOOKUPS = counter("wechat_scene_index_lookups_total", "本地场景识别查询次数", ("result",))
+IMAGE_ANALYSES = counter("wechat_image_analyses_total", "多轮截图分析次数", ("outcome",))
+FIELD_REASKS = counter("wechat_field_reasks_total", "分析结果字段缺陷的追问次数")
+
 # 从环境变量或配置文件获取API密钥
 API_KEY = os.environ.get("QWEN_API_KEY", "QWEN_API_KEY")
 
@@ -31,13 +34,28 @@ API_KEY = os.environ.get("QWEN_API_KEY", "QWEN_API_KEY")
 QWEN_MAX_API_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
 QWEN_VL_API_URL = "https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation"
 
-def analyze_text(user_input, wechat_guide=None):
+# 程序可以执行的操作类型及对应动作（与action_executor保持一致）
+VALID_STEP_ACTIONS = {
+    "keyboard": ("press", "hotkey", "write"),
+    "mouse": ("click", "move", "drag", "scroll"),
+}
+VALID_STATUSES = ("进行中", "已完成", "需要用户确认", "失败")
+
+# 追问时针对各字段给出的格式说明
+FIELD_SCHEMA_HINTS = {
+    "steps": prompts.STEP_SCHEMA,
+    "status": '"status": "进行中/已完成/需要用户确认/失败"',
+    "environment_ready": '"environment_ready": true/false',
+}
+
+def analyze_text(user_input, wechat_guide=None, method=None):
     """
     使用千问-max模型分析文本指令，规划操作步骤
     
     Args:
         user_input (str): 用户输入的指令
-        wechat_guide (dict): 微信操作指南
+        wechat_guide (dict): 微信操作指南，只有与指令相关的部分会被加入提示
+        method (str): 操作方式 keyboard/mouse/mixed
         
     Returns:
         dict: 分析结果，包含操作步骤
@@ -47,74 +65,26 @@ def analyze_text(user_input, wechat_guide=None):
         logger.error("QWEN_API_KEY 环境变量未设置")
         raise ValueError("QWEN_API_KEY 环境变量未设置")
     
-    client = OpenAI(
-        # 若没有配置环境变量，请用百炼API Key将下行替换为：api_key="sk-xxx",
-        api_key=API_KEY,
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",  # 填写DashScope服务的base_url
-    )
+    client = get_client()
     
     # 构建提示内容
     guide_content = ""
-    if wechat_guide:
-        guide_content = "微信操作指南:\n" + json.dumps(wechat_guide, ensure_ascii=False, indent=2)
-        logger.debug("已添加微信操作指南到提示中")
+    guide_text = select_guide_sections(wechat_guide, user_input, method)
+    if guide_text:
+        guide_content = "微信操作指南:\n" + guide_text
+        logger.debug("已添加相关的微信操作指南到提示中")
     
-    prompt = f"""
-作为自动化助手，请分析以下用户指令，并生成详细的键盘鼠标操作步骤。
-请参考提供的微信操作指南，并输出一个JSON格式的操作计划。
-
-用户指令: {user_input}
-
-{guide_content}
-
-请输出包含以下字段的JSON：
-{{
-  "task": "任务描述",
-  "operation_type": "launch/search/chat/other",
-  "method": "keyboard/mouse/mixed",
-  "steps": [
-    {{
-      "description": "步骤描述",
-      "type": "keyboard/mouse",
-      "action": "press/hotkey/write/click/move/drag/scroll",
-      "value": "按键名或文本内容",
-      "x": X坐标,
-      "y": Y坐标,
-      "delay": 延迟秒数
-    }}
-  ]
-}}
-
-只需输出JSON，不要有其他内容。
-"""
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": "qwen-max",
-        "messages": [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的自动化助手，专门规划详细的键盘鼠标操作步骤。"
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-        ],
-        "parameters": {}
-    }
+    # 静态的系统提示在前，动态的指南和用户指令在后
+    prompt = prompts.text_planning_suffix(user_input, guide_content)
     
     try:
         logger.info("发送请求到千问-max模型")
         try:
-            completion = client.chat.completions.create(
-                model="qwen-max",  
+            completion = chat_completion(
+                "text_planning",
+                client=client,
                 messages=[
-                    {'role': 'system', 'content': '你是一个专业的自动化助手，专门规划详细的键盘鼠标操作步骤。你需要给出详细的键盘鼠标操作步骤，包括按键名、坐标、动作、延迟等。'},
+                    {'role': 'system', 'content': prompts.TEXT_PLANNING_SYSTEM},
                     {'role': 'user', 'content': prompt}],
                 extra_body={
                     "enable_search": False
@@ -129,23 +99,22 @@ def analyze_text(user_input, wechat_guide=None):
         # 尝试解析JSON内容
         try:
             # 查找JSON内容（可能被包裹在代码块中）
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|(\{[\s\S]*\})', content)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                result = json.loads(json_str)
-                logger.info(f"成功解析JSON响应: {result.get('task', '未知任务')}")
-                return result
-            else:
-                result = json.loads(content)
-                logger.info(f"成功解析JSON响应: {result.get('task', '未知任务')}")
-                return result
+            with span("parse"):
+                json_match = re.search(r'```json\s*([\s\S]*?)\s*```|(\{[\s\S]*\})', content)
+                if json_match:
+                    json_str = json_match.group(1) or json_match.group(2)
+                    result = json.loads(json_str)
+                else:
+                    result = json.loads(content)
+            logger.info(f"成功解析JSON响应: {result.get('task', '未知任务')}")
+            return result
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"JSON解析错误: {str(e)}")
-            logger.debug(f"原始响应内容: {content}")
+            logger.debug("原始响应内容: %s", payload(content))
             # 返回包含原始回复的简单格式
             return {"error": "解析失败", "raw_content": content}
             
-    except requests.exceptions.RequestException as e:
+    except OSError as e:
         logger.error(f"API请求错误: {str(e)}")
         return {"error": str(e)}
 
@@ -165,84 +134,27 @@ def analyze_image(image_data, task_context):
         logger.error("QWEN_API_KEY 环境变量未设置")
         raise ValueError("QWEN_API_KEY 环境变量未设置")
 
-    client = OpenAI(
-        api_key=API_KEY,
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-    )
+    client = get_client()
     
-    # 构建更详细的提示，包含任务上下文信息
-    prompt = f"""
-请分析这张屏幕截图，根据当前任务目标有针对性地寻找并识别关键元素，然后规划下一步操作。
-
-当前任务上下文:
-- 任务: {task_context.get('task', '未知任务')}
-- 操作类型: {task_context.get('operation_type', 'unknown')}
-- 方法: {task_context.get('method', 'mixed')}
-- 已执行步骤数: {task_context.get('steps_executed', 0)}
-- 用户原始指令: {task_context.get('instruction', '')}
-- 上一步操作: {json.dumps(task_context.get('last_action', {}), ensure_ascii=False)}
-- 附加说明: {task_context.get('context', '')}
-
-针对性分析指南:
-1. 首先明确当前任务需要寻找的特定元素（如图标、按钮、输入框、特定文本等）
-2. 仔细分析图像中是否存在这些目标元素，给出具体坐标位置
-3. 如果找到目标元素，提供精确的操作方法（点击、输入等）
-4. 如果未找到目标元素，分析可能的原因并提供获取该元素的具体操作步骤
-5. 提供操作理由，说明为什么这是最佳的下一步操作
-
-例如：
-- 如果任务是"打开微信"，应首先寻找微信图标，若找到则点击，若未找到则提供搜索微信或打开开始菜单的操作
-- 如果任务是"发消息给联系人"，应首先确认是否已在微信界面，然后寻找联系人列表、搜索框等
-
-请生成一个包含以下内容的JSON：
-{{
-  "task": "当前任务描述",
-  "target_elements": ["目标元素1", "目标元素2"], // 当前任务需要寻找的关键元素
-  "status": "进行中/已完成/需要用户确认/失败",
-  "elements_found": [
-    {{
-      "element": "已找到的元素描述",
-      "x": X坐标,
-      "y": Y坐标,
-      "confidence": 置信度
-    }}
-  ],
-  "elements_not_found": ["未找到的元素1", "未找到的元素2"], // 需要但未找到的元素
-  "steps": [
-    {{
-      "description": "下一步操作的详细描述，说明为什么需要这个操作",
-      "type": "keyboard/mouse",
-      "action": "press/hotkey/write/click/move/drag/scroll",
-      "value": "按键名或文本内容",
-      "x": X坐标,
-      "y": Y坐标,
-      "delay": 延迟秒数
-    }}
-  ],
-  "reasoning": "分析逻辑和操作理由，说明为什么这是最佳的下一步操作"
-}}
-
-只需输出JSON，不要有其他内容。确保你的分析和操作建议非常针对性，直接服务于当前任务目标。
-"""
+    # 分析指南和输出格式在静态的系统提示中，这里只包含任务上下文信息
+    prompt = prompts.image_analysis_suffix(task_context)
     
     try:
         logger.info("发送请求到千问-vl-plus模型")
         try:
-            completion = client.chat.completions.create(
-                model="qwen-vl-plus",
+            completion = chat_completion(
+                "single_round_analysis",
+                client=client,
                 messages=[
                     {
                         "role": "system",
-                        "content": "你是一个专业的自动化助手，负责分析屏幕截图。输入是一张截图，输出是界面分析内容。当前界面是什么？\
-                            当前界面有什么？界面有哪些button，有什么功能？以左上角为0，其xy坐标是多少？有哪些窗口，有什么功能？"
-
+                        "content": prompts.IMAGE_ANALYSIS_SYSTEM
                     },
                     {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt},
-                        {"type": "image_url", 
-                            "image_url": {"url": f"data:image/png;base64,{image_data}"}}
+                        image_content(image_data, "single_round_analysis")
                     ]
                     }
                 ]
@@ -324,7 +236,7 @@ def analyze_image(image_data, task_context):
                 parsed_result["raw_content"] = result
                 
                 logger.info(f"成功解析图像分析JSON: 状态={parsed_result['status']}, 找到 {len(parsed_result.get('elements_found', []))} 个元素，{len(parsed_result.get('steps', []))} 个操作步骤")
-                logger.debug(f"推理过程: {parsed_result.get('reasoning', '无')}")
+                logger.debug("推理过程: %s", payload(parsed_result.get('reasoning', '无')))
                 return parsed_result
             else:
                 # 尝试直接解析JSON
@@ -391,7 +303,7 @@ def analyze_image(image_data, task_context):
                     parsed_result["raw_content"] = result
                     
                     logger.info(f"成功解析图像分析JSON: 状态={parsed_result['status']}, 找到 {len(parsed_result.get('elements_found', []))} 个元素，{len(parsed_result.get('steps', []))} 个操作步骤")
-                    logger.debug(f"推理过程: {parsed_result.get('reasoning', '无')}")
+                    logger.debug("推理过程: %s", payload(parsed_result.get('reasoning', '无')))
                     return parsed_result
                 except json.JSONDecodeError:
                     # 如果直接解析失败，尝试提取任何类似JSON的部分
@@ -417,7 +329,7 @@ def analyze_image(image_data, task_context):
                     return fallback_result
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"JSON解析错误: {str(e)}")
-            logger.debug(f"原始响应内容: {result}")
+            logger.debug("原始响应内容: %s", payload(result))
             
             # 检查是否包含任务完成的提示
             task_completed = "任务已完成" in result
@@ -449,6 +361,197 @@ def analyze_image(image_data, task_context):
             "reasoning": f"发生错误: {str(e)}"
         }
 
+def _parse_json_reply(content):
+    """
+    从模型回复中提取JSON对象（可能被包裹在代码块中）
+    
+    Args:
+        content (str): 模型回复内容
+        
+    Returns:
+        dict: 解析出的字典，无法解析时返回None
+    """
+    with span("parse"):
+        try:
+            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|(\{[\s\S]*\})', content)
+            if json_match:
+                parsed = json.loads(json_match.group(1) or json_match.group(2))
+            else:
+                parsed = json.loads(content)
+        except (json.JSONDecodeError, TypeError):
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+def _step_defects(index, step):
+    """
+    检查单个操作步骤是否可以被执行
+    
+    Args:
+        index (int): 步骤序号（从0开始）
+        step (dict): 操作步骤
+        
+    Returns:
+        list: 缺陷描述列表
+    """
+    name = f"第{index + 1}步"
+    if not isinstance(step, dict):
+        return [f"{name}不是JSON对象"]
+    
+    step_type = str(step.get("type", "")).lower()
+    action = str(step.get("action", "")).lower()
+    if step_type not in VALID_STEP_ACTIONS:
+        return [f"{name}的type为'{step.get('type', '')}'，只能是keyboard或mouse"]
+    if action not in VALID_STEP_ACTIONS[step_type]:
+        return [f"{name}的action为'{step.get('action', '')}'，{step_type}操作只能是{'/'.join(VALID_STEP_ACTIONS[step_type])}"]
+    
+    defects = []
+    if step_type == "keyboard":
+        if not step.get("value"):
+            defects.append(f"{name}缺少value（按键名或文本内容）")
+        elif action == "hotkey" and "+" not in str(step["value"]):
+            defects.append(f"{name}的组合键格式应为'key1+key2'")
+    elif action in ("click", "move", "drag"):
+        for key in ("x", "y") + (("end_x", "end_y") if action == "drag" else ()):
+            if not isinstance(step.get(key), (int, float)) or isinstance(step.get(key), bool):
+                defects.append(f"{name}缺少有效的{key}坐标")
+    elif action == "scroll":
+        try:
+            int(step.get("value"))
+        except (TypeError, ValueError):
+            defects.append(f"{name}的value应为滚动量（整数）")
+    return defects
+
+def find_field_defects(parsed_result):
+    """
+    检查分析结果中各字段是否可用
+    
+    Args:
+        parsed_result (dict): 解析后的分析结果
+        
+    Returns:
+        dict: 字段名 -> 缺陷描述列表，没有缺陷时为空字典
+    """
+    defects = {}
+    
+    steps = parsed_result.get("steps")
+    if not isinstance(steps, list):
+        defects["steps"] = ["steps必须是操作步骤列表"]
+    else:
+        step_defects = []
+        for index, step in enumerate(steps):
+            step_defects.extend(_step_defects(index, step))
+        if not steps and parsed_result.get("status") == "进行中" and parsed_result.get("environment_ready") is True:
+            step_defects.append("任务进行中且环境已就绪，但没有给出下一步操作")
+        if step_defects:
+            defects["steps"] = step_defects
+    
+    if parsed_result.get("status") not in VALID_STATUSES:
+        defects["status"] = [f"status为'{parsed_result.get('status')}'，只能是{'/'.join(VALID_STATUSES)}"]
+    
+    if "environment_ready" in parsed_result and not isinstance(parsed_result["environment_ready"], bool):
+        defects["environment_ready"] = ["environment_ready必须是true或false"]
+    
+    return defects
+
+def executable_steps(steps):
+    """
+    取出可以执行的操作步骤：从第一步开始、到第一个有缺陷的步骤为止（之后的步骤可能依赖它）
+
+    Args:
+        steps (list): 分析结果中的操作步骤
+
+    Returns:
+        list: 可以执行的步骤，第一步就有缺陷时为空列表
+    """
+    if not isinstance(steps, list):
+        return []
+    usable = []
+    for index, step in enumerate(steps):
+        if _step_defects(index, step):
+            break
+        usable.append(step)
+    return usable
+
+def reask_defective_fields(client, messages, reply, parsed_result, route="field_repair"):
+    """
+    对分析结果中有缺陷的字段，在同一对话中追加一轮纯文本追问，只要求模型重新给出这些字段
+    
+    追问时对话历史中的截图会被去掉，只保留文本内容（场景和元素分析已经包含了坐标等信息），
+    因此比重新进行一次图像分析便宜得多。
+    
+    Args:
+        client (OpenAI): 模型客户端
+        messages (list): 产生该结果的对话消息
+        reply (str): 模型对该对话的原始回复
+        parsed_result (dict): 解析后的分析结果
+        route (str): 追问使用的模型路由
+        
+    Returns:
+        dict: 合并了追问结果的分析结果；仍有缺陷的字段记录在"field_defects"中
+    """
+    defects = find_field_defects(parsed_result)
+    if not defects:
+        return parsed_result
+    
+    # 去掉图像内容，保留同一对话的文本历史
+    conversation = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            content = "\n".join(part["text"] for part in content if part.get("type") == "text")
+        conversation.append({"role": message["role"], "content": content})
+    
+    rounds = 0
+    while defects and rounds < FIELD_REASK_MAX_ROUNDS:
+        rounds += 1
+        logger.info(f"分析结果字段存在缺陷，第{rounds}次针对性追问: {', '.join(defects)}")
+        FIELD_REASKS.inc()
+        
+        defect_lines = "\n".join(f"- {problem}" for problems in defects.values() for problem in problems)
+        field_hints = ",\n  ".join(FIELD_SCHEMA_HINTS[field] for field in defects)
+        prompt_fix = f"""
+你上一次输出的JSON中以下字段存在问题：
+{defect_lines}
+
+请只重新输出这些字段（{', '.join(defects)}），不要输出其他字段。格式如下：
+{{
+  {field_hints}
+}}
+
+只需输出JSON，不要有其他内容。
+"""
+        conversation.append({"role": "assistant", "content": reply})
+        conversation.append({"role": "user", "content": prompt_fix})
+        
+        try:
+            fix_response = chat_completion(
+                route,
+                client=client,
+                messages=conversation
+            )
+            reply = fix_response.choices[0].message.content
+        except Exception as api_error:
+            logger.error(f"字段追问API调用失败: {str(api_error)}")
+            break
+        logger.info("字段追问结果: %s", payload(reply))
+        
+        fixed_fields = _parse_json_reply(reply)
+        if fixed_fields is None:
+            logger.warning("字段追问结果无法解析为JSON")
+            continue
+        for field in defects:
+            if field in fixed_fields:
+                parsed_result[field] = fixed_fields[field]
+        defects = find_field_defects(parsed_result)
+    
+    parsed_result["field_reask_rounds"] = rounds
+    if defects:
+        logger.warning(f"追问后仍有字段存在缺陷: {defects}")
+        parsed_result["field_defects"] = defects
+    else:
+        logger.info("追问后分析结果字段已全部可用")
+    return parsed_result
+
 def multi_round_image_analysis(image_data, task_context):
     """
     通过多轮对话与大模型分析图像，更准确地识别元素和确定操作
@@ -465,180 +568,105 @@ def multi_round_image_analysis(image_data, task_context):
         logger.error("QWEN_API_KEY 环境变量未设置")
         raise ValueError("QWEN_API_KEY 环境变量未设置")
 
-    client = OpenAI(
-        api_key=API_KEY,
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-    )
+    client = get_client()
     
     # 第一轮：场景识别 - 确定当前屏幕环境
-    prompt_scene = f"""
-首先识别当前屏幕场景。请详细分析这个屏幕截图，回答以下问题：
-1. 当前是否在Windows桌面？如果不是，当前环境是什么？
-2. 是否可以看到以下任何界面元素：开始菜单、任务栏、桌面图标、应用窗口？
-3. 当前屏幕最主要/最突出的应用或界面是什么？
-
-请仅回答上述问题，简明扼要地描述您在图像中看到的内容。
-"""
+    prompt_scene = prompts.SCENE_PROMPT
     
     try:
-        logger.info("第一轮对话：场景识别")
-        scene_response = client.chat.completions.create(
-            model="qwen-vl-plus",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt_scene},
-                    {"type": "image_url", 
-                        "image_url": {"url": f"data:image/png;base64,{image_data}"}}
-                ]
-            }]
-        )
-        scene_result = scene_response.choices[0].message.content
-        logger.info(f"场景识别结果: {scene_result}")
-        
-        # 第二轮：目标元素识别 - 寻找任务相关的特定元素
-        prompt_elements = f"""
-基于任务要求，请识别屏幕上的特定元素。
-
-任务信息: {task_context.get('task', '未知任务')}
-
-当前场景描述: {scene_result}
-
-请回答以下问题：
-1. 根据任务"{task_context.get('task', '未知任务')}"，我们需要寻找哪些特定元素？请列出完成任务所需的关键元素。
-2. 这些元素在当前屏幕上是否可见？对于每个元素，给出以下信息：
-   a. 元素名称
-   b. 是否可见
-   c. 如果可见，它的大致位置坐标(x,y)
-3. 如果关键元素不可见，需要执行什么操作才能看到它们？
-
-请详细且具体地回答，这将帮助确定下一步操作。
-"""
-        
-        logger.info("第二轮对话：目标元素识别")
-        elements_response = client.chat.completions.create(
-            model="qwen-vl-plus",
-            messages=[
-                {
+        # 已知的稳定场景先用本地指纹索引识别，命中时跳过场景识别的模型调用
+        # （场景索引依赖numpy，在第一次分析时才导入，不拖慢启动）
+        from app.utils.scene_index import classify_scene
+        local_scene = classify_scene(image_data)
+        SCENE_LOOKUPS.labels("hit" if local_scene else "miss").inc()
+        if local_scene:
+            logger.info("第一轮对话：本地场景识别命中，跳过模型调用")
+            scene_result = local_scene["description"]
+        else:
+            # 场景识别只是分类问题，使用路由配置的低成本模型和缩小后的图像
+            logger.info("第一轮对话：场景识别")
+            scene_response = chat_completion(
+                "scene_classification",
+                client=client,
+                messages=[{
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt_scene},
-                        {"type": "image_url", 
-                            "image_url": {"url": f"data:image/png;base64,{image_data}"}}
+                        image_content(image_data, "scene_classification")
                     ]
-                },
-                {
-                    "role": "assistant",
-                    "content": scene_result
-                },
-                {
-                    "role": "user",
-                    "content": prompt_elements
-                }
-            ]
+                }]
+            )
+            scene_result = scene_response.choices[0].message.content
+        logger.info("场景识别结果: %s", payload(scene_result))
+        
+        # 第二轮：目标元素识别 - 寻找任务相关的特定元素
+        # 各轮的说明和输出格式都在静态的系统提示中，用户消息只包含动态内容，
+        # 第三轮的请求以第二轮的完整请求为前缀，可以复用服务端缓存
+        prompt_elements = prompts.elements_prompt(task_context)
+        
+        # 元素定位需要准确坐标，后续对话使用原始分辨率的截图
+        logger.info("第二轮对话：目标元素识别")
+        elements_messages = [
+            {
+                "role": "system",
+                "content": prompts.MULTI_ROUND_SYSTEM
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt_scene},
+                    image_content(image_data, "element_localization")
+                ]
+            },
+            {
+                "role": "assistant",
+                "content": scene_result
+            },
+            {
+                "role": "user",
+                "content": prompt_elements
+            }
+        ]
+        elements_response = chat_completion(
+            "element_localization",
+            client=client,
+            messages=elements_messages
         )
         elements_result = elements_response.choices[0].message.content
-        logger.info(f"目标元素识别结果: {elements_result}")
+        logger.info("目标元素识别结果: %s", payload(elements_result))
         
         # 第三轮：行动规划 - 基于前两轮对话确定下一步操作
-        prompt_action = f"""
-基于当前场景和目标元素分析，请规划下一步具体操作。
-
-任务信息: {task_context.get('task', '未知任务')}
-已执行步骤数: {task_context.get('steps_executed', 0)}
-上一步操作: {json.dumps(task_context.get('last_action', {}), ensure_ascii=False)}
-
-当前场景: {scene_result}
-
-目标元素分析: {elements_result}
-
-考虑到当前环境和任务目标，请规划一个具体的操作步骤，确保操作安全且有效。特别注意：
-1. 如果当前不在Windows桌面，且任务需要从桌面开始，请先提供返回桌面的操作（如使用Win+D快捷键）
-2. 如果需要点击元素，请确保元素在当前屏幕可见，并提供准确的坐标
-3. 对于不可见的元素，请提供合适的操作序列来访问它们
-4. 考虑任务上下文和已执行步骤，避免重复操作
-
-操作类型必须是以下之一：
-- 键盘操作: type为"keyboard"，action为"press"/"hotkey"/"write"
-- 鼠标操作: type为"mouse"，action为"click"/"move"/"drag"/"scroll"
-不要使用其他类型的操作，如check_environment等，因为程序无法执行它们。
-
-请生成一个标准JSON格式的操作计划，包含以下内容：
-{{
-  "task": "当前任务描述",
-  "current_scene": "当前场景描述",
-  "target_elements": ["目标元素1", "目标元素2"],
-  "status": "进行中/已完成/需要用户确认/失败",
-  "environment_ready": true/false,  // 当前环境是否已准备好执行任务
-  "elements_found": [
-    {{
-      "element": "已找到的元素描述",
-      "x": X坐标,
-      "y": Y坐标,
-      "confidence": 置信度
-    }}
-  ],
-  "elements_not_found": ["未找到的元素1", "未找到的元素2"],
-  "steps": [
-    {{
-      "description": "下一步操作的详细描述",
-      "type": "keyboard/mouse",  // 只能是这两种类型
-      "action": "press/hotkey/write/click/move/drag/scroll",  // 只能是这些操作
-      "value": "按键名或文本内容",
-      "x": X坐标,
-      "y": Y坐标,
-      "delay": 延迟秒数
-    }}
-  ],
-  "reasoning": "分析逻辑和操作理由",
-  "next_expected_scene": "执行操作后预期的场景"
-}}
-
-只需输出JSON，不要有其他内容。确保JSON格式正确，且操作步骤非常具体和精确。
-"""
+        prompt_action = prompts.action_prompt(task_context)
         
         logger.info("第三轮对话：行动规划")
-        action_response = client.chat.completions.create(
-            model="qwen-vl-plus",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt_scene},
-                        {"type": "image_url", 
-                            "image_url": {"url": f"data:image/png;base64,{image_data}"}}
-                    ]
-                },
-                {
-                    "role": "assistant",
-                    "content": scene_result
-                },
-                {
-                    "role": "user",
-                    "content": prompt_elements
-                },
-                {
-                    "role": "assistant",
-                    "content": elements_result
-                },
-                {
-                    "role": "user",
-                    "content": prompt_action
-                }
-            ]
+        action_messages = elements_messages + [
+            {
+                "role": "assistant",
+                "content": elements_result
+            },
+            {
+                "role": "user",
+                "content": prompt_action
+            }
+        ]
+        action_response = chat_completion(
+            "action_planning",
+            client=client,
+            messages=action_messages
         )
         action_result = action_response.choices[0].message.content
-        logger.info(f"行动规划结果: {action_result}")
+        logger.info("行动规划结果: %s", payload(action_result))
         
         # 解析最终的JSON结果
         try:
             # 查找JSON内容（可能被包裹在代码块中）
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|(\{[\s\S]*\})', action_result)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                parsed_result = json.loads(json_str)
-            else:
-                parsed_result = json.loads(action_result)
+            with span("parse"):
+                json_match = re.search(r'```json\s*([\s\S]*?)\s*```|(\{[\s\S]*\})', action_result)
+                if json_match:
+                    json_str = json_match.group(1) or json_match.group(2)
+                    parsed_result = json.loads(json_str)
+                else:
+                    parsed_result = json.loads(action_result)
             
             # 确保结果包含必要的键
             if "steps" not in parsed_result:
@@ -662,6 +690,12 @@ def multi_round_image_analysis(image_data, task_context):
             if "next_expected_scene" not in parsed_result:
                 parsed_result["next_expected_scene"] = "未指定"
             
+            # 本地识别的场景以参考标注为准
+            if local_scene:
+                parsed_result["scene_label"] = local_scene["label"]
+                parsed_result["current_scene"] = local_scene["description"]
+                parsed_result["environment_ready"] = local_scene["environment_ready"]
+            
             # 检查任务是否已完成
             if "任务已完成" in action_result:
                 steps_executed = task_context.get('steps_executed', 0)
@@ -672,6 +706,9 @@ def multi_round_image_analysis(image_data, task_context):
                     logger.warning("任务未执行任何步骤就被判断为完成，可能有误")
                     parsed_result["status"] = "进行中"
             
+            # 只有部分字段不可用时，在同一对话中针对性追问这些字段，而不是重新分析整张截图
+            parsed_result = reask_defective_fields(client, action_messages, action_result, parsed_result)
+            
             # 添加对话历史到结果中
             parsed_result["conversation_history"] = {
                 "scene_analysis": scene_result,
@@ -680,10 +717,12 @@ def multi_round_image_analysis(image_data, task_context):
             }
             
             logger.info("多轮对话图像分析完成")
+            IMAGE_ANALYSES.labels("ok").inc()
             return parsed_result
             
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"解析多轮对话结果时出错: {str(e)}")
+            IMAGE_ANALYSES.labels("parse_error").inc()
             # 构建一个基本的返回结构
             return {
                 "error": f"解析多轮对话结果失败: {str(e)}",
@@ -702,6 +741,7 @@ def multi_round_image_analysis(image_data, task_context):
         
     except Exception as e:
         logger.error(f"多轮对话图像分析过程中发生错误: {str(e)}")
+        IMAGE_ANALYSES.labels("error").inc()
         return {
             "error": str(e),
             "task": task_context.get("task", "出错的任务"),
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多桌面并行执行 - 每个工作进程独占一个Xvfb虚拟显示器，在其上启动目标应用，
+并使用自己的截图和键鼠输入实例；中央调度器把任务放入共享队列，空闲的工作进程依次领取，
+吞吐量随工作进程数（CPU核数）增加
+
+用法:
+    python -m app.pool tasks.txt --workers 4 [-o results.jsonl]
+    python -m app.pool --selftest --workers 2      在无头Linux上用替身应用自检
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import shlex
+import argparse
+import subprocess
+import multiprocessing
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.tracing import start_trace_file, stop_trace_file
+from app.utils.metrics import start_metrics_exporters
+from app.utils.logger import get_logger
+from app.config import (
+    POOL_WORKERS, POOL_DISPLAY_BASE, POOL_SCREEN_SIZE, POOL_XVFB_COMMAND, POOL_TARGET_APP,
+    POOL_POLL_INTERVAL, POOL_TASK_TIMEOUT, BATCH_MAX_STEPS, BATCH_POLICIES, TRACE_FILE
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+# 注意：本模块不能在顶层导入app.main等会创建输入驱动或导入pyautogui的模块，
+# 它们在导入或创建时就连接$DISPLAY，必须在工作进程设置好自己的显示器之后再导入
+
+class VirtualDisplay:
+    """
+    Xvfb虚拟显示器
+    """
+
+    def __init__(self, number, screen_size=POOL_SCREEN_SIZE):
+        self.number = number
+        self.name = f":{number}"
+        self.screen_size = screen_size
+        self.process = None
+
+    @property
+    def socket_path(self):
+        return f"/tmp/.X11-unix/X{self.number}"
+
+    def start(self, timeout=10):
+        """
+        启动Xvfb并等待显示器可用
+        """
+        if os.path.exists(self.socket_path):
+            raise RuntimeError(f"显示器 {self.name} 已被占用")
+        self.process = subprocess.Popen(
+            [POOL_XVFB_COMMAND, self.name, "-screen", "0", self.screen_size, "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        end_time = time.time() + timeout
+        while not os.path.exists(self.socket_path):
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Xvfb启动失败，退出码 {self.process.returncode}")
+            if time.time() > end_time:
+                self.stop()
+                raise RuntimeError(f"等待显示器 {self.name} 超时")
+            time.sleep(0.05)
+        logger.info(f"虚拟显示器 {self.name} 已启动 ({self.screen_size})")
+
+    def stop(self):
+        _stop_process(self.process)
+        self.process = None
+
+def _stop_process(process, timeout=5):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def start_target_app(display_name):
+    """
+    在指定显示器上启动目标应用，未配置POOL_TARGET_APP时启动内置的替身窗口
+
+    Returns:
+        subprocess.Popen: 目标应用进程
+    """
+    command = shlex.split(POOL_TARGET_APP) if POOL_TARGET_APP else [sys.executable, "-m", "app.utils.stand_in_app"]
+    env = dict(os.environ, DISPLAY=display_name)
+    logger.info(f"在显示器 {display_name} 上启动目标应用: {' '.join(command)}")
+    return subprocess.Popen(command, cwd=parent_dir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def _task_runner(worker_id, operation_type, max_steps, policies):
+    """
+    创建在当前显示器上执行任务的函数
+    """
+    from app.main import run_task
+    from app.batch import policy_confirm
+    from app.utils.wechat_guide_parser import get_wechat_guide
+    from app.utils.checkpoint import use_worker_journal
+
+    wechat_guide = get_wechat_guide()
+    # 压缩检查点文件时会整体替换文件，每个工作进程使用自己的文件
+    use_worker_journal(f"worker{worker_id}")
+    screenshots_dir = os.path.join(parent_dir, "screenshots", f"worker{worker_id}")
+
+    def run(task):
+        return run_task(
+            task["instruction"],
+            task.get("operation_type", operation_type),
+            screenshots_dir,
+            wechat_guide,
+            confirm=policy_confirm(dict(policies, **task.get("policies", {}))),
+            max_steps=task.get("max_steps", max_steps),
+            confirm_every=0
+        )
+
+    return run
+
+def _selftest_runner(worker_id, timeout=10):
+    """
+    创建自检函数：确认替身应用已显示在本显示器上，并验证鼠标输入只作用于本显示器
+    """
+    from app.controllers.input_drivers import get_input_driver
+    from app.utils.screen_capture import capture_screen, get_frame_image
+
+    driver = get_input_driver()
+
+    def run(task):
+        start_time = time.time()
+        result = {"instruction": task["instruction"], "stop_reason": "failed", "steps_executed": 0, "error": None}
+
+        # 等待目标应用绘制出窗口（截图不再是单色）
+        while True:
+            image = get_frame_image(capture_screen())
+            if len(image.convert("L").getcolors(256) or []) > 1:
+                break
+            if time.time() - start_time > timeout:
+                result["error"] = "目标应用未显示"
+                return result
+            time.sleep(0.2)
+
+        # 每个工作进程移动到不同的位置，如果显示器没有隔离，读回的位置会互相干扰
+        x, y = task["x"], task["y"]
+        driver.move(x, y)
+        position = tuple(driver.position())
+        result["steps_executed"] = 1
+        if position == (x, y):
+            result["stop_reason"] = "completed"
+        else:
+            result["error"] = f"鼠标位置 {position} 与预期 {(x, y)} 不一致"
+        result["duration"] = round(time.time() - start_time, 3)
+        return result
+
+    return run
+
+def worker_main(worker_id, display_number, task_queue, result_queue, options):
+    """
+    工作进程：启动自己的虚拟显示器和目标应用，然后从任务队列领取任务执行，直到收到None
+    """
+    display = VirtualDisplay(display_number)
+    target_app = None
+    try:
+        display.start()
+        os.environ["DISPLAY"] = display.name
+        target_app = start_target_app(display.name)
+        if options.get("selftest"):
+            run = _selftest_runner(worker_id)
+        else:
+            run = _task_runner(worker_id, options["operation_type"], options["max_steps"], options["policies"])
+    except Exception as e:
+        logger.error(f"工作进程 {worker_id} 启动失败: {str(e)}")
+        result_queue.put({"event": "failed", "worker": worker_id, "error": str(e)})
+        _stop_process(target_app)
+        display.stop()
+        return
+
+    trace_writer = start_trace_file(TRACE_FILE) if TRACE_FILE else None
+    start_metrics_exporters(suffix=f"worker{worker_id}")
+    logger.info(f"工作进程 {worker_id} 就绪，显示器 {display.name}")
+    try:
+        serve_tasks(worker_id, run, task_queue, result_queue, display.name)
+    finally:
+        if trace_writer:
+            stop_trace_file(trace_writer)
+        _stop_process(target_app)
+        display.stop()
+
+def serve_tasks(worker_id, run, task_queue, result_queue, display_name=None):
+    """
+    从任务队列领取任务执行，直到收到None。开始执行前先报告started，
+    工作进程在任务中途退出时调度器据此知道是哪个任务没有完成
+
+    Args:
+        worker_id (int): 工作进程序号
+        run (callable): 执行一个任务的函数，返回结果字典
+        task_queue (Queue): 任务队列，元素为 (任务序号, 任务) 或None
+        result_queue (Queue): 结果队列
+        display_name (str): 工作进程使用的显示器
+    """
+    while True:
+        item = task_queue.get()
+        if item is None:
+            break
+        index, task = item
+        result_queue.put({"event": "started", "worker": worker_id, "index": index})
+        try:
+            result = run(task)
+        except Exception as e:
+            logger.error(f"工作进程 {worker_id} 执行任务出错: {str(e)}")
+            result = {"instruction": task.get("instruction"), "stop_reason": "error",
+                      "steps_executed": 0, "error": str(e)}
+        result.update(index=index, worker=worker_id, display=display_name)
+        result_queue.put({"event": "result", "worker": worker_id, "result": result})
+
+def run_pool(tasks, workers=POOL_WORKERS, results_path=None, operation_type="mixed",
+             max_steps=BATCH_MAX_STEPS, policies=None, selftest=False, task_timeout=POOL_TASK_TIMEOUT,
+             target=None):
+    """
+    调度器：启动工作进程，分发任务并收集结果。等待结果时定期检查工作进程是否存活，
+    工作进程在任务中途退出或任务超时时，该任务记为error；所有工作进程都退出后，
+    未执行的任务同样记为error，调度器不会无限等待
+
+    Args:
+        tasks (list): 任务字典列表
+        workers (int): 工作进程数
+        results_path (str): 结果文件路径（JSONL，追加写入），None表示不写文件
+        operation_type (str): 默认操作方式
+        max_steps (int): 默认最大步骤数
+        policies (dict): 默认确认策略
+        selftest (bool): 是否为自检模式
+        task_timeout (float): 单个任务的最长执行时间（秒），超时结束该工作进程，0表示不限制
+        target (callable): 工作进程入口，默认为worker_main
+
+    Returns:
+        dict: 汇总信息，包含任务数、完成数、总步骤数、失败的工作进程数、总耗时和吞吐量
+    """
+    workers = max(1, min(workers, len(tasks)))
+    options = {
+        "selftest": selftest,
+        "operation_type": operation_type,
+        "max_steps": max_steps,
+        "policies": dict(BATCH_POLICIES if policies is None else policies)
+    }
+
+    # 使用spawn启动，工作进程不继承父进程中已经连接到其他显示器的模块
+    context = multiprocessing.get_context("spawn")
+    task_queue = context.Queue()
+    result_queue = context.Queue()
+    for index, task in enumerate(tasks, 1):
+        task_queue.put((index, task))
+    for _ in range(workers):
+        task_queue.put(None)
+
+    processes = [
+        context.Process(target=target or worker_main,
+                        args=(i, POOL_DISPLAY_BASE + i, task_queue, result_queue, options))
+        for i in range(workers)
+    ]
+    start_time = time.time()
+    for process in processes:
+        process.start()
+    logger.info(f"已启动 {workers} 个工作进程，共 {len(tasks)} 个任务")
+
+    summary = {"tasks": len(tasks), "completed": 0, "steps": 0, "workers": workers, "failed_workers": 0}
+    results = {}
+    running = {}  # 工作进程 -> (任务序号, 开始时间)
+    exited = set()
+    results_file = open(results_path, 'a', encoding='utf-8') if results_path else None
+
+    def record(result):
+        results[result["index"]] = result
+        summary["completed"] += int(result.get("stop_reason") == "completed")
+        summary["steps"] += result.get("steps_executed", 0)
+        print(f"[{len(results)}/{len(tasks)}] 工作进程 {result.get('worker')}: "
+              f"{result['instruction']} -> {result.get('stop_reason')}")
+        if results_file:
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results_file.flush()
+
+    def lost(index, worker, error):
+        return {"instruction": tasks[index - 1].get("instruction"), "stop_reason": "error", "steps_executed": 0,
+                "error": error, "index": index, "worker": worker}
+
+    def handle(message):
+        worker = message["worker"]
+        if message["event"] == "failed":
+            exited.add(worker)
+            summary["failed_workers"] += 1
+            print(f"工作进程 {worker} 启动失败: {message['error']}")
+        elif message["event"] == "started":
+            running[worker] = (message["index"], time.time())
+        elif message["result"]["index"] not in results:
+            # 超时被结束的工作进程可能在结束前刚好发出结果，该任务已记为error
+            running.pop(worker, None)
+            record(message["result"])
+
+    try:
+        while len(results) < len(tasks) and len(exited) < workers:
+            try:
+                handle(result_queue.get(timeout=POOL_POLL_INTERVAL))
+                continue
+            except queue.Empty:
+                pass
+            now = time.time()
+            stopped = {}
+            for worker, process in enumerate(processes):
+                if worker in exited:
+                    continue
+                if process.is_alive():
+                    started = running.get(worker)
+                    if not (started and task_timeout and now - started[1] > task_timeout):
+                        continue
+                    process.terminate()
+                    process.join(5)
+                    stopped[worker] = f"任务超过 {task_timeout} 秒未完成，已结束工作进程 {worker}"
+                else:
+                    stopped[worker] = f"工作进程 {worker} 异常退出（退出码 {process.exitcode}）"
+            if not stopped:
+                continue
+            # 工作进程退出前发出的消息可能刚刚到达
+            try:
+                while True:
+                    handle(result_queue.get(timeout=0.1))
+            except queue.Empty:
+                pass
+            for worker, error in stopped.items():
+                exited.add(worker)
+                if worker in running:
+                    logger.error(error)
+                    summary["failed_workers"] += 1
+                    record(lost(running.pop(worker)[0], worker, error))
+        for index in range(1, len(tasks) + 1):
+            if index not in results:
+                record(lost(index, None, "所有工作进程均已退出，任务未执行"))
+    finally:
+        if results_file:
+            results_file.close()
+        for process in processes:
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+
+    summary["duration"] = round(time.time() - start_time, 3)
+    summary["tasks_per_minute"] = round(len(results) * 60 / summary["duration"], 2) if summary["duration"] else 0.0
+    if summary["failed_workers"]:
+        print(f"{summary['failed_workers']} 个工作进程启动失败或异常退出")
+    print(f"\n并行执行结束: 共 {summary['tasks']} 个任务，完成 {summary['completed']} 个，"
+          f"{workers} 个工作进程，耗时 {summary['duration']} 秒，吞吐量 {summary['tasks_per_minute']} 个/分钟")
+    logger.info(f"并行执行汇总: {summary}")
+    return summary
+
+def selftest_tasks(workers, per_worker=4):
+    """
+    生成自检任务，每个任务把鼠标移动到不同的位置
+    """
+    return [{"instruction": f"自检 {i + 1}", "x": 100 + 10 * i, "y": 100 + 7 * i}
+            for i in range(workers * per_worker)]
+
+def main(argv=None):
+    """
+    并行执行命令行入口
+    """
+    parser = argparse.ArgumentParser(description="微信自动化助手多桌面并行执行")
+    parser.add_argument("tasks", nargs="?", help="任务文件，格式同批处理模式")
+    parser.add_argument("-w", "--workers", type=int, default=POOL_WORKERS, help="工作进程数（虚拟显示器数）")
+    parser.add_argument("-o", "--output", default=os.path.join(parent_dir, "logs", "pool_results.jsonl"),
+                        help="结果文件路径（JSONL，追加写入）")
+    parser.add_argument("--operation-type", default="mixed", choices=["keyboard", "mouse", "mixed"],
+                        help="默认操作方式")
+    parser.add_argument("--max-steps", type=int, default=BATCH_MAX_STEPS, help="每个任务的默认最大步骤数")
+    parser.add_argument("--selftest", action="store_true", help="在虚拟显示器上用替身应用自检")
+    args = parser.parse_args(argv)
+
+    if args.selftest:
+        tasks = selftest_tasks(args.workers)
+        summary = run_pool(tasks, args.workers, selftest=True)
+        return 0 if summary["completed"] == len(tasks) else 1
+
+    if not args.tasks:
+        parser.error("需要指定任务文件，或使用 --selftest")
+    from app.batch import load_tasks
+    tasks = load_tasks(args.tasks)
+    if not tasks:
+        print("任务文件中没有可执行的任务")
+        return 1
+    run_pool(tasks, args.workers, args.output, args.operation_type, args.max_steps)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
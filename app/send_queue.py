@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+消息发送队列 - 位于任务队列之前，把短时间内发给同一联系人的消息合并成一个发送任务，
+在一次打开的聊天中按提交顺序依次发送，不再为每条消息重复搜索联系人和调用模型
+
+流程:
+    submit      消息进入该联系人的待发送分组，第一条消息到达后等待SEND_QUEUE_WINDOW秒
+    合并窗口结束  分组作为一个发送任务提交到任务队列；该联系人已有排队中的发送任务时直接追加到该任务
+    deliver     工作线程执行发送任务：进入聊天一次，依次发送各条消息
+"""
+
+import os
+import sys
+import time
+import uuid
+import threading
+from collections import deque
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.controllers.skills import ChatSkills, SkillError
+from app.utils.metrics import counter, histogram
+from app.utils.logger import get_logger
+from app.config import SEND_QUEUE_WINDOW, SEND_QUEUE_PRIORITY, SEND_QUEUE_MAX_MESSAGES
+
+# 获取日志记录器
+logger = get_logger()
+
+SEND_QUEUE_MESSAGES = counter("wechat_send_queue_messages_total", "发送队列中结束的消息数", ("status",))
+SEND_QUEUE_BATCH_SIZE = histogram("wechat_send_queue_batch_messages", "每次打开聊天发送的消息数",
+                                  buckets=(1, 2, 3, 5, 10, 20, 50))
+
+class SendQueue:
+    """
+    按联系人合并消息的发送队列
+
+    Args:
+        job_queue (JobQueue): 任务服务的任务队列，合并后的发送任务提交到这里
+        window (float): 合并窗口（秒）
+        priority (int): 发送任务的优先级
+        max_finished (int): 内存中保留的已结束消息数
+    """
+
+    def __init__(self, job_queue, window=SEND_QUEUE_WINDOW, priority=SEND_QUEUE_PRIORITY,
+                 max_finished=SEND_QUEUE_MAX_MESSAGES):
+        self.job_queue = job_queue
+        self.window = window
+        self.priority = priority
+        self.messages = {}
+        self._pending = {}
+        self._finished = deque()
+        self._max_finished = max_finished
+        self._lock = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def submit(self, request):
+        """
+        提交一条消息
+
+        Args:
+            request (dict): {"to": 联系人, "text": 消息内容}
+
+        Returns:
+            dict: 消息信息
+        """
+        recipient = str(request.get("to", "")).strip()
+        text = str(request.get("text", "")).strip()
+        if not recipient or not text:
+            raise ValueError("缺少to或text字段")
+
+        message = {
+            "id": uuid.uuid4().hex[:12],
+            "to": recipient,
+            "text": text,
+            "status": "pending",
+            "job_id": None,
+            "submitted_at": time.time(),
+            "sent_at": None,
+            "error": None
+        }
+        with self._lock:
+            self.messages[message["id"]] = message
+            if recipient not in self._pending:
+                self._pending[recipient] = (time.time() + self.window, [])
+            self._pending[recipient][1].append(message)
+            self._lock.notify()
+        logger.info(f"收到发给 {recipient} 的消息 {message['id']}")
+        return dict(message)
+
+    def get(self, message_id):
+        with self._lock:
+            message = self.messages.get(message_id)
+            return dict(message) if message else None
+
+    def list(self):
+        with self._lock:
+            return [dict(message) for message in self.messages.values()]
+
+    def flush(self, force=False):
+        """
+        把合并窗口已结束的分组提交到任务队列
+
+        Args:
+            force (bool): 是否不等合并窗口结束，提交所有分组
+
+        Returns:
+            int: 提交（或追加）的分组数
+        """
+        now = time.time()
+        with self._lock:
+            due = [recipient for recipient, (deadline, _) in self._pending.items() if force or deadline <= now]
+            groups = [(recipient, self._pending.pop(recipient)[1]) for recipient in due]
+        for recipient, messages in groups:
+            # 先标记为排队中，任务可能在提交后立即开始执行
+            with self._lock:
+                for message in messages:
+                    message["status"] = "queued"
+            job_id = self.job_queue.append_messages(recipient, messages)
+            if job_id is None:
+                job = self.job_queue.submit({
+                    "instruction": f"给{recipient}发送{len(messages)}条消息",
+                    "priority": self.priority,
+                    "recipient": recipient,
+                    "messages": messages
+                })
+                job_id = job["id"]
+            else:
+                logger.info(f"发给 {recipient} 的 {len(messages)} 条消息追加到排队中的发送任务 {job_id}")
+            with self._lock:
+                for message in messages:
+                    message["job_id"] = job_id
+        return len(groups)
+
+    def finish(self, messages):
+        """
+        记录已结束的消息，只保留最近的已结束消息，避免长期运行时内存增长
+        """
+        with self._lock:
+            for message in messages:
+                SEND_QUEUE_MESSAGES.labels(message["status"]).inc()
+                self._finished.append(message["id"])
+            while len(self._finished) > self._max_finished:
+                self.messages.pop(self._finished.popleft(), None)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="send-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            self._lock.notify()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                deadlines = [deadline for deadline, _ in self._pending.values()]
+                timeout = max(0.0, min(deadlines) - time.time()) if deadlines else None
+                if timeout is None or timeout > 0:
+                    self._lock.wait(timeout)
+            self.flush()
+
+def deliver(job, skills=None):
+    """
+    执行发送任务：进入聊天一次，按顺序发送各条消息。某条消息发送失败时停止，
+    之后的消息不再发送（保证对方看到的顺序与提交顺序一致）
+
+    Args:
+        job (dict): 任务信息，包含recipient和messages
+        skills (ChatSkills): 确定性操作，默认新建
+
+    Returns:
+        dict: 任务结果，包含 stop_reason、sent、failed、duration、error
+    """
+    skills = skills or ChatSkills()
+    messages = job["messages"]
+    start = time.time()
+    result = {"stop_reason": "completed", "sent": 0, "failed": 0, "duration": 0.0, "error": None}
+    SEND_QUEUE_BATCH_SIZE.observe(len(messages))
+    try:
+        skills.open_chat(job["recipient"])
+        for message in messages:
+            verified = skills.send_text(message["text"])
+            message["status"] = "sent" if verified else "unverified"
+            message["sent_at"] = time.time()
+            if verified is False:
+                # 校验未通过时可能没有进入正确的聊天，不再继续发送
+                raise SkillError(f"消息 {message['id']} 发送校验未通过")
+            result["sent"] += 1
+    except Exception as e:
+        # 除操作失败外，截图、校验等意外错误同样结束本任务，未发送的消息记为失败，工作线程继续执行后续任务
+        error = str(e) if isinstance(e, SkillError) else f"{type(e).__name__}: {str(e)}"
+        logger.error(f"发给 {job['recipient']} 的消息发送失败: {error}")
+        result["stop_reason"] = "failed"
+        result["error"] = error
+        for message in messages:
+            if message["status"] == "queued":
+                message["status"] = "failed"
+                message["error"] = error
+                result["failed"] += 1
+    result["duration"] = round(time.time() - start, 3)
+    return result
@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地任务服务 - 通过HTTP接口接收其他系统提交的微信任务，按优先级和截止时间排队，
+在桌面上串行执行，并提供任务状态和结果查询
+
+接口:
+    POST   /jobs        提交任务 {"instruction", "operation_type", "max_steps", "priority", "deadline"}
+    GET    /jobs        查询所有任务
+    GET    /jobs/<id>   查询单个任务
+    DELETE /jobs/<id>   取消排队中的任务
+    GET    /health      服务状态（ready表示预热是否完成，warmup_errors为预热失败的项目）
+    POST   /messages    提交消息 {"to", "text"}，同一联系人的消息合并后在一次打开的聊天中发送
+    GET    /messages    查询所有消息
+    GET    /messages/<id> 查询单条消息
+    GET    /events      最近的新消息事件（使用 --watch 启动时）
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import heapq
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.main import run_task
+from app.batch import policy_confirm
+from app.send_queue import SendQueue, deliver
+from app.controllers.skills import ChatSkills, SkillError
+from app.models.model_router import get_client
+from app.utils.screen_capture import capture_screen
+from app.utils.wechat_guide_parser import get_wechat_guide
+from app.utils.tracing import start_trace_file
+from app.utils.metrics import render_metrics, start_metrics_dump
+from app.utils.logger import get_logger
+from app.config import (
+    SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_FINISHED_JOBS, BATCH_MAX_STEPS, BATCH_POLICIES, TRACE_FILE,
+    METRICS_FILE, WATCHER_MODE, WATCHER_MAX_EVENTS, WATCHER_ACK_MESSAGE, WATCHER_ACK_PRIORITY,
+    WATCHER_ACK_DEADLINE
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+class JobQueue:
+    """
+    任务队列：优先级高的先执行，同优先级按截止时间、提交顺序执行；
+    由单个工作线程串行执行任务
+    """
+
+    def __init__(self, max_finished=SERVICE_MAX_FINISHED_JOBS):
+        self.jobs = {}
+        self.running = None
+        self._heap = []
+        self._finished = deque()
+        self._counter = 0
+        self._max_finished = max_finished
+        self._lock = threading.Condition()
+
+    def submit(self, request):
+        """
+        提交任务
+
+        Args:
+            request (dict): 任务请求，instruction必填；priority越大越先执行；
+                            deadline为截止时间的Unix时间戳，或用deadline_in指定距现在的秒数
+
+        Returns:
+            dict: 任务信息
+        """
+        instruction = str(request.get("instruction", "")).strip()
+        if not instruction:
+            raise ValueError("缺少instruction字段")
+        operation_type = request.get("operation_type", "mixed")
+        if operation_type not in ("keyboard", "mouse", "mixed"):
+            raise ValueError(f"无效的operation_type: {operation_type}")
+
+        now = time.time()
+        deadline = request.get("deadline")
+        if deadline is None and request.get("deadline_in") is not None:
+            deadline = now + float(request["deadline_in"])
+
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "instruction": instruction,
+            "operation_type": operation_type,
+            "max_steps": int(request.get("max_steps", BATCH_MAX_STEPS)),
+            "policies": dict(BATCH_POLICIES, **request.get("policies", {})),
+            "priority": int(request.get("priority", 0)),
+            "deadline": float(deadline) if deadline is not None else None,
+            "status": "queued",
+            "submitted_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "result": None
+        }
+        if request.get("messages"):
+            # 发送队列合并后的发送任务，由deliver执行，不经过模型分析
+            job["recipient"] = request["recipient"]
+            job["messages"] = list(request["messages"])
+        if request.get("ack"):
+            # 新消息监视提交的自动回复任务，由acknowledge执行，不经过模型分析
+            job["ack"] = dict(request["ack"])
+        with self._lock:
+            self._counter += 1
+            sort_deadline = job["deadline"] if job["deadline"] is not None else float("inf")
+            heapq.heappush(self._heap, (-job["priority"], sort_deadline, self._counter, job["id"]))
+            self.jobs[job["id"]] = job
+            self._lock.notify()
+        logger.info(f"收到任务 {job['id']}: {instruction} (优先级 {job['priority']})")
+        return dict(job)
+
+    def cancel(self, job_id):
+        """
+        取消排队中的任务
+
+        Returns:
+            bool: 是否取消成功
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or job["status"] != "queued":
+                return False
+            job["status"] = "cancelled"
+            job["finished_at"] = time.time()
+            self._mark_finished(job_id)
+        logger.info(f"任务 {job_id} 已取消")
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def append_messages(self, recipient, messages):
+        """
+        把消息追加到该联系人排队中（尚未开始执行）的发送任务
+
+        Returns:
+            str: 追加到的任务ID，没有排队中的发送任务时返回None
+        """
+        with self._lock:
+            for job in self.jobs.values():
+                if job["status"] == "queued" and job.get("recipient") == recipient and "messages" in job:
+                    job["messages"].extend(messages)
+                    job["instruction"] = f"给{recipient}发送{len(job['messages'])}条消息"
+                    return job["id"]
+        return None
+
+    def has_queued_ack(self, signature):
+        """
+        是否已有回复同一会话（名称笔画相同）的自动回复任务在排队
+        """
+        with self._lock:
+            return any(job["status"] == "queued" and job.get("ack", {}).get("signature") == signature
+                       for job in self.jobs.values())
+
+    def queued_count(self):
+        with self._lock:
+            return sum(1 for job in self.jobs.values() if job["status"] == "queued")
+
+    def next_job(self, timeout=None):
+        """
+        取出下一个要执行的任务，已过截止时间的任务直接标记为过期
+
+        Returns:
+            dict: 任务信息，超时时返回None
+        """
+        with self._lock:
+            end_time = None if timeout is None else time.time() + timeout
+            while True:
+                while self._heap:
+                    job = self.jobs.get(heapq.heappop(self._heap)[3])
+                    if not job or job["status"] != "queued":
+                        continue
+                    if job["deadline"] is not None and time.time() > job["deadline"]:
+                        job["status"] = "expired"
+                        job["finished_at"] = time.time()
+                        self._mark_finished(job["id"])
+                        logger.warning(f"任务 {job['id']} 未在截止时间前开始，已过期")
+                        continue
+                    job["status"] = "running"
+                    job["started_at"] = time.time()
+                    self.running = job["id"]
+                    return job
+                remaining = None if end_time is None else end_time - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._lock.wait(remaining)
+
+    def finish(self, job_id, result):
+        """
+        记录任务结果
+        """
+        with self._lock:
+            job = self.jobs[job_id]
+            job["result"] = result
+            job["status"] = "done" if result.get("stop_reason") == "completed" else "failed"
+            job["finished_at"] = time.time()
+            self.running = None
+            self._mark_finished(job_id)
+
+    def _mark_finished(self, job_id):
+        # 只保留最近的已结束任务，避免长期运行时内存增长
+        self._finished.append(job_id)
+        while len(self._finished) > self._max_finished:
+            self.jobs.pop(self._finished.popleft(), None)
+
+def warmup(errors=None):
+    """
+    在服务启动时完成一次性的准备工作（模型客户端、操作指南、场景索引、截图），
+    之后所有任务共享，不再在每个任务中重复付出。某项准备失败时记录错误并继续，
+    任务执行时再按需加载
+
+    Args:
+        errors (list): 失败的准备项及原因追加到这里，供 /health 查询
+
+    Returns:
+        dict: 微信操作指南，加载失败时为None
+    """
+    def load_scene_index():
+        # 场景索引依赖NumPy，导入失败也只影响本地场景识别
+        from app.utils.scene_index import get_scene_index
+        return get_scene_index()
+
+    errors = [] if errors is None else errors
+    start = time.time()
+    wechat_guide = None
+    for name, prepare in (("client", get_client), ("guide", get_wechat_guide), ("scene_index", load_scene_index),
+                          ("screenshot", capture_screen)):
+        try:
+            result = prepare()
+        except Exception as e:
+            logger.warning(f"预热 {name} 失败: {str(e)}")
+            errors.append(f"{name}: {str(e)}")
+            continue
+        if name == "guide":
+            wechat_guide = result
+    logger.info(f"服务预热完成，耗时 {time.time() - start:.2f} 秒" + (f"，{len(errors)} 项失败" if errors else ""))
+    return wechat_guide
+
+def acknowledge(job, skills=None):
+    """
+    执行自动回复任务：按事件中记录的名称笔画在会话列表中重新找到该会话（行号可能已因重新排序而变化），
+    点击进入后发送WATCHER_ACK_MESSAGE；会话已不在列表中或点击后进入的不是该会话时不发送
+
+    Args:
+        job (dict): 任务信息，包含ack
+        skills (ChatSkills): 确定性操作，默认新建
+
+    Returns:
+        dict: 任务结果，包含 stop_reason、row、verified、duration、error
+    """
+    from app.utils.contact_index import unpack_mask
+    skills = skills or ChatSkills()
+    start = time.time()
+    result = {"stop_reason": "completed", "row": None, "verified": None, "duration": 0.0, "error": None}
+    try:
+        result["row"] = skills.open_row(unpack_mask(job["ack"]["signature"]))
+        result["verified"] = skills.send_text(WATCHER_ACK_MESSAGE)
+        if result["verified"] is False:
+            result["stop_reason"] = "unverified"
+    except Exception as e:
+        error = str(e) if isinstance(e, SkillError) else f"{type(e).__name__}: {str(e)}"
+        logger.warning(f"自动回复任务 {job['id']} 未发送: {error}")
+        result["stop_reason"] = "failed"
+        result["error"] = error
+    result["duration"] = round(time.time() - start, 3)
+    return result
+
+def worker_loop(queue, stop_event, ready_event, send_queue=None, warmup_errors=None):
+    """
+    工作线程：先完成预热，再串行执行队列中的任务。预热在工作线程中进行，
+    服务启动后立即可以接收任务，预热期间提交的任务排队等待
+    """
+    wechat_guide = warmup(warmup_errors)
+    ready_event.set()
+    screenshots_dir = os.path.join(parent_dir, "screenshots")
+    while not stop_event.is_set():
+        job = queue.next_job(timeout=1.0)
+        if job is None:
+            continue
+        logger.info(f"开始执行任务 {job['id']}: {job['instruction']}")
+        try:
+            if "messages" in job:
+                result = deliver(job)
+            elif "ack" in job:
+                result = acknowledge(job)
+            else:
+                result = run_task(
+                    job["instruction"],
+                    job["operation_type"],
+                    screenshots_dir,
+                    wechat_guide,
+                    confirm=policy_confirm(job["policies"]),
+                    max_steps=job["max_steps"],
+                    confirm_every=0
+                )
+        except Exception as e:
+            logger.error(f"任务 {job['id']} 执行出错: {str(e)}")
+            result = {"stop_reason": "error", "error": str(e)}
+        if "messages" in job:
+            # deliver本身出错（如无法创建输入驱动）时，尚未发送的消息同样记为失败
+            for message in job["messages"]:
+                if message["status"] == "queued":
+                    message["status"] = "failed"
+                    message["error"] = message["error"] or result.get("error")
+            if send_queue:
+                send_queue.finish(job["messages"])
+        queue.finish(job["id"], result)
+        logger.info(f"任务 {job['id']} 结束: {result.get('stop_reason')}")
+
+def start_watcher(queue, mode, events):
+    """
+    启动新消息监视：事件记录到events供 GET /events 查询；acknowledge模式下对新出现的未读会话提交自动回复任务，
+    任务中记录该会话名称的笔画而不是行号，执行时重新查找该会话。执行任务期间暂停采样，避免把智能体自己的操作当成新消息
+
+    Args:
+        queue (JobQueue): 任务队列
+        mode (str): operator 或 acknowledge
+        events (deque): 最近的事件
+
+    Returns:
+        MessageWatcher: 已启动的监视器
+    """
+    # 监视模块依赖NumPy，只在启用监视时导入
+    from app.utils.message_watcher import MessageWatcher
+
+    def on_event(event):
+        events.append(event)
+        if mode != "acknowledge" or event["type"] != "unread":
+            return
+        # 同一会话的回复还在排队时不重复提交
+        if queue.has_queued_ack(event["signature"]):
+            return
+        job = queue.submit({"instruction": f"回复会话列表第{event['row'] + 1}个会话: {WATCHER_ACK_MESSAGE}",
+                            "ack": {"signature": event["signature"], "row": event["row"]},
+                            "priority": WATCHER_ACK_PRIORITY, "deadline_in": WATCHER_ACK_DEADLINE})
+        event["job_id"] = job["id"]
+
+    watcher = MessageWatcher(on_event, busy=lambda: queue.running is not None)
+    watcher.start()
+    return watcher
+
+def make_handler(queue, ready_event, events=None, send_queue=None, warmup_errors=None):
+    """
+    创建绑定到任务队列的HTTP请求处理类
+
+    Args:
+        queue (JobQueue): 任务队列
+        ready_event (threading.Event): 预热完成后设置
+        events (deque): 新消息事件，未启用监视时为None
+        send_queue (SendQueue): 消息发送队列
+        warmup_errors (list): 预热失败的项目
+    """
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job_id(self):
+            parts = self.path.rstrip("/").split("/")
+            return parts[2] if len(parts) == 3 and parts[1] == "jobs" else None
+
+        def _message_id(self):
+            parts = self.path.rstrip("/").split("/")
+            return parts[2] if len(parts) == 3 and parts[1] == "messages" else None
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", "ready": ready_event.is_set(),
+                                     "warmup_errors": list(warmup_errors or []),
+                                     "queued": queue.queued_count(), "running": queue.running})
+            elif self.path.rstrip("/") == "/jobs":
+                self._send_json(200, {"jobs": queue.list()})
+            elif self.path.rstrip("/") == "/messages" and send_queue:
+                self._send_json(200, {"messages": send_queue.list()})
+            elif self._message_id() and send_queue:
+                message = send_queue.get(self._message_id())
+                if message:
+                    self._send_json(200, message)
+                else:
+                    self._send_json(404, {"error": "消息不存在"})
+            elif self.path.rstrip("/") == "/events":
+                if events is None:
+                    self._send_json(404, {"error": "未启用新消息监视（--watch）"})
+                else:
+                    self._send_json(200, {"events": list(events)})
+            elif self.path.rstrip("/") == "/metrics":
+                body = render_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self._job_id():
+                job = queue.get(self._job_id())
+                if job:
+                    self._send_json(200, job)
+                else:
+                    self._send_json(404, {"error": "任务不存在"})
+            else:
+                self._send_json(404, {"error": "未知的接口"})
+
+        def do_POST(self):
+            path = self.path.rstrip("/")
+            if path not in ("/jobs", "/messages") or (path == "/messages" and not send_queue):
+                self._send_json(404, {"error": "未知的接口"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+                if not isinstance(request, dict):
+                    raise ValueError("请求体必须是JSON对象")
+                if path == "/messages":
+                    created = send_queue.submit(request)
+                else:
+                    # 发送任务只能由发送队列创建，自动回复任务只能由新消息监视创建（两者都不经过模型分析）
+                    request.pop("messages", None)
+                    request.pop("ack", None)
+                    created = queue.submit(request)
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(201, created)
+
+        def do_DELETE(self):
+            job_id = self._job_id()
+            if job_id and queue.cancel(job_id):
+                self._send_json(200, queue.get(job_id))
+            elif job_id and queue.get(job_id):
+                self._send_json(409, {"error": "只能取消排队中的任务"})
+            else:
+                self._send_json(404, {"error": "任务不存在"})
+
+        def log_message(self, format, *args):
+            logger.debug(f"服务请求: {format % args}")
+
+    return JobRequestHandler
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, watch=WATCHER_MODE):
+    """
+    启动任务服务，阻塞直到收到Ctrl+C
+
+    Args:
+        watch (str): 新消息监视模式，operator、acknowledge 或空（不监视）
+    """
+    queue = JobQueue()
+    send_queue = SendQueue(queue)
+    send_queue.start()
+    stop_event, ready_event = threading.Event(), threading.Event()
+    warmup_errors = []
+    worker = threading.Thread(target=worker_loop, args=(queue, stop_event, ready_event, send_queue, warmup_errors),
+                              daemon=True)
+    worker.start()
+
+    events, watcher = None, None
+    if watch:
+        events = deque(maxlen=WATCHER_MAX_EVENTS)
+        watcher = start_watcher(queue, watch, events)
+
+    server = ThreadingHTTPServer((host, port), make_handler(queue, ready_event, events, send_queue, warmup_errors))
+    logger.info(f"任务服务已启动: http://{host}:{port}")
+    print(f"任务服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止任务服务...")
+    finally:
+        stop_event.set()
+        send_queue.stop()
+        if watcher:
+            watcher.stop()
+        server.server_close()
+        logger.info("任务服务已停止")
+
+def main(argv=None):
+    """
+    任务服务命令行入口
+    """
+    parser = argparse.ArgumentParser(description="微信自动化助手本地任务服务")
+    parser.add_argument("--host", default=SERVICE_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="监听端口")
+    parser.add_argument("--watch", choices=("operator", "acknowledge"), default=WATCHER_MODE or None,
+                        help="监视会话列表的新消息：operator只记录事件（GET /events），acknowledge自动提交回复任务")
+    args = parser.parse_args(argv)
+    if TRACE_FILE:
+        start_trace_file(TRACE_FILE)
+    # 任务服务自身提供 /metrics，这里只按配置启动定期写文件
+    if METRICS_FILE:
+        start_metrics_dump(METRICS_FILE)
+    serve(args.host, args.port, args.watch)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
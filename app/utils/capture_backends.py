@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+截图后端 - 统一的屏幕截图接口，可切换后端:
+    pil        PIL.ImageGrab，默认后端
+    mss        MSS库，X11下使用共享内存（XShm），通常比pil快数倍（需要安装mss）
+    replay     循环返回目录中录制好的截图，用于离线复现和压力测试
+    synthetic  生成固定尺寸的合成画面，不需要显示器
+
+用法:
+    python -m app.utils.capture_backends bench [--backends pil mss synthetic] [--frames 30]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.logger import get_logger
+from app.config import CAPTURE_BACKEND, CAPTURE_REPLAY_DIR, CAPTURE_SYNTHETIC_SIZE
+
+# 获取日志记录器
+logger = get_logger()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+# 基准测试使用的常见分辨率
+BENCH_RESOLUTIONS = [(1280, 720), (1920, 1080), (2560, 1440)]
+
+class CaptureBackend:
+    """
+    截图后端接口。region为 (left, top, width, height)，None表示整个屏幕
+    """
+
+    name = "base"
+
+    def grab(self, region=None):
+        """
+        截取屏幕
+
+        Returns:
+            PIL.Image.Image: RGB图像
+        """
+        raise NotImplementedError
+
+class PILCapture(CaptureBackend):
+    """
+    基于PIL.ImageGrab的截图后端
+    """
+
+    name = "pil"
+
+    def __init__(self):
+        from PIL import ImageGrab
+        self._grab = ImageGrab.grab
+
+    def grab(self, region=None):
+        bbox = None
+        if region:
+            left, top, width, height = region
+            bbox = (left, top, left + width, top + height)
+        return self._grab(bbox=bbox).convert("RGB")
+
+class MSSCapture(CaptureBackend):
+    """
+    基于MSS的截图后端。MSS实例不能跨线程使用，每个线程各自创建
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        import mss
+        from PIL import Image
+        self._mss = mss
+        self._frombytes = Image.frombytes
+        self._local = threading.local()
+
+    def _instance(self):
+        if not hasattr(self._local, "sct"):
+            self._local.sct = self._mss.mss()
+        return self._local.sct
+
+    def grab(self, region=None):
+        sct = self._instance()
+        if region:
+            left, top, width, height = region
+            monitor = {"left": left, "top": top, "width": width, "height": height}
+        else:
+            monitor = sct.monitors[1]  # monitors[0]是所有显示器的合并区域
+        shot = sct.grab(monitor)
+        return self._frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+class ReplayCapture(CaptureBackend):
+    """
+    循环返回目录中录制好的截图（按文件名排序），所有帧在创建时加载到内存
+    """
+
+    name = "replay"
+
+    def __init__(self, directory=CAPTURE_REPLAY_DIR):
+        from PIL import Image
+        paths = sorted(glob.glob(os.path.join(directory, "*.png")))
+        if not paths:
+            raise ValueError(f"回放目录中没有PNG截图: {directory}")
+        self.frames = []
+        for path in paths:
+            with Image.open(path) as image:
+                self.frames.append(image.convert("RGB"))
+        self._next = 0
+        self._lock = threading.Lock()
+        logger.info(f"从 {directory} 加载了 {len(self.frames)} 帧回放截图")
+
+    def grab(self, region=None):
+        with self._lock:
+            frame = self.frames[self._next]
+            self._next = (self._next + 1) % len(self.frames)
+        if region:
+            left, top, width, height = region
+            frame = frame.crop((left, top, left + width, top + height))
+        return frame
+
+class SyntheticCapture(CaptureBackend):
+    """
+    生成合成画面：模拟微信主界面的布局色块，每帧的序号不同，保证相邻帧不完全一致
+    """
+
+    name = "synthetic"
+
+    def __init__(self, size=CAPTURE_SYNTHETIC_SIZE):
+        self.size = tuple(size)
+        from PIL import ImageDraw
+        self._count = 0
+        self._draw = ImageDraw.Draw
+        self._base = self._render_base(self.size)
+
+    @staticmethod
+    def _render_base(size):
+        from PIL import Image, ImageDraw
+        width, height = size
+        image = Image.new("RGB", size, (245, 245, 245))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, width // 18, height), fill=(46, 46, 46))  # 左侧导航栏
+        draw.rectangle((width // 18, 0, width // 4, height), fill=(230, 230, 230))  # 会话列表
+        draw.rectangle((width // 18 + 10, 15, width // 4 - 10, 45), fill=(255, 255, 255))  # 搜索框
+        draw.rectangle((width // 4, height * 3 // 4, width, height), fill=(255, 255, 255))  # 输入框
+        return image
+
+    def grab(self, region=None):
+        self._count += 1
+        left, top = 0, 0
+        if region:
+            left, top, width, height = region
+            frame = self._base.crop((left, top, left + width, top + height))
+        else:
+            frame = self._base.copy()
+        self._draw(frame).text((self.size[0] // 3 - left, 20 - top), f"frame {self._count}", fill=(0, 0, 0))
+        return frame
+
+CAPTURE_BACKENDS = {
+    "pil": PILCapture,
+    "mss": MSSCapture,
+    "replay": ReplayCapture,
+    "synthetic": SyntheticCapture,
+}
+
+def create_capture_backend(name):
+    """
+    创建截图后端
+
+    Args:
+        name (str): 后端名称，见CAPTURE_BACKENDS
+
+    Returns:
+        CaptureBackend: 截图后端实例
+    """
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f"未知的截图后端: {name}，可选: {', '.join(CAPTURE_BACKENDS)}")
+    backend = CAPTURE_BACKENDS[name]()
+    logger.info(f"使用截图后端: {name}")
+    return backend
+
+def get_capture_backend():
+    """
+    获取当前进程使用的截图后端（首次调用时按CAPTURE_BACKEND配置创建）
+
+    Returns:
+        CaptureBackend: 截图后端实例
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_capture_backend(CAPTURE_BACKEND)
+    return _backend
+
+def set_capture_backend(backend):
+    """
+    替换当前进程使用的截图后端
+
+    Args:
+        backend (CaptureBackend或str): 后端实例或后端名称
+
+    Returns:
+        CaptureBackend: 新的截图后端
+    """
+    global _backend
+    with _backend_lock:
+        _backend = create_capture_backend(backend) if isinstance(backend, str) else backend
+    return _backend
+
+def benchmark(backend_names, frames=30, resolutions=BENCH_RESOLUTIONS):
+    """
+    测量各后端在常见分辨率下的截图速度。屏幕小于某个分辨率时跳过该分辨率
+
+    Args:
+        backend_names (list): 后端名称列表
+        frames (int): 每种分辨率截取的帧数
+        resolutions (list): (宽, 高) 列表
+
+    Returns:
+        list: 每项为 {backend, resolution, ms_per_frame, fps}，后端不可用时包含error
+    """
+    results = []
+    for name in backend_names:
+        try:
+            backend = create_capture_backend(name)
+            screen_size = backend.grab().size
+        except Exception as e:
+            results.append({"backend": name, "resolution": "-", "error": str(e)})
+            continue
+        for width, height in resolutions:
+            if width > screen_size[0] or height > screen_size[1]:
+                continue
+            region = (0, 0, width, height)
+            backend.grab(region)  # 预热
+            start = time.perf_counter()
+            for _ in range(frames):
+                backend.grab(region)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "backend": name,
+                "resolution": f"{width}x{height}",
+                "ms_per_frame": round(elapsed * 1000 / frames, 2),
+                "fps": round(frames / elapsed, 1)
+            })
+    return results
+
+def main(argv=None):
+    """
+    截图后端命令行入口
+    """
+    parser = argparse.ArgumentParser(description="截图后端基准测试")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--backends", nargs="+", default=["pil", "mss", "synthetic"],
+                        choices=list(CAPTURE_BACKENDS), help="要测试的后端")
+    parser.add_argument("--frames", type=int, default=30, help="每种分辨率截取的帧数")
+    args = parser.parse_args(argv)
+
+    print(f"{'后端':<10}{'分辨率':<12}{'毫秒/帧':>10}{'帧/秒':>10}")
+    for row in benchmark(args.backends, args.frames):
+        if "error" in row:
+            print(f"{row['backend']:<10}不可用: {row['error']}")
+        else:
+            print(f"{row['backend']:<10}{row['resolution']:<12}{row['ms_per_frame']:>10}{row['fps']:>10}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
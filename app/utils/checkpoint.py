@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务检查点 - 执行过程中把任务状态追加写入日志文件（JSONL，每步一两行），
+进程中断（失败保护、网络错误、Ctrl+C）后重新执行同一指令时从最近的检查点恢复，
+不再重新分析指令，已执行的步骤数计入本次的最大步骤数；当前截图与检查点画面一致时还可以直接使用检查点中的分析结果
+
+日志记录:
+    start   指令分析完成: 指令分析结果（计划）
+    step    截图分析完成、执行操作之前: 已执行步骤数、上一步操作、截图指纹、分析结果、正在执行的操作（in_flight）
+    action  操作执行成功: 已执行步骤数、本步操作、已执行操作摘要
+    end     任务完成，之后不再恢复
+
+最后一条是step时，中断发生在执行in_flight的过程中或前后，无法确定它是否已执行。输入文本、回车等操作
+重复执行会重复输入或重复发送消息，恢复时不直接重新执行，而是重新分析当前界面（见is_replayable）。
+
+压缩检查点文件时会整体替换文件，多个进程不能共用同一个文件：多桌面并行执行的每个工作进程
+使用自己的文件（见use_worker_journal）
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.speculation import CACHED_FIELDS, encode_fingerprint, decode_fingerprint
+from app.utils.metrics import counter
+from app.utils.logger import get_logger
+from app.config import (
+    CHECKPOINT_ENABLED, CHECKPOINT_PATH, CHECKPOINT_MAX_AGE, CHECKPOINT_MATCH_THRESHOLD, CHECKPOINT_SUMMARY_STEPS
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+CHECKPOINT_RESUMES = counter("wechat_checkpoint_resumes_total", "从检查点恢复任务的结果", ("outcome",))
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def task_key(instruction, operation_type):
+    """
+    计算任务的键：同一指令和操作方式视为同一任务
+    """
+    raw = json.dumps([instruction, operation_type], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+class TaskJournal:
+    """
+    任务检查点日志：键 -> 该任务最近的状态，追加写入JSONL文件，加载时只保留每个未完成任务的最新状态
+
+    Args:
+        path (str): 日志文件路径，None表示只保存在内存中
+        max_age (float): 超过该时长（秒）的检查点不再恢复
+    """
+
+    def __init__(self, path=None, max_age=CHECKPOINT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._states = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    self._apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    # 进程被强制结束时最后一行可能不完整
+                    continue
+        # 过期的检查点不再需要
+        now = time.time()
+        for key in [key for key, state in self._states.items() if now - state["time"] > self.max_age]:
+            del self._states[key]
+        logger.info(f"从 {self.path} 加载任务检查点: {len(self._states)} 个未完成的任务")
+        if lines > max(2 * len(self._states), 100):
+            with self._lock:
+                self._rewrite()
+
+    def _apply(self, record):
+        key, event = record["key"], record["event"]
+        if event == "end":
+            self._states.pop(key, None)
+        elif event == "start":
+            self._states[key] = dict(record)
+        elif key in self._states:
+            state = self._states[key]
+            state.update(record)
+            if event == "action":
+                # 执行操作之后画面已变化，之前的截图指纹和分析结果不再适用
+                state.pop("fingerprint", None)
+                state.pop("analysis", None)
+                state.pop("in_flight", None)
+
+    def _rewrite(self):
+        # 调用方持有self._lock；其他进程不能同时写这个文件
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for state in self._states.values():
+                f.write(json.dumps(dict(state, event="start"), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _write(self, record):
+        record["time"] = time.time()
+        with self._lock:
+            self._apply(record)
+            if not self.path:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # 每条记录一次O_APPEND写入，进程在写入中途结束时最多丢失最后一行
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+
+    def resume(self, instruction, operation_type):
+        """
+        获取任务最近的检查点
+
+        Returns:
+            dict: 检查点，包含 text_analysis、steps_executed、last_action、summary，
+                  最后一步分析后操作未执行成功时还包含 fingerprint、analysis、in_flight；没有可恢复的检查点时返回None
+        """
+        key = task_key(instruction, operation_type)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or time.time() - state["time"] > self.max_age:
+                return None
+            return json.loads(json.dumps(state))
+
+    def start(self, instruction, operation_type, text_analysis):
+        """
+        记录指令分析结果
+        """
+        self._write({
+            "key": task_key(instruction, operation_type),
+            "event": "start",
+            "instruction": instruction,
+            "operation_type": operation_type,
+            "text_analysis": {field: text_analysis[field] for field in ("task", "context") if field in text_analysis},
+            "steps_executed": 0,
+            "last_action": {},
+            "summary": []
+        })
+
+    def step(self, task_context, fingerprint, analysis):
+        """
+        记录一步的截图分析结果，并把即将执行的第一个操作标记为正在执行（执行操作之前）
+
+        Args:
+            task_context (dict): 任务上下文
+            fingerprint (tuple): 截图的compute_fingerprint返回值
+            analysis (dict): 分析结果
+        """
+        steps = analysis.get("steps") or [{}]
+        self._write({
+            "key": task_key(task_context["instruction"], task_context["operation_type"]),
+            "event": "step",
+            "steps_executed": task_context["steps_executed"],
+            "last_action": task_context["last_action"],
+            "fingerprint": list(encode_fingerprint(*fingerprint)),
+            "analysis": {field: analysis[field] for field in CACHED_FIELDS if field in analysis},
+            "in_flight": steps[0]
+        })
+
+    def action(self, task_context):
+        """
+        记录执行成功的操作
+        """
+        self._write({
+            "key": task_key(task_context["instruction"], task_context["operation_type"]),
+            "event": "action",
+            "steps_executed": task_context["steps_executed"],
+            "last_action": task_context["last_action"],
+            "summary": task_context["summary"][-CHECKPOINT_SUMMARY_STEPS:]
+        })
+
+    def end(self, instruction, operation_type):
+        """
+        任务完成，删除检查点
+        """
+        self._write({"key": task_key(instruction, operation_type), "event": "end"})
+
+def is_replayable(action):
+    """
+    判断中断时正在执行的操作能否在恢复时直接重新执行：输入文本和回车（包括含回车的组合键）
+    重复执行会重复输入或重复发送消息，而截图无法可靠地判断它们在中断前是否已执行
+
+    Args:
+        action (dict): 操作
+
+    Returns:
+        bool: 是否可以直接重新执行
+    """
+    if str(action.get("type", "")).lower() != "keyboard":
+        return True
+    if str(action.get("action", "")).lower() == "write":
+        return False
+    keys = str(action.get("value", "")).lower().replace(" ", "").split("+")
+    return not any(key in ("enter", "return") for key in keys)
+
+def checkpoint_matches(checkpoint, fingerprint, threshold=CHECKPOINT_MATCH_THRESHOLD):
+    """
+    判断能否直接使用检查点中最后一步的分析结果：中断时正在执行的操作可以重新执行，
+    且当前截图与分析时的画面一致
+
+    Args:
+        checkpoint (dict): TaskJournal.resume的返回值
+        fingerprint (tuple): 当前截图的compute_fingerprint返回值
+
+    Returns:
+        bool: 是否可以使用；检查点中没有画面（最后一步操作已执行）或正在执行的操作不能重新执行时返回False
+    """
+    import numpy as np
+    from app.utils.scene_index import HASH_WEIGHT
+    if not checkpoint.get("fingerprint") or not checkpoint.get("analysis"):
+        CHECKPOINT_RESUMES.labels("no_frame").inc()
+        return False
+    if not is_replayable(checkpoint.get("in_flight") or {}):
+        logger.info(f"中断时正在执行的操作不能直接重新执行，重新分析当前界面: {checkpoint['in_flight']}")
+        CHECKPOINT_RESUMES.labels("in_flight").inc()
+        return False
+    saved_hash, saved_hist = decode_fingerprint(*checkpoint["fingerprint"])
+    dhash, hist = fingerprint
+    distance = (HASH_WEIGHT * np.count_nonzero(saved_hash != dhash) / dhash.size
+                + (1 - HASH_WEIGHT) * float(np.abs(saved_hist - hist).sum()) / 2)
+    logger.info(f"当前截图与检查点画面的距离: {distance:.3f}")
+    matched = distance <= threshold
+    CHECKPOINT_RESUMES.labels("matched" if matched else "mismatched").inc()
+    return matched
+
+def get_task_journal():
+    """
+    获取当前进程的任务检查点日志（首次调用时加载CHECKPOINT_PATH）
+
+    Returns:
+        TaskJournal: 任务检查点日志，CHECKPOINT_ENABLED为False时返回None
+    """
+    global _journal
+    if _journal is None and CHECKPOINT_ENABLED:
+        with _journal_lock:
+            if _journal is None:
+                _journal = _load_journal(CHECKPOINT_PATH)
+    return _journal
+
+def _load_journal(path):
+    try:
+        return TaskJournal(path)
+    except OSError as e:
+        logger.warning(f"加载任务检查点失败，仅在内存中记录: {str(e)}")
+        return TaskJournal()
+
+def use_worker_journal(suffix):
+    """
+    当前进程改用自己的检查点文件：CHECKPOINT_PATH的文件名后加后缀（如工作进程编号）
+
+    Args:
+        suffix (str): 后缀
+    """
+    global _journal
+    if not CHECKPOINT_ENABLED:
+        return
+    root, ext = os.path.splitext(CHECKPOINT_PATH)
+    with _journal_lock:
+        _journal = _load_journal(f"{root}.{suffix}{ext}")
+
+def set_task_journal(journal):
+    """
+    替换当前进程的任务检查点日志
+
+    Args:
+        journal (TaskJournal): 任务检查点日志，None表示下次使用时按配置重新加载
+    """
+    global _journal
+    with _journal_lock:
+        _journal = journal
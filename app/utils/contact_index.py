@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+联系人导航索引 - 记录联系人在会话列表中那一行的指纹（头像和名称部分的差值哈希），
+之后只需截取会话列表区域，逐行计算指纹与索引比较，联系人可见时直接点击该行，
+不再执行Ctrl+F搜索、输入名称、等待搜索结果
+
+索引在通过搜索进入聊天且消息发送校验通过后学习：进入聊天后会话列表中该联系人的行处于选中状态，
+按背景颜色找出选中行，记录它的指纹和聊天窗口标题的笔画。
+
+查找分两步：先用头像和名称部分的差值哈希粗筛，再逐像素比较名称的笔画（与背景差别明显的像素，
+按区域内最大差值归一化，对选中与未选中的背景变化不敏感），只有一个字母不同的名称（"Bob"与"Rob"、"Team A"与"Team B"）
+在差值哈希上几乎没有区别，但笔画相差十几个像素。点击进入后再比较聊天窗口标题，与记录的不一致时改用搜索
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+import numpy as np
+from PIL import Image
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.capture_backends import get_capture_backend
+from app.utils.message_watcher import default_region
+from app.utils.metrics import counter
+from app.utils.logger import get_logger
+from app.config import (
+    CONTACT_INDEX_PATH, CONTACT_ROW_KEY_BOX, CONTACT_MATCH_THRESHOLD, CONTACT_SELECTED_MIN_DIFF,
+    CONTACT_INDEX_MAX_ENTRIES, CONTACT_NAME_BOX, CONTACT_INK_LEVEL, CONTACT_MATCH_SHIFT, CONTACT_MATCH_MAX_PIXELS,
+    CONTACT_HEADER_REGION, WATCHER_REGION, WATCHER_ROW_HEIGHT
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+ROW_HASH_SIZE = (16, 8)  # 行指纹的差值哈希为 16x8 = 128 位（行是扁长的区域）
+
+CONTACT_LOOKUPS = counter("wechat_contact_index_lookups_total", "按联系人导航索引查找会话列表中联系人的结果", ("outcome",))
+
+_contact_index = None
+_index_lock = threading.Lock()
+
+def default_header_region(screen_size):
+    """
+    按屏幕尺寸估算聊天窗口标题区域（会话列表右侧、搜索框高度以内）
+
+    Args:
+        screen_size (tuple): (宽, 高)
+
+    Returns:
+        tuple: (left, top, width, height)
+    """
+    width, _ = screen_size
+    return width // 4, 0, width // 2, 60
+
+def _key_image(row_image, key_box):
+    width, height = row_image.size
+    left, top, right, bottom = key_box
+    return row_image.crop((int(width * left), int(height * top), int(width * right), int(height * bottom)))
+
+def row_fingerprint(row_image, key_box=CONTACT_ROW_KEY_BOX):
+    """
+    计算会话列表中一行的指纹（用于粗筛）
+
+    Args:
+        row_image (PIL.Image.Image): 一行的截图
+        key_box (tuple): 用于计算指纹的部分（相对行宽高的 左, 上, 右, 下）
+
+    Returns:
+        numpy.ndarray: 128位差值哈希的布尔数组
+    """
+    hash_width, hash_height = ROW_HASH_SIZE
+    gray = _key_image(row_image, key_box).convert("L").resize((hash_width + 1, hash_height), Image.BILINEAR)
+    gray = np.asarray(gray, dtype=np.int16)
+    return (gray[:, 1:] > gray[:, :-1]).ravel()
+
+def ink_mask(image, level=CONTACT_INK_LEVEL):
+    """
+    计算截图的笔画：与背景（中位数）的差值达到区域内最大差值的level比例的像素。
+    同一行选中与未选中时文字的抗锯齿比例不变，按最大差值归一化后得到相同的笔画
+
+    Args:
+        image (PIL.Image.Image): 截图（全分辨率）
+        level (float): 笔画的归一化差值下限
+
+    Returns:
+        numpy.ndarray: 与截图同尺寸的二维布尔数组
+    """
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    diff = np.abs(gray - np.median(gray))
+    return diff >= level * max(float(diff.max()), 1.0)
+
+def ink_mismatch(saved, current, shift=CONTACT_MATCH_SHIFT):
+    """
+    比较两组笔画，允许错位shift个像素，返回不同的像素数的最小值
+
+    Args:
+        saved (numpy.ndarray): 记录的笔画
+        current (numpy.ndarray): 当前截图的笔画
+
+    Returns:
+        int: 不同的像素数，尺寸不同（如会话列表区域变化）时返回全部像素数
+    """
+    if saved.shape != current.shape:
+        return int(saved.size)
+    height, width = saved.shape
+    core = saved[shift:height - shift, shift:width - shift]
+    best = int(saved.size)
+    for dy in range(-shift, shift + 1):
+        for dx in range(-shift, shift + 1):
+            moved = current[shift + dy:height - shift + dy, shift + dx:width - shift + dx]
+            best = min(best, int(np.count_nonzero(core != moved)))
+    return best
+
+def row_signature(row_image):
+    """
+    计算会话列表中一行的特征：粗筛用的差值哈希和逐像素比较用的名称笔画
+
+    Returns:
+        dict: {hash, ink}
+    """
+    return {"hash": row_fingerprint(row_image), "ink": ink_mask(_key_image(row_image, CONTACT_NAME_BOX))}
+
+def pack_mask(mask):
+    """
+    把笔画转换为可以写入JSON的形式
+
+    Returns:
+        dict: {shape, bits}，mask为None时返回None
+    """
+    if mask is None:
+        return None
+    return {"shape": list(mask.shape), "bits": np.packbits(mask).tobytes().hex()}
+
+def unpack_mask(data):
+    """
+    pack_mask的逆操作
+    """
+    if data is None:
+        return None
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(data["bits"]), dtype=np.uint8)).astype(bool)
+    height, width = data["shape"]
+    return bits[:height * width].reshape(height, width)
+
+def find_row(ink, rows, max_pixels=CONTACT_MATCH_MAX_PIXELS):
+    """
+    在会话列表的各行中查找名称笔画与ink一致的行（不需要已记录的联系人，如新消息监视记录的未读会话）
+
+    Args:
+        ink (numpy.ndarray): 名称笔画（row_signature的ink）
+        rows (list): ContactIndex.capture_rows的返回值
+        max_pixels (int): 笔画最多不同的像素数
+
+    Returns:
+        int: 笔画最接近的行号，没有一致的行时返回None
+    """
+    best_row, best_pixels = None, max_pixels + 1
+    for row, row_image in enumerate(rows):
+        pixels = ink_mismatch(ink, row_signature(row_image)["ink"])
+        if pixels < best_pixels:
+            best_row, best_pixels = row, pixels
+    return best_row
+
+class ContactIndex:
+    """
+    联系人 -> 会话列表行指纹的索引，保存在JSON文件中
+
+    Args:
+        path (str): 索引文件路径，None表示只保存在内存中
+        region (tuple): 会话列表区域 (left, top, width, height)，None表示按配置或屏幕尺寸估算
+        row_height (int): 每行高度（像素）
+        threshold (float): 差值哈希粗筛的阈值
+        max_pixels (int): 笔画最多不同的像素数
+        max_entries (int): 最多记录的联系人数
+        header_region (tuple): 聊天窗口标题区域 (left, top, width, height)，None表示按屏幕尺寸估算
+    """
+
+    def __init__(self, path=None, region=WATCHER_REGION, row_height=WATCHER_ROW_HEIGHT,
+                 threshold=CONTACT_MATCH_THRESHOLD, max_pixels=CONTACT_MATCH_MAX_PIXELS,
+                 max_entries=CONTACT_INDEX_MAX_ENTRIES, header_region=CONTACT_HEADER_REGION):
+        self.path = path
+        self.region = tuple(region) if region else None
+        self.row_height = row_height
+        self.threshold = threshold
+        self.max_pixels = max_pixels
+        self.max_entries = max_entries
+        self.header_region = tuple(header_region) if header_region else None
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"读取联系人导航索引失败: {str(e)}")
+            return
+        for name, entry in data.items():
+            if "ink" not in entry:
+                # 旧版本只记录了差值哈希，无法区分名称相近的联系人，重新通过搜索学习
+                continue
+            dhash = np.unpackbits(np.frombuffer(bytes.fromhex(entry["hash"]), dtype=np.uint8)).astype(bool)
+            self.entries[name] = {"hash": dhash, "ink": unpack_mask(entry["ink"]),
+                                  "header": unpack_mask(entry.get("header")), "row": entry.get("row"),
+                                  "used_at": entry.get("used_at", 0)}
+        logger.info(f"从 {self.path} 加载联系人导航索引: {len(self.entries)} 个联系人")
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {name: {"hash": np.packbits(entry["hash"]).tobytes().hex(), "ink": pack_mask(entry["ink"]),
+                       "header": pack_mask(entry["header"]), "row": entry["row"], "used_at": entry["used_at"]}
+                for name, entry in self.entries.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def capture_rows(self):
+        """
+        截取会话列表区域并按行切分
+
+        Returns:
+            list: 每行的截图
+        """
+        backend = get_capture_backend()
+        if self.region is None:
+            self.region = default_region(backend.grab().size)
+        image = backend.grab(self.region)
+        rows = image.size[1] // self.row_height
+        return [image.crop((0, row * self.row_height, image.size[0], (row + 1) * self.row_height))
+                for row in range(rows)]
+
+    def capture_header(self):
+        """
+        截取聊天窗口标题区域
+
+        Returns:
+            numpy.ndarray: 标题的笔画
+        """
+        backend = get_capture_backend()
+        if self.header_region is None:
+            self.header_region = default_header_region(backend.grab().size)
+        return ink_mask(backend.grab(self.header_region))
+
+    def row_center(self, row):
+        """
+        行中心的屏幕坐标
+
+        Returns:
+            tuple: (x, y)
+        """
+        left, top, width, _ = self.region
+        return left + width // 2, top + row * self.row_height + self.row_height // 2
+
+    def selected_row(self, rows):
+        """
+        按背景颜色找出选中行：取每行右下角一小块的平均颜色，与各行的中位数差别最大且超过阈值的行
+
+        Args:
+            rows (list): capture_rows的返回值
+
+        Returns:
+            int: 选中行的序号，无法识别时返回None
+        """
+        if len(rows) < 3:
+            return None
+        width, height = rows[0].size
+        corner = (width * 9 // 10, height * 3 // 4, width - 2, height - 2)
+        colors = np.array([np.asarray(row.convert("RGB").crop(corner), dtype=np.float32).mean(axis=(0, 1))
+                           for row in rows])
+        diffs = np.abs(colors - np.median(colors, axis=0)).mean(axis=1)
+        best = int(np.argmax(diffs))
+        # 选中行应该唯一：第二大的差值明显更小
+        second = np.partition(diffs, -2)[-2]
+        if diffs[best] < CONTACT_SELECTED_MIN_DIFF or second >= diffs[best] / 2:
+            return None
+        return best
+
+    def selected_fingerprint(self):
+        """
+        截取会话列表和聊天窗口标题，返回选中行的序号和特征，供发送校验通过后调用learn
+
+        Returns:
+            tuple: (行号, 特征)，特征为 {hash, ink, header}；无法识别选中行时返回None
+        """
+        rows = self.capture_rows()
+        row = self.selected_row(rows)
+        if row is None:
+            return None
+        return row, dict(row_signature(rows[row]), header=self.capture_header())
+
+    def learn(self, name, row, signature):
+        """
+        记录联系人的行特征
+
+        Args:
+            name (str): 联系人名称
+            row (int): 行号
+            signature (dict): selected_fingerprint返回的特征
+        """
+        with self._lock:
+            self.entries[name] = {"hash": signature["hash"], "ink": signature["ink"],
+                                  "header": signature.get("header"), "row": row, "used_at": time.time()}
+            if len(self.entries) > self.max_entries:
+                oldest = min(self.entries, key=lambda key: self.entries[key]["used_at"])
+                self.entries.pop(oldest)
+            self._save()
+        logger.info(f"联系人导航索引记录 {name}: 第 {row + 1} 行")
+
+    def forget(self, name):
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._save()
+
+    def locate(self, name):
+        """
+        在当前会话列表中查找联系人：某一行与该联系人差值哈希的距离低于阈值，
+        且名称的笔画最多有max_pixels个像素不同，才认为是该联系人
+
+        Args:
+            name (str): 联系人名称
+
+        Returns:
+            int: 行号，不可见或未记录时返回None
+        """
+        with self._lock:
+            if name not in self.entries:
+                CONTACT_LOOKUPS.labels("unknown").inc()
+                return None
+            dhash, ink = self.entries[name]["hash"], self.entries[name]["ink"]
+
+        best_row, best_pixels, rejected = None, self.max_pixels + 1, False
+        for row, row_image in enumerate(self.capture_rows()):
+            if np.count_nonzero(dhash != row_fingerprint(row_image)) / dhash.size >= self.threshold:
+                continue
+            pixels = ink_mismatch(ink, ink_mask(_key_image(row_image, CONTACT_NAME_BOX)))
+            if pixels > self.max_pixels:
+                # 差值哈希相近但笔画不同：名称相近的其他联系人
+                rejected = True
+                logger.info(f"会话列表第 {row + 1} 行与联系人 {name} 的笔画相差 {pixels} 个像素，不是该联系人")
+            elif pixels < best_pixels:
+                best_row, best_pixels = row, pixels
+
+        if best_row is None:
+            CONTACT_LOOKUPS.labels("rejected" if rejected else "miss").inc()
+            return None
+        with self._lock:
+            if name in self.entries:
+                self.entries[name]["row"] = best_row
+                self.entries[name]["used_at"] = time.time()
+        CONTACT_LOOKUPS.labels("hit").inc()
+        logger.info(f"联系人 {name} 在会话列表第 {best_row + 1} 行（笔画相差 {best_pixels} 个像素）")
+        return best_row
+
+    def verify_header(self, name):
+        """
+        点击进入聊天后比较聊天窗口标题与记录的是否一致
+
+        Args:
+            name (str): 联系人名称
+
+        Returns:
+            bool: 是否一致；未记录标题时返回True（只依据行的比较）
+        """
+        with self._lock:
+            entry = self.entries.get(name)
+            header = entry["header"] if entry else None
+        if header is None:
+            return True
+        pixels = ink_mismatch(header, self.capture_header())
+        if pixels > self.max_pixels:
+            CONTACT_LOOKUPS.labels("header_mismatch").inc()
+            logger.warning(f"聊天窗口标题与联系人 {name} 记录的标题相差 {pixels} 个像素")
+            return False
+        return True
+
+def get_contact_index():
+    """
+    获取当前进程的联系人导航索引（首次调用时从CONTACT_INDEX_PATH加载）
+
+    Returns:
+        ContactIndex: 联系人导航索引
+    """
+    global _contact_index
+    if _contact_index is None:
+        with _index_lock:
+            if _contact_index is None:
+                _contact_index = ContactIndex(CONTACT_INDEX_PATH)
+    return _contact_index
+
+def set_contact_index(index):
+    """
+    替换当前进程的联系人导航索引（如基准测试中使用不落盘的索引），None表示下次重新加载
+
+    Args:
+        index (ContactIndex): 联系人导航索引
+    """
+    global _contact_index
+    with _index_lock:
+        _contact_index = index
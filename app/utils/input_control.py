@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import pyautogui
 import time
 import sys
 import os
@@ -13,15 +12,11 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 from app.utils.logger import get_logger
+from app.controllers.input_drivers import get_input_driver
 
 # 获取日志记录器
 logger = get_logger()
 
-# 设置安全措施，避免失控（移动到屏幕角落会触发失败保护）
-pyautogui.FAILSAFE = True
-# 设置操作之间的延迟
-pyautogui.PAUSE = 0.5
-
 def perform_keyboard_action(action_type, value=None):
     """
     执行键盘操作
@@ -33,7 +28,7 @@ def perform_keyboard_action(action_type, value=None):
     logger.info(f"执行键盘操作: {action_type}, 值: {value}")
     try:
         if action_type == 'press':
-            pyautogui.press(value)
+            get_input_driver().press(value)
             logger.info(f"已按下键: {value}")
             print(f"已按下键: {value}")
         
@@ -47,24 +42,24 @@ def perform_keyboard_action(action_type, value=None):
                     logger.error(f"无法将 {value} 转换为组合键")
                     raise ValueError(f"组合键必须是列表或字符串，而不是 {type(value)}")
             
-            pyautogui.hotkey(*value)
+            get_input_driver().hotkey(*value)
             logger.info(f"已执行组合键: {'+'.join(value)}")
             print(f"已执行组合键: {'+'.join(value)}")
         
         elif action_type == 'write':
             if value is None or value == "":
                 logger.warning("尝试写入空文本")
-            pyautogui.write(value)
+            get_input_driver().write(value)
             logger.info(f"已输入文本: {value}")
             print(f"已输入文本: {value}")
             
         elif action_type == 'keyDown':
-            pyautogui.keyDown(value)
+            get_input_driver().key_down(value)
             logger.info(f"按住键: {value}")
             print(f"按住键: {value}")
             
         elif action_type == 'keyUp':
-            pyautogui.keyUp(value)
+            get_input_driver().key_up(value)
             logger.info(f"释放键: {value}")
             print(f"释放键: {value}")
             
@@ -96,32 +91,33 @@ def perform_mouse_action(action_type, x=None, y=None, clicks=1, button='left'):
         raise ValueError("鼠标操作需要有效的x和y坐标")
         
     try:
+        driver = get_input_driver()
         if action_type == 'click':
             # 检查坐标是否超出屏幕范围
-            screen_width, screen_height = pyautogui.size()
+            screen_width, screen_height = driver.size()
             if x < 0 or x > screen_width or y < 0 or y > screen_height:
                 logger.warning(f"点击坐标 ({x}, {y}) 可能超出屏幕范围 ({screen_width}x{screen_height})")
                 
-            pyautogui.click(x=x, y=y, clicks=clicks, button=button)
+            driver.click(x=x, y=y, button=button, clicks=clicks)
             logger.info(f"已在位置 ({x}, {y}) 点击 {button} 键 {clicks} 次")
             print(f"已在位置 ({x}, {y}) 点击 {button} 键 {clicks} 次")
             
         elif action_type == 'move':
-            pyautogui.moveTo(x, y)
+            driver.move(x, y)
             logger.info(f"已移动鼠标到位置 ({x}, {y})")
             print(f"已移动鼠标到位置 ({x}, {y})")
             
         elif action_type == 'drag':
             # 需要起始位置和目标位置
-            current_x, current_y = pyautogui.position()
+            current_x, current_y = driver.position()
             logger.debug(f"开始拖拽，当前位置: ({current_x}, {current_y}) 到目标位置: ({x}, {y})")
-            pyautogui.dragTo(x, y, button=button)
+            driver.drag(x, y, button=button)
             logger.info(f"已从 ({current_x}, {current_y}) 拖动到 ({x}, {y})")
             print(f"已从 ({current_x}, {current_y}) 拖动到 ({x}, {y})")
             
         elif action_type == 'scroll':
             # x表示滚动的单位
-            pyautogui.scroll(x)
+            driver.scroll(x)
             logger.info(f"已滚动 {x} 单位")
             print(f"已滚动 {x} 单位")
             
@@ -142,7 +138,7 @@ def get_current_mouse_position():
         tuple: (x, y) 坐标
     """
     try:
-        x, y = pyautogui.position()
+        x, y = get_input_driver().position()
         logger.debug(f"当前鼠标位置: ({x}, {y})")
         return x, y
     except Exception as e:
@@ -2,12 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import os
+import atexit
+import random
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import sys
 import os
 
+from app.config import LOG_ASYNC, LOG_PAYLOAD_MAX_CHARS, LOG_PAYLOAD_SAMPLE_RATE
+
 # 获取当前文件所在目录的父目录的父目录（项目根目录）
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -55,9 +60,65 @@ formatter = logging.Formatter(
 console_handler.setFormatter(formatter)
 file_handler.setFormatter(formatter)
 
-# 添加处理器到日志记录器
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+class _DeferredQueueHandler(QueueHandler):
+    """
+    只把日志记录放入队列的处理器。QueueHandler默认在调用线程中格式化消息（为了跨进程传递），
+    这里记录只在本进程内传递，消息格式化和参数的字符串转换都留给后台线程
+    """
+
+    def prepare(self, record):
+        return record
+
+if LOG_ASYNC:
+    # 控制台和文件写入由后台线程完成，记录日志的线程只做入队
+    log_queue = queue.SimpleQueue()
+    queue_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    queue_listener.start()
+    # 退出时写完队列中剩余的日志
+    atexit.register(queue_listener.stop)
+    logger.addHandler(_DeferredQueueHandler(log_queue))
+else:
+    # 添加处理器到日志记录器
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+class LazyPayload:
+    """
+    延迟格式化的大段日志内容（模型回复、原始响应等）。作为日志参数传入，
+    只有日志级别启用、真正写出时才转换为字符串，并按配置截断或抽样
+
+    用法:
+        logger.info("场景识别结果: %s", payload(scene_result))
+    """
+
+    __slots__ = ("value", "max_chars", "sample_rate")
+
+    def __init__(self, value, max_chars=LOG_PAYLOAD_MAX_CHARS, sample_rate=LOG_PAYLOAD_SAMPLE_RATE):
+        self.value = value
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else str(self.value)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return f"<未抽样，共{len(text)}字符>"
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}...<已截断，共{len(text)}字符>"
+        return text
+
+def payload(value, max_chars=LOG_PAYLOAD_MAX_CHARS, sample_rate=LOG_PAYLOAD_SAMPLE_RATE):
+    """
+    包装大段日志内容，延迟到写出时才格式化
+
+    Args:
+        value: 日志内容，写出时转换为字符串
+        max_chars (int): 最大字符数，0表示不截断
+        sample_rate (float): 记录内容的比例，未抽中时只记录长度
+
+    Returns:
+        LazyPayload: 可作为日志参数的对象
+    """
+    return LazyPayload(value, max_chars, sample_rate)
 
 def get_logger():
     """
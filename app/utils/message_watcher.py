@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+新消息监视 - 在后台按固定间隔只截取会话列表区域，与上一次采样逐行比较：
+    unread   某一行出现了未读角标（或带角标的行内容变化，如新消息把会话顶到最前）
+    changed  没有角标的行内容变化（如当前打开的会话收到消息）
+第一次采样（以及会话列表行数变化后）只作为比较基准，已有的未读角标不产生事件。
+未读事件中记录该行名称的笔画（signature），会话列表重新排序后仍能找到同一个会话。
+比较只是几次NumPy数组运算，一次采样在毫秒级；只有产生事件时才需要调用截图分析和模型
+
+用法:
+    watcher = MessageWatcher(on_event=handle_event, busy=lambda: queue.running is not None)
+    watcher.start()
+"""
+
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.capture_backends import get_capture_backend
+from app.utils.metrics import counter, histogram
+from app.utils.logger import get_logger
+from app.config import (
+    WATCHER_INTERVAL, WATCHER_REGION, WATCHER_ROW_HEIGHT, WATCHER_SAMPLE_STRIDE, WATCHER_BADGE_COLOR,
+    WATCHER_BADGE_TOLERANCE, WATCHER_BADGE_MIN_PIXELS, WATCHER_ROW_DIFF_THRESHOLD
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+WATCHER_SAMPLES = counter("wechat_watcher_samples_total", "会话列表区域的采样次数")
+WATCHER_EVENTS = counter("wechat_watcher_events_total", "新消息监视产生的事件", ("type",))
+WATCHER_SAMPLE_LATENCY = histogram("wechat_watcher_sample_seconds", "一次采样（截取区域并比较）的耗时",
+                                   buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+def default_region(screen_size):
+    """
+    按屏幕尺寸估算会话列表区域
+
+    Args:
+        screen_size (tuple): (宽, 高)
+
+    Returns:
+        tuple: (left, top, width, height)
+    """
+    width, height = screen_size
+    left, right, top = width // 18, width // 4, 60
+    return left, top, right - left, height - top
+
+class ChatListDetector:
+    """
+    比较会话列表区域相邻两次采样，按行找出新出现的未读角标和内容变化
+
+    Args:
+        row_height (int): 每行高度（像素）
+        stride (int): 采样步长
+        badge_color (tuple): 未读角标颜色
+        tolerance (int): 各通道与角标颜色的最大差值
+        min_badge_pixels (int): 一行中角标颜色像素数的下限（全分辨率）
+        diff_threshold (float): 行内像素平均变化的阈值
+    """
+
+    def __init__(self, row_height=WATCHER_ROW_HEIGHT, stride=WATCHER_SAMPLE_STRIDE, badge_color=WATCHER_BADGE_COLOR,
+                 tolerance=WATCHER_BADGE_TOLERANCE, min_badge_pixels=WATCHER_BADGE_MIN_PIXELS,
+                 diff_threshold=WATCHER_ROW_DIFF_THRESHOLD):
+        self.row_height = row_height
+        self.stride = stride
+        self.badge_color = np.array(badge_color, dtype=np.int16)
+        self.tolerance = tolerance
+        self.min_badge_pixels = max(1, min_badge_pixels // (stride * stride))
+        self.diff_threshold = diff_threshold
+        self._frame = None
+        self._badges = None
+
+    def reset(self):
+        """
+        丢弃上一次采样（如期间智能体自己操作了界面），保留各行的角标状态，已报告过的角标不再重复报告
+        """
+        self._frame = None
+
+    def _rows(self, values):
+        # 按行高分组，不足一行的部分忽略
+        rows = values.shape[0] // self._sampled_row_height
+        return values[:rows * self._sampled_row_height].reshape(rows, self._sampled_row_height, *values.shape[1:])
+
+    def update(self, image):
+        """
+        处理一次采样
+
+        Args:
+            image (PIL.Image.Image): 会话列表区域的截图
+
+        Returns:
+            list: 事件列表，每项为 {type, row(从0开始), ...}；第一次采样只作为比较基准，返回空列表
+        """
+        frame = np.asarray(image.convert("RGB"))[::self.stride, ::self.stride].astype(np.int16)
+        self._sampled_row_height = max(1, self.row_height // self.stride)
+
+        badge_mask = (np.abs(frame - self.badge_color) <= self.tolerance).all(axis=2)
+        badge_pixels = self._rows(badge_mask).sum(axis=(1, 2))
+        badges = badge_pixels >= self.min_badge_pixels
+
+        if self._frame is not None and self._frame.shape == frame.shape:
+            row_diff = self._rows(np.abs(frame - self._frame)).mean(axis=(1, 2, 3))
+        else:
+            row_diff = None
+        previous_badges = self._badges if self._badges is not None and len(self._badges) == len(badges) else None
+        self._frame, self._badges = frame, badges
+        if previous_badges is None:
+            # 启动监视前就有的未读角标不是新消息，不报告
+            return []
+
+        events = []
+        changed_rows = []
+        for row in range(len(badges)):
+            changed = row_diff is not None and row_diff[row] > self.diff_threshold
+            is_new_badge = badges[row] and not previous_badges[row]
+            if is_new_badge or (badges[row] and changed):
+                events.append({"type": "unread", "row": row, "badge_pixels": int(badge_pixels[row]) * self.stride ** 2})
+            elif changed:
+                changed_rows.append(row)
+        if changed_rows and not events:
+            # 有未读角标时其他行的变化通常只是会话位置移动，不单独报告
+            events.append({"type": "changed", "rows": changed_rows})
+        return events
+
+class MessageWatcher:
+    """
+    新消息监视线程
+
+    Args:
+        on_event (callable): on_event(event)，在监视线程中调用
+        region (tuple): 会话列表区域 (left, top, width, height)，None表示按配置或屏幕尺寸估算
+        interval (float): 采样间隔（秒）
+        busy (callable): 返回True时暂停采样（如智能体正在执行任务），恢复后以新的截图为比较基准
+        detector (ChatListDetector): 检测器
+    """
+
+    def __init__(self, on_event, region=WATCHER_REGION, interval=WATCHER_INTERVAL, busy=None, detector=None):
+        self.on_event = on_event
+        self.region = tuple(region) if region else None
+        self.interval = interval
+        self.busy = busy
+        self.detector = detector or ChatListDetector()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="message-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"新消息监视已启动，每 {self.interval}s 采样一次会话列表区域")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def sample(self):
+        """
+        采样一次并分发事件
+
+        Returns:
+            list: 本次产生的事件
+        """
+        # 联系人导航索引模块导入了本模块的default_region，在这里导入避免循环导入
+        from app.utils.contact_index import row_signature, pack_mask
+        start = time.perf_counter()
+        backend = get_capture_backend()
+        if self.region is None:
+            self.region = default_region(backend.grab().size)
+            logger.info(f"会话列表区域: {self.region}")
+        image = backend.grab(self.region)
+        events = self.detector.update(image)
+        WATCHER_SAMPLES.inc()
+        WATCHER_SAMPLE_LATENCY.observe(time.perf_counter() - start)
+
+        left, top, width, _ = self.region
+        row_height = self.detector.row_height
+        for event in events:
+            WATCHER_EVENTS.labels(event["type"]).inc()
+            event["time"] = time.time()
+            if event["type"] == "unread":
+                # 行中心的屏幕坐标，便于直接点击该会话
+                event["x"] = left + width // 2
+                event["y"] = top + event["row"] * row_height + row_height // 2
+                # 行号会随会话列表重新排序而变化，回复前按名称的笔画重新查找该会话
+                row_image = image.crop((0, event["row"] * row_height, image.size[0], (event["row"] + 1) * row_height))
+                event["signature"] = pack_mask(row_signature(row_image)["ink"])
+            logger.info(f"新消息监视事件: { {key: value for key, value in event.items() if key != 'signature'} }")
+            self.on_event(event)
+        return events
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            if self.busy and self.busy():
+                self.detector.reset()
+                continue
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"会话列表采样失败: {str(e)}")
+                self.detector.reset()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行指标 - 进程内的计数器和直方图注册表，按Prometheus文本格式导出，
+可以通过本地HTTP端点抓取（/metrics），也可以定期写入文件（配合node_exporter的textfile收集器）
+
+更新指标只是在锁内做几次加法，不做格式化和I/O，可以放在主循环中
+
+用法:
+    MODEL_CALLS = counter("wechat_model_calls_total", "模型调用次数", ("route", "outcome"))
+    MODEL_CALLS.labels("scene_classification", "ok").inc()
+"""
+
+import os
+import sys
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.logger import get_logger
+from app.config import METRICS_HOST, METRICS_PORT, METRICS_FILE, METRICS_DUMP_INTERVAL
+
+# 获取日志记录器
+logger = get_logger()
+
+# 默认的直方图分桶（秒），覆盖从截图编码到多轮模型调用的耗时范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _CounterChild:
+    """
+    某一组标签值对应的计数器
+    """
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class _HistogramChild:
+    """
+    某一组标签值对应的直方图
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """
+        记录代码块的耗时（秒），代码块中break/continue/异常退出时也会记录
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class _Metric:
+    """
+    指标基类：按标签值缓存子指标，没有标签时直接在指标本身上更新
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._default = None if self.labelnames else self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        获取一组标签值对应的子指标
+
+        Args:
+            *values: 标签值，顺序与labelnames一致
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际传入 {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        if self._default is not None:
+            return [((), self._default)]
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._samples():
+            lines.extend(self._render_child(values, child))
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """
+    只增不减的计数器
+    """
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+class Histogram(_Metric):
+    """
+    按固定分桶统计观测值分布的直方图
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+def _get_or_create(cls, name, documentation, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"指标 {name} 已以不同的类型或标签注册")
+        return metric
+
+def counter(name, documentation, labelnames=()):
+    """
+    获取或注册计数器
+
+    Args:
+        name (str): 指标名称
+        documentation (str): 说明
+        labelnames (tuple): 标签名称
+
+    Returns:
+        Counter: 计数器
+    """
+    return _get_or_create(Counter, name, documentation, labelnames)
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """
+    获取或注册直方图
+
+    Args:
+        name (str): 指标名称
+        documentation (str): 说明
+        labelnames (tuple): 标签名称
+        buckets (tuple): 分桶上界
+
+    Returns:
+        Histogram: 直方图
+    """
+    return _get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+def render_metrics():
+    """
+    按Prometheus文本格式导出所有指标
+
+    Returns:
+        str: 指标文本
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+def write_metrics(path):
+    """
+    把所有指标写入文件（先写临时文件再替换，抓取方不会读到半个文件）
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    在后台线程中启动只提供 /metrics 的HTTP服务
+
+    Returns:
+        ThreadingHTTPServer: 已启动的服务，server_address 中是实际端口
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"指标端点已启动: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def start_metrics_dump(path=METRICS_FILE, interval=METRICS_DUMP_INTERVAL):
+    """
+    在后台线程中定期把指标写入文件，进程退出时再写一次
+
+    Returns:
+        threading.Event: 设置后停止定期写入
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    stop_event = threading.Event()
+
+    def dump_loop():
+        while not stop_event.wait(interval):
+            try:
+                write_metrics(path)
+            except OSError as e:
+                logger.warning(f"写入指标文件失败: {str(e)}")
+
+    threading.Thread(target=dump_loop, name="metrics-dump", daemon=True).start()
+    atexit.register(write_metrics, path)
+    logger.info(f"指标每 {interval}s 写入: {path}")
+    return stop_event
+
+def start_metrics_exporters(suffix=None):
+    """
+    按配置启动指标导出：设置了METRICS_PORT时启动HTTP端点，设置了METRICS_FILE时定期写文件
+
+    Args:
+        suffix (str): 多进程时加在指标文件名后的后缀（如工作进程编号），此时不启动HTTP端点
+    """
+    if METRICS_PORT and suffix is None:
+        try:
+            start_metrics_server()
+        except OSError as e:
+            logger.warning(f"指标端点启动失败: {str(e)}")
+    if METRICS_FILE:
+        path = METRICS_FILE
+        if suffix is not None:
+            root, ext = os.path.splitext(METRICS_FILE)
+            path = f"{root}.{suffix}{ext}"
+        start_metrics_dump(path)
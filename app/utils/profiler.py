@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+性能剖析 - 在真实任务中定位截图、编码、回复解析等环节的热点:
+    SamplingProfiler  后台线程定期采样各线程的调用栈，输出火焰图工具可用的折叠栈格式
+                      （flamegraph.pl、speedscope、inferno 均可直接读取）
+    MemoryProfiler    基于tracemalloc，作为span接收器统计各阶段的净分配、峰值增长和前N个分配位置，
+                      并在每步结束时做快照，记录与上一步相比的内存增长
+
+用法:
+    python run.py --profile [目录]
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import defaultdict, Counter
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.tracing import add_sink, remove_sink
+from app.utils.logger import get_logger
+from app.config import (
+    PROFILE_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_MEMORY_FRAMES, PROFILE_TOP_N, PROFILE_STAGE_SNAPSHOTS
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+# 不单独统计内存的外层span
+_CONTAINER_SPANS = ("task", "step")
+
+class SamplingProfiler:
+    """
+    CPU采样剖析器：每隔interval秒记录一次调用栈，按折叠栈计数
+
+    Args:
+        interval (float): 采样间隔（秒）
+        thread_ids (set): 只采样这些线程，None表示采样所有线程（日志、追踪等后台线程大多处于等待状态）
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    self.samples[f"{names.get(thread_id, thread_id)};{stack}"] += 1
+            self.sample_count += 1
+
+    @staticmethod
+    def _collapse(frame):
+        """
+        把调用栈转换为从外到内、以分号分隔的字符串。正在执行剖析代码（如内存快照）的样本返回None，
+        避免剖析本身的开销混入结果
+        """
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == __file__:
+                return None
+            name = getattr(code, "co_qualname", code.co_name)
+            frames.append(f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def write_collapsed(self, path):
+        """
+        写出折叠栈文件，每行为 "栈 样本数"
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, n=PROFILE_TOP_N):
+        """
+        按自身样本数（位于栈顶的次数）排序的函数
+
+        Returns:
+            list: (函数, 样本数) 列表
+        """
+        own = Counter()
+        for stack, count in self.samples.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return own.most_common(n)
+
+class MemoryProfiler:
+    """
+    内存剖析器：作为span接收器，用tracemalloc统计每个阶段的净分配和峰值增长；
+    每个阶段的前stage_samples次在开始和结束时做快照，找出分配最多的位置
+    （快照在对象较多时需要零点几秒，不适合每次都做）；每步结束时与上一步的快照比较，记录内存增长
+    """
+
+    def __init__(self, top_n=PROFILE_TOP_N, frames=PROFILE_MEMORY_FRAMES, stage_samples=PROFILE_STAGE_SNAPSHOTS):
+        self.top_n = top_n
+        self.frames = frames
+        self.stage_samples = stage_samples
+        self.stages = defaultdict(lambda: {"count": 0, "net": 0, "max_peak": 0, "sampled": 0, "sites": Counter()})
+        self.steps = []
+        self._local = threading.local()
+        self._last_step_snapshot = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self._last_step_snapshot = tracemalloc.take_snapshot()
+        add_sink(self)
+
+    def stop(self):
+        remove_sink(self)
+        tracemalloc.stop()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _top_sites(self, snapshot, previous):
+        # 排除tracemalloc和剖析器自身的分配
+        diffs = [diff for diff in snapshot.compare_to(previous, "lineno")
+                 if diff.traceback[0].filename not in (tracemalloc.__file__, __file__)]
+        return [(str(diff.traceback[0]), diff.size_diff) for diff in diffs[:self.top_n] if diff.size_diff > 0]
+
+    def on_start(self, span):
+        stack = self._stack()
+        current, peak = tracemalloc.get_traced_memory()
+        # 峰值计数是全局的，重置前先把当前峰值计入外层span
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        snapshot = None
+        if span.name not in _CONTAINER_SPANS and self.stages[span.name]["sampled"] < self.stage_samples:
+            snapshot = tracemalloc.take_snapshot()
+        stack.append({"id": span.span_id, "start": current, "peak": current, "snapshot": snapshot})
+
+    def __call__(self, span):
+        stack = self._stack()
+        if not stack or stack[-1]["id"] != span.span_id:
+            # 剖析开始前已经打开的span
+            return
+        entry = stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        span_peak = max(entry["peak"], peak)
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], span_peak)
+        net, peak_growth = current - entry["start"], span_peak - entry["start"]
+
+        if span.name == "step":
+            self._record_step(span, net, peak_growth)
+            return
+        if span.name in _CONTAINER_SPANS:
+            return
+        sites = self._top_sites(tracemalloc.take_snapshot(), entry["snapshot"]) if entry["snapshot"] else []
+        with self._lock:
+            stage = self.stages[span.name]
+            stage["count"] += 1
+            stage["net"] += net
+            stage["max_peak"] = max(stage["max_peak"], peak_growth)
+            if entry["snapshot"]:
+                stage["sampled"] += 1
+                for site, size in sites:
+                    stage["sites"][site] += size
+
+    def _record_step(self, span, net, peak_growth):
+        snapshot = tracemalloc.take_snapshot()
+        top = self._top_sites(snapshot, self._last_step_snapshot)
+        self._last_step_snapshot = snapshot
+        self.steps.append({
+            "round": span.attrs.get("round"),
+            "current": tracemalloc.get_traced_memory()[0],
+            "net": net,
+            "peak_growth": peak_growth,
+            "top": top[:3]
+        })
+
+    def report(self):
+        """
+        生成文本格式的内存报告
+
+        Returns:
+            str: 报告内容
+        """
+        lines = ["== 各阶段内存分配（按峰值增长排序） =="]
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]["max_peak"]):
+            lines.append(f"\n[{name}] 次数 {stage['count']}  最大峰值增长 {_format_size(stage['max_peak'])}  "
+                         f"净增长合计 {_format_size(stage['net'])}  分配位置（前{stage['sampled']}次采样）:")
+            for site, size in stage["sites"].most_common(self.top_n):
+                lines.append(f"    {_format_size(size):>10}  {site}")
+
+        lines.append("\n== 每步结束时的内存 ==")
+        for step in self.steps:
+            lines.append(f"\n第{step['round']}轮  当前 {_format_size(step['current'])}  峰值增长 {_format_size(step['peak_growth'])}  "
+                         f"净增长 {_format_size(step['net'])}")
+            for site, size in step["top"]:
+                lines.append(f"    {_format_size(size):>10}  {site}")
+        return "\n".join(lines) + "\n"
+
+def _format_size(size):
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024 or unit == "MiB":
+            return f"{sign}{size:.0f}{unit}" if unit == "B" else f"{sign}{size:.1f}{unit}"
+        size /= 1024
+
+class ProfileSession:
+    """
+    一次剖析：同时启动CPU采样和内存剖析，结束时把结果写入输出目录:
+        cpu.collapsed   折叠栈，可用 flamegraph.pl cpu.collapsed > cpu.svg 生成火焰图
+        memory.txt      各阶段的内存分配和每步的内存增长
+
+    默认只采样启动剖析的线程，all_threads为True时采样所有线程
+    """
+
+    def __init__(self, output_dir=None, interval=PROFILE_SAMPLE_INTERVAL, top_n=PROFILE_TOP_N, all_threads=False):
+        self.output_dir = output_dir or os.path.join(PROFILE_DIR, time.strftime("%Y%m%d_%H%M%S"))
+        self.cpu = SamplingProfiler(interval, None if all_threads else {threading.get_ident()})
+        self.memory = MemoryProfiler(top_n)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.memory.start()
+        self.cpu.start()
+        logger.info(f"性能剖析已启动，结果将写入: {self.output_dir}")
+
+    def stop(self):
+        self.cpu.stop()
+        self.memory.stop()
+        self.cpu.write_collapsed(os.path.join(self.output_dir, "cpu.collapsed"))
+        with open(os.path.join(self.output_dir, "memory.txt"), "w", encoding="utf-8") as f:
+            f.write(self.memory.report())
+
+        print(f"\n性能剖析结果已写入: {self.output_dir}（CPU采样 {self.cpu.sample_count} 次）")
+        for function, count in self.cpu.top_functions():
+            print(f"  {count:>6}  {function}")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地场景识别 - 用参考截图的指纹（差值感知哈希 + 颜色直方图）做最近邻匹配，
+识别桌面、微信登录窗口、微信主界面、搜索界面等视觉上稳定的场景，
+匹配成功时可以跳过场景识别的模型调用
+"""
+
+import os
+import sys
+import glob
+import threading
+
+import numpy as np
+from PIL import Image
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.logger import get_logger
+from app.config import SCENE_REFERENCE_DIR, SCENE_INDEX_PATH, SCENE_MATCH_THRESHOLD, SCENE_LABELS
+
+# 获取日志记录器
+logger = get_logger()
+
+HASH_SIZE = 8  # 差值哈希为 8x8 = 64 位
+HIST_BINS = 4  # 每个颜色通道的直方图分箱数，共 4^3 = 64 维
+HASH_WEIGHT = 0.5  # 综合距离中哈希距离的权重，其余为直方图距离
+
+_scene_index = None
+_index_lock = threading.Lock()
+
+def compute_fingerprint(image):
+    """
+    计算图像指纹
+
+    Args:
+        image (PIL.Image.Image): 截图图像
+
+    Returns:
+        tuple: (64位差值哈希的布尔数组, 归一化的64维颜色直方图)
+    """
+    # 先用整数倍缩小（reducing_gap）得到缩略图，避免对全分辨率截图做逐像素处理
+    thumbnail = image.convert("RGB") if image.mode not in ("RGB", "RGBA") else image
+    thumbnail = thumbnail.resize((64, 64), Image.BILINEAR, reducing_gap=2.0).convert("RGB")
+
+    # 差值哈希：相邻像素的明暗关系，对缩放和轻微变化不敏感
+    gray = np.asarray(thumbnail.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    dhash = (gray[:, 1:] > gray[:, :-1]).ravel()
+
+    # 颜色直方图：区分布局相似但配色不同的界面
+    small = np.asarray(thumbnail) // (256 // HIST_BINS)
+    bins = (small[..., 0].astype(np.int32) * HIST_BINS + small[..., 1]) * HIST_BINS + small[..., 2]
+    hist = np.bincount(bins.ravel(), minlength=HIST_BINS ** 3).astype(np.float32)
+    hist /= hist.sum()
+    return dhash, hist
+
+class SceneIndex:
+    """
+    已标注场景的指纹索引，支持最近邻查找
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.hashes = np.zeros((0, HASH_SIZE * HASH_SIZE), dtype=bool)
+        self.hists = np.zeros((0, HIST_BINS ** 3), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, label, image):
+        """
+        添加一张参考截图
+
+        Args:
+            label (str): 场景标签
+            image (PIL.Image.Image): 参考截图
+        """
+        dhash, hist = compute_fingerprint(image)
+        self.labels.append(label)
+        self.hashes = np.vstack([self.hashes, dhash])
+        self.hists = np.vstack([self.hists, hist])
+
+    def match(self, image):
+        """
+        查找与图像最接近的参考场景
+
+        Args:
+            image (PIL.Image.Image): 待识别的截图
+
+        Returns:
+            tuple: (场景标签, 距离)，距离范围为0~1；索引为空时返回 (None, 1.0)
+        """
+        if not self.labels:
+            return None, 1.0
+        return self.match_fingerprint(*compute_fingerprint(image))
+
+    def match_fingerprint(self, dhash, hist):
+        """
+        按已计算的指纹查找最接近的参考场景，参数为compute_fingerprint的返回值
+
+        Returns:
+            tuple: (场景标签, 距离)，索引为空时返回 (None, 1.0)
+        """
+        if not self.labels:
+            return None, 1.0
+        hash_dist = np.count_nonzero(self.hashes != dhash, axis=1) / dhash.size
+        hist_dist = np.abs(self.hists - hist).sum(axis=1) / 2
+        distances = HASH_WEIGHT * hash_dist + (1 - HASH_WEIGHT) * hist_dist
+        best = int(np.argmin(distances))
+        return self.labels[best], float(distances[best])
+
+    def save(self, path):
+        """
+        保存索引到npz文件
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(path, labels=np.array(self.labels), hashes=self.hashes, hists=self.hists)
+        logger.info(f"场景索引已保存: {path}, 共 {len(self)} 个参考指纹")
+
+    @classmethod
+    def load(cls, path):
+        """
+        从npz文件加载索引
+        """
+        index = cls()
+        with np.load(path) as data:
+            index.labels = [str(label) for label in data["labels"]]
+            index.hashes = data["hashes"].astype(bool)
+            index.hists = data["hists"].astype(np.float32)
+        return index
+
+    @classmethod
+    def from_directory(cls, directory):
+        """
+        从参考截图目录构建索引，每个子目录名为场景标签
+
+        Args:
+            directory (str): 参考截图目录
+
+        Returns:
+            SceneIndex: 场景索引
+        """
+        index = cls()
+        for path in sorted(glob.glob(os.path.join(directory, "*", "*.png"))):
+            label = os.path.basename(os.path.dirname(path))
+            with Image.open(path) as image:
+                index.add(label, image)
+        logger.info(f"从 {directory} 构建场景索引，共 {len(index)} 个参考指纹")
+        return index
+
+def get_scene_index():
+    """
+    获取场景索引（首次调用时加载，优先使用预先计算的索引文件）
+
+    Returns:
+        SceneIndex: 场景索引
+    """
+    global _scene_index
+    if _scene_index is None:
+        with _index_lock:
+            if _scene_index is None:
+                try:
+                    if os.path.exists(SCENE_INDEX_PATH):
+                        _scene_index = SceneIndex.load(SCENE_INDEX_PATH)
+                    else:
+                        _scene_index = SceneIndex.from_directory(SCENE_REFERENCE_DIR)
+                except Exception as e:
+                    logger.error(f"加载场景索引失败: {str(e)}")
+                    _scene_index = SceneIndex()
+    return _scene_index
+
+def classify_scene(image_data):
+    """
+    使用本地指纹索引识别截图的场景
+
+    Args:
+        image_data (str): base64编码的截图数据
+
+    Returns:
+        dict: 匹配成功时返回 label、description、environment_ready、distance；
+              索引为空或距离超过阈值时返回None
+    """
+    index = get_scene_index()
+    if not len(index):
+        return None
+
+    from app.utils.screen_capture import get_frame_image
+    label, distance = index.match(get_frame_image(image_data))
+    if distance > SCENE_MATCH_THRESHOLD:
+        logger.debug(f"本地场景识别未命中: 最近场景 {label}, 距离 {distance:.3f}")
+        return None
+
+    scene = SCENE_LABELS.get(label, {})
+    logger.info(f"本地场景识别命中: {label}, 距离 {distance:.3f}")
+    return {
+        "label": label,
+        "description": scene.get("description", label),
+        "environment_ready": scene.get("environment_ready", True),
+        "distance": distance
+    }
+
+if __name__ == "__main__":
+    # 用法:
+    #   python -m app.utils.scene_index build             从参考截图目录重建索引文件
+    #   python -m app.utils.scene_index match <截图.png>   识别截图场景
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        SceneIndex.from_directory(SCENE_REFERENCE_DIR).save(SCENE_INDEX_PATH)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "match":
+        with Image.open(sys.argv[2]) as image:
+            label, distance = get_scene_index().match(image)
+        print(f"最近场景: {label}, 距离: {distance:.3f}, 阈值: {SCENE_MATCH_THRESHOLD}")
+    else:
+        print("用法: python -m app.utils.scene_index build | match <截图.png>")
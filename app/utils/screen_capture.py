@@ -1,11 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import numpy as np
-import pyautogui
-import cv2
-from PIL import Image
-from PIL import ImageGrab  # 添加屏幕截图支持
 import io
 import base64
 import time
@@ -19,10 +14,21 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 from app.utils.logger import get_logger
+from app.utils.capture_backends import get_capture_backend
+from app.controllers.input_drivers import get_input_driver
+from app.utils.tracing import span
+from app.utils.metrics import counter, histogram
 
 # 获取日志记录器
 logger = get_logger()
 
+CAPTURE_LATENCY = histogram("wechat_capture_seconds", "截图各阶段耗时", ("stage",))
+CAPTURE_FAILURES = counter("wechat_capture_failures_total", "截图失败次数")
+SCREENSHOT_BYTES = counter("wechat_screenshot_bytes_total", "截图编码后的base64字节数")
+
+# 最近一次截图的 (base64数据, PIL图像)，供本地分析时免去重新解码
+_last_capture = (None, None)
+
 def capture_screen():
     """
     捕获当前屏幕内容
@@ -30,22 +36,49 @@ def capture_screen():
     Returns:
         bytes: 屏幕截图的二进制数据
     """
+    global _last_capture
     logger.info("开始捕获屏幕内容")
     try:
         # 截取屏幕并转换为base64
-        screenshot = ImageGrab.grab()
+        start = time.perf_counter()
+        with span("capture"):
+            screenshot = get_capture_backend().grab()
+        captured = time.perf_counter()
         logger.debug(f"屏幕截图尺寸: {screenshot.size}")
         
-        img_byte_arr = io.BytesIO()
-        screenshot.save(img_byte_arr, format='PNG')
-        img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+        with span("encode") as s:
+            img_byte_arr = io.BytesIO()
+            screenshot.save(img_byte_arr, format='PNG')
+            img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+            s.set("bytes", len(img_base64))
+        _last_capture = (img_base64, screenshot)
+        CAPTURE_LATENCY.labels("capture").observe(captured - start)
+        CAPTURE_LATENCY.labels("encode").observe(time.perf_counter() - captured)
+        SCREENSHOT_BYTES.inc(len(img_base64))
         
         logger.info(f"屏幕捕获成功，图像大小: {len(img_base64)} 字符")
         return img_base64
     except Exception as e:
         logger.error(f"屏幕捕获失败: {str(e)}")
+        CAPTURE_FAILURES.inc()
         raise Exception(f"屏幕捕获失败: {str(e)}")
 
+def get_frame_image(image_data):
+    """
+    获取base64截图对应的PIL图像，如果是最近一次捕获的截图则直接复用，无需解码
+    
+    Args:
+        image_data (str): base64编码的截图数据
+        
+    Returns:
+        PIL.Image.Image: 截图图像
+    """
+    last_base64, last_image = _last_capture
+    if image_data is last_base64 or image_data == last_base64:
+        return last_image
+    from PIL import Image
+    return Image.open(io.BytesIO(base64.b64decode(image_data)))
+
 def get_screen_capture():
     """
     获取当前屏幕截图，返回base64编码的图像数据
@@ -64,7 +97,7 @@ def save_screen_capture(file_path="screenshot.png"):
     """
     logger.info(f"开始保存屏幕截图到: {file_path}")
     try:
-        screenshot = pyautogui.screenshot()
+        screenshot = get_capture_backend().grab()
         screenshot.save(file_path)
         logger.info(f"屏幕截图已保存: {file_path}")
         print(f"屏幕截图已保存到: {file_path}")
@@ -82,7 +115,7 @@ def get_screen_size():
         tuple: 宽度和高度
     """
     try:
-        width, height = pyautogui.size()
+        width, height = get_input_driver().size()
         logger.debug(f"获取屏幕尺寸: {width}x{height}")
         return width, height
     except Exception as e:
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+推测执行 - 重复执行的任务（批处理、任务服务中的同一条指令）在同一位置看到的界面往往相同，
+模型给出的下一步也相同。轨迹缓存按"指令、操作方式、已执行步骤数、上一步操作"记录每一步的截图指纹和分析结果；
+执行操作、等待界面稳定的同时，Speculator在后台按分析结果中的next_expected_scene准备下一步的候选，
+截图后只需计算一次指纹，与缓存画面一致时直接使用缓存的分析结果，跳过多轮模型调用
+
+整屏指纹对内容不敏感，因此带坐标的操作（点击、移动、拖动）在缓存时还保存坐标周围的一小块灰度区域，
+使用缓存前要求这些区域与当前截图逐像素一致，否则进行完整分析
+
+缓存的步骤执行失败时会从缓存中删除；只缓存环境就绪、任务进行中且有下一步操作的分析结果
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import hashlib
+import threading
+from collections import defaultdict
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from app.utils.logger import get_logger
+from app.utils.tracing import span
+from app.utils.metrics import counter
+from app.config import (
+    SPECULATION_ENABLED, TRAJECTORY_CACHE_PATH, SPECULATION_MATCH_THRESHOLD, SPECULATION_MAX_ENTRIES,
+    SPECULATION_REGION_SIZE, SPECULATION_REGION_PIXEL_DIFF, SPECULATION_REGION_MAX_PIXELS
+)
+
+# 获取日志记录器
+logger = get_logger()
+
+SPECULATIONS = counter("wechat_speculations_total", "按轨迹缓存推测下一步的结果", ("outcome",))
+
+# 缓存分析结果中主循环用到的字段，对话历史等大字段不缓存
+CACHED_FIELDS = (
+    "task", "status", "current_scene", "scene_label", "environment_ready", "target_elements",
+    "elements_found", "elements_not_found", "steps", "reasoning", "next_expected_scene"
+)
+
+_store = None
+_store_lock = threading.Lock()
+
+def trajectory_key(task_context, steps_executed=None, last_action=None):
+    """
+    计算轨迹位置的键
+
+    Args:
+        task_context (dict): 任务上下文
+        steps_executed (int): 已执行步骤数，None表示使用上下文中的值
+        last_action (dict): 上一步操作，None表示使用上下文中的值
+
+    Returns:
+        str: 键
+    """
+    if steps_executed is None:
+        steps_executed = task_context.get("steps_executed", 0)
+    if last_action is None:
+        last_action = task_context.get("last_action") or {}
+    raw = json.dumps([task_context.get("instruction", ""), task_context.get("operation_type", ""),
+                      steps_executed, last_action], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def encode_fingerprint(dhash, hist):
+    import numpy as np
+    return np.packbits(dhash).tobytes().hex(), [round(float(value), 5) for value in hist]
+
+def decode_fingerprint(dhash_hex, hist):
+    import numpy as np
+    dhash = np.unpackbits(np.frombuffer(bytes.fromhex(dhash_hex), dtype=np.uint8)).astype(bool)
+    return dhash, np.asarray(hist, dtype=np.float32)
+
+def step_points(steps):
+    """
+    操作步骤中的屏幕坐标（鼠标点击、移动的位置和拖动的起止位置）
+
+    Args:
+        steps (list): 分析结果中的操作步骤
+
+    Returns:
+        list: (x, y) 列表
+    """
+    points = []
+    for step in steps or ():
+        if not isinstance(step, dict) or step.get("type") != "mouse":
+            continue
+        for x_key, y_key in (("x", "y"), ("end_x", "end_y")):
+            x, y = step.get(x_key), step.get(y_key)
+            if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (x, y)):
+                points.append((int(x), int(y)))
+    return points
+
+def _region_box(x, y, size):
+    width, height = size
+    return x - width // 2, y - height // 2, x - width // 2 + width, y - height // 2 + height
+
+def capture_regions(image, points, size=SPECULATION_REGION_SIZE):
+    """
+    保存坐标周围的灰度区域
+
+    Args:
+        image (PIL.Image.Image): 截图
+        points (list): step_points的返回值
+
+    Returns:
+        list: [{x, y, width, height, pixels（灰度像素的hex）}]
+    """
+    regions = []
+    for x, y in points:
+        patch = image.convert("L").crop(_region_box(x, y, size))
+        regions.append({"x": x, "y": y, "width": size[0], "height": size[1], "pixels": patch.tobytes().hex()})
+    return regions
+
+def regions_match(image, regions, pixel_diff=SPECULATION_REGION_PIXEL_DIFF, max_pixels=SPECULATION_REGION_MAX_PIXELS):
+    """
+    判断截图中各坐标周围的区域是否与缓存时一致
+
+    Args:
+        image (PIL.Image.Image): 当前截图
+        regions (list): capture_regions的返回值
+
+    Returns:
+        bool: 所有区域中不同的像素都不超过max_pixels时返回True
+    """
+    import numpy as np
+    gray = image.convert("L")
+    for region in regions:
+        size = (region["width"], region["height"])
+        saved = np.frombuffer(bytes.fromhex(region["pixels"]), dtype=np.uint8).astype(np.int16)
+        current = np.asarray(gray.crop(_region_box(region["x"], region["y"], size)), dtype=np.int16).ravel()
+        if saved.shape != current.shape:
+            return False
+        changed = int(np.count_nonzero(np.abs(saved - current) > pixel_diff))
+        if changed > max_pixels:
+            logger.info(f"坐标 ({region['x']}, {region['y']}) 周围有 {changed} 个像素与缓存画面不同")
+            return False
+    return True
+
+def _scene_key(text):
+    return re.sub(r"[\W_]+", "", text or "")
+
+def scene_matches(scene, expected):
+    """
+    判断场景描述与预期的下一场景是否一致（忽略空白和标点，允许互相包含）
+    """
+    scene, expected = _scene_key(scene), _scene_key(expected)
+    return bool(scene and expected) and (scene in expected or expected in scene)
+
+class TrajectoryStore:
+    """
+    轨迹缓存：键 -> 最近的若干条 {fingerprint, analysis}，追加写入JSONL文件，多个进程可以共享同一文件
+
+    Args:
+        path (str): 缓存文件路径，None表示只保存在内存中
+        max_entries (int): 每个键最多保留的条数
+    """
+
+    def __init__(self, path=None, max_entries=SPECULATION_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = defaultdict(list)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被强制结束时最后一行可能不完整
+                    continue
+                if record.get("discard"):
+                    self._remove(record["key"], record["fingerprint"])
+                else:
+                    self._add(record)
+        kept = sum(len(entries) for entries in self._entries.values())
+        logger.info(f"从 {self.path} 加载轨迹缓存: {len(self._entries)} 个位置, {kept} 条")
+        # 被替换和删除的记录较多时压缩文件
+        if lines > max(2 * kept, 100):
+            self._rewrite()
+
+    def _rewrite(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entries in self._entries.values():
+                for record in entries:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _append(self, record):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 每条记录一次O_APPEND写入，多个进程同时追加时行不会交错
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def _add(self, record):
+        entries = self._entries[record["key"]]
+        entries[:] = [entry for entry in entries if entry["fingerprint"] != record["fingerprint"]]
+        entries.append(record)
+        del entries[:-self.max_entries]
+
+    def _remove(self, key, fingerprint):
+        entries = self._entries.get(key)
+        if entries:
+            entries[:] = [entry for entry in entries if entry["fingerprint"] != fingerprint]
+
+    def candidates(self, key):
+        """
+        获取轨迹位置的缓存记录
+
+        Returns:
+            list: 记录列表，每条包含 key、fingerprint（[差值哈希hex, 直方图]）、analysis、regions
+        """
+        with self._lock:
+            return list(self._entries.get(key, ()))
+
+    def record(self, key, fingerprint, analysis, image=None):
+        """
+        缓存一步的截图指纹和分析结果
+
+        Args:
+            key (str): 轨迹位置的键
+            fingerprint (tuple): compute_fingerprint的返回值
+            analysis (dict): 分析结果
+            image (PIL.Image.Image): 本步的截图，用于保存带坐标操作周围的区域
+
+        Returns:
+            bool: 是否已缓存；有带坐标的操作但没有截图时不缓存（之后无法核对坐标处的内容）
+        """
+        points = step_points(analysis.get("steps"))
+        if points and image is None:
+            return False
+        record = {
+            "key": key,
+            "fingerprint": list(encode_fingerprint(*fingerprint)),
+            "analysis": {field: analysis[field] for field in CACHED_FIELDS if field in analysis},
+            "regions": capture_regions(image, points) if points else []
+        }
+        with self._lock:
+            self._add(record)
+            self._append(record)
+        return True
+
+    def discard(self, record):
+        """
+        删除执行失败的缓存记录
+        """
+        with self._lock:
+            self._remove(record["key"], record["fingerprint"])
+            self._append({"key": record["key"], "fingerprint": record["fingerprint"], "discard": True})
+
+def get_trajectory_store():
+    """
+    获取当前进程的轨迹缓存（首次调用时加载TRAJECTORY_CACHE_PATH）
+
+    Returns:
+        TrajectoryStore: 轨迹缓存，SPECULATION_ENABLED为False时返回None
+    """
+    global _store
+    if _store is None and SPECULATION_ENABLED:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = TrajectoryStore(TRAJECTORY_CACHE_PATH)
+                except OSError as e:
+                    logger.warning(f"加载轨迹缓存失败，仅使用内存缓存: {str(e)}")
+                    _store = TrajectoryStore()
+    return _store
+
+def set_trajectory_store(store):
+    """
+    替换当前进程的轨迹缓存
+
+    Args:
+        store (TrajectoryStore): 轨迹缓存，None表示下次使用时按配置重新加载
+    """
+    global _store
+    with _store_lock:
+        _store = store
+
+class _Prepared:
+    """
+    为某个轨迹位置准备好的候选：缓存记录和由其指纹构建的最近邻索引
+    """
+
+    def __init__(self, key, entries, expected_scene=None):
+        from app.utils.scene_index import SceneIndex
+        import numpy as np
+        # 预期场景一致的记录优先，没有时使用该位置的所有记录
+        preferred = [entry for entry in entries if scene_matches(entry["analysis"].get("current_scene"), expected_scene)]
+        self.key = key
+        self.entries = preferred or entries
+        self.index = SceneIndex()
+        if self.entries:
+            fingerprints = [decode_fingerprint(*entry["fingerprint"]) for entry in self.entries]
+            self.index.labels = list(range(len(self.entries)))
+            self.index.hashes = np.vstack([dhash for dhash, _ in fingerprints])
+            self.index.hists = np.vstack([hist for _, hist in fingerprints])
+
+class Speculator:
+    """
+    一个任务的推测执行，在主循环中按以下顺序调用:
+        lookup(image_data, task_context)             截图后：与缓存画面一致时返回缓存的分析结果，否则返回None
+        prepare(task_context, analysis, next_action)  执行操作前：在后台准备操作之后那一步的候选
+        commit(analysis) / reject()                   操作成功后缓存本步分析结果 / 操作失败时删除用到的缓存记录
+
+    Args:
+        store (TrajectoryStore): 轨迹缓存，None表示不做推测
+        threshold (float): 指纹距离阈值
+    """
+
+    def __init__(self, store, threshold=SPECULATION_MATCH_THRESHOLD):
+        self.store = store
+        self.threshold = threshold
+        self._thread = None
+        self._prepared = None
+        self._current = None
+
+    def prepare(self, task_context, analysis, next_action):
+        """
+        在后台线程中为执行next_action之后的轨迹位置准备候选
+        """
+        if self.store is None:
+            return
+        key = trajectory_key(task_context, task_context.get("steps_executed", 0) + 1, next_action)
+        expected_scene = analysis.get("next_expected_scene")
+
+        def run():
+            with span("speculate.prepare", expected_scene=expected_scene):
+                self._prepared = _Prepared(key, self.store.candidates(key), expected_scene)
+
+        self._prepared = None
+        self._thread = threading.Thread(target=run, name="speculation", daemon=True)
+        self._thread.start()
+
+    def lookup(self, image_data, task_context):
+        """
+        截图与当前轨迹位置的某条缓存画面一致时返回其分析结果
+
+        Args:
+            image_data (str): base64编码的截图
+            task_context (dict): 任务上下文
+
+        Returns:
+            dict: 缓存的分析结果（带有"speculative": True），未命中时返回None
+        """
+        self._current = None
+        if self.store is None:
+            return None
+        from app.utils.scene_index import compute_fingerprint
+        from app.utils.screen_capture import get_frame_image
+
+        with span("speculate.lookup") as lookup_span:
+            key = trajectory_key(task_context)
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+            prepared = self._prepared if self._prepared is not None and self._prepared.key == key else None
+            if prepared is None:
+                # 没有提前准备（如返回桌面之后、任务的第一步），当场查找
+                prepared = _Prepared(key, self.store.candidates(key))
+            self._prepared = None
+
+            image = get_frame_image(image_data)
+            fingerprint = compute_fingerprint(image)
+            self._current = {"key": key, "fingerprint": fingerprint, "image": image, "record": None}
+            if not prepared.entries:
+                lookup_span.set("outcome", "none")
+                SPECULATIONS.labels("none").inc()
+                return None
+
+            best, distance = prepared.index.match_fingerprint(*fingerprint)
+            lookup_span.set("distance", round(distance, 4))
+            if distance > self.threshold:
+                logger.info(f"截图与缓存画面不一致（距离 {distance:.3f}），进行完整分析")
+                lookup_span.set("outcome", "miss")
+                SPECULATIONS.labels("miss").inc()
+                return None
+
+            record = prepared.entries[best]
+            # 带坐标的操作：坐标处的内容（如会话列表中的联系人）可能已经变化，整屏指纹无法区分
+            if step_points(record["analysis"].get("steps")) and not (
+                    record.get("regions") and regions_match(image, record["regions"])):
+                logger.info(f"截图与缓存画面一致（距离 {distance:.3f}），但操作坐标处的内容不同，进行完整分析")
+                lookup_span.set("outcome", "region_mismatch")
+                SPECULATIONS.labels("region_mismatch").inc()
+                return None
+            self._current["record"] = record
+            logger.info(f"截图与缓存画面一致（距离 {distance:.3f}），使用缓存的分析结果")
+            lookup_span.set("outcome", "hit")
+            SPECULATIONS.labels("hit").inc()
+            analysis = copy.deepcopy(record["analysis"])
+            analysis["speculative"] = True
+            return analysis
+
+    def commit(self, analysis):
+        """
+        本步操作执行成功后缓存本步的截图指纹和分析结果（分析结果本身来自缓存时不重复缓存）
+        """
+        current, self._current = self._current, None
+        if self.store is None or current is None or current["record"] is not None:
+            return
+        if ("error" in analysis or analysis.get("field_defects") or analysis.get("status") != "进行中"
+                or analysis.get("environment_ready") is not True or not analysis.get("steps")):
+            return
+        self.store.record(current["key"], current["fingerprint"], analysis, current["image"])
+
+    def reject(self):
+        """
+        本步操作执行失败：如果分析结果来自缓存，删除该缓存记录
+        """
+        current, self._current = self._current, None
+        if self.store is not None and current is not None and current["record"] is not None:
+            logger.warning("缓存的操作执行失败，已从轨迹缓存中删除")
+            self.store.discard(current["record"])
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+替身目标应用 - 在没有微信的无头Linux环境中，模拟微信主界面的布局（搜索框、会话列表、
+聊天窗口、输入框），供并行执行模式和自检在虚拟显示器上驱动
+"""
+
+import sys
+import tkinter as tk
+
+WINDOW_TITLE = "微信"
+CONTACTS = ["文件传输助手", "张三", "李四", "王五", "工作群"]
+
+def build_window(root, width=900, height=640):
+    """
+    构建替身窗口的界面
+
+    Args:
+        root (tk.Tk): 根窗口
+        width (int): 窗口宽度
+        height (int): 窗口高度
+    """
+    root.title(WINDOW_TITLE)
+    root.geometry(f"{width}x{height}+40+40")
+    root.configure(bg="#f5f5f5")
+
+    # 左侧：搜索框和会话列表
+    sidebar = tk.Frame(root, bg="#e6e6e6", width=260)
+    sidebar.pack(side=tk.LEFT, fill=tk.Y)
+    search = tk.Entry(sidebar, font=("Sans", 12))
+    search.insert(0, "搜索")
+    search.pack(fill=tk.X, padx=10, pady=10)
+    contacts = tk.Listbox(sidebar, font=("Sans", 12), bg="#e6e6e6", borderwidth=0)
+    for name in CONTACTS:
+        contacts.insert(tk.END, name)
+    contacts.pack(fill=tk.BOTH, expand=True, padx=4)
+
+    # 右侧：聊天记录和输入框
+    chat = tk.Frame(root, bg="#f5f5f5")
+    chat.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+    title = tk.Label(chat, text=CONTACTS[0], font=("Sans", 14), bg="#f5f5f5", anchor="w")
+    title.pack(fill=tk.X, padx=10, pady=10)
+    history = tk.Text(chat, font=("Sans", 12), height=20, state=tk.DISABLED)
+    history.pack(fill=tk.BOTH, expand=True, padx=10)
+    message = tk.Text(chat, font=("Sans", 12), height=5)
+    message.pack(fill=tk.X, padx=10, pady=10)
+
+    def select_contact(event):
+        selection = contacts.curselection()
+        if selection:
+            title.configure(text=contacts.get(selection[0]))
+
+    def send_message(event):
+        text = message.get("1.0", tk.END).strip()
+        if text:
+            history.configure(state=tk.NORMAL)
+            history.insert(tk.END, f"我: {text}\n")
+            history.configure(state=tk.DISABLED)
+            message.delete("1.0", tk.END)
+        return "break"
+
+    contacts.bind("<<ListboxSelect>>", select_contact)
+    message.bind("<Return>", send_message)
+    message.focus_set()
+
+def main():
+    root = tk.Tk()
+    build_window(root)
+    root.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+阶段计时 - 用span记录截图、编码、模型调用、解析、执行、等待等阶段的耗时和属性，
+交给已注册的接收器（sink）处理；没有接收器时span不做任何计时，几乎没有开销
+
+span可以嵌套（任务 → 步骤 → 阶段），同一线程中内层span记录外层span的id作为parent，
+最外层span的id作为整条链路的trace id。JsonlTraceWriter在后台线程中把span写入JSONL文件，
+用 python -m app.bench.trace_report 汇总
+"""
+
+import os
+import json
+import math
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+# 每个线程当前打开的span栈
+_local = threading.local()
+
+class Span:
+    """
+    一次阶段记录，包含名称、属性、开始时间和耗时（秒）
+    """
+
+    __slots__ = ("name", "attrs", "start", "duration", "span_id", "parent_id", "trace_id")
+
+    def __init__(self, name, attrs, parent=None):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = 0.0
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+
+    def set(self, key, value):
+        """
+        设置属性，如上传字节数、模型名称、token数
+        """
+        self.attrs[key] = value
+
+    def to_dict(self):
+        """
+        转换为可写入JSON的字典
+        """
+        return {
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "pid": os.getpid(),
+            "attrs": self.attrs
+        }
+
+class _NullSpan:
+    """
+    未启用记录时使用的空span，忽略所有属性
+    """
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def add_sink(sink):
+    """
+    注册接收器，每个span结束时调用 sink(span)；接收器有on_start方法时，span开始时还会调用 sink.on_start(span)
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+
+def remove_sink(sink):
+    """
+    注销接收器
+    """
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+@contextmanager
+def span(name, **attrs):
+    """
+    记录一个阶段的耗时
+
+    用法:
+        with span("capture") as s:
+            ...
+            s.set("bytes", len(data))
+
+    Args:
+        name (str): 阶段名称
+        **attrs: 初始属性
+    """
+    if not _sinks:
+        yield _NULL_SPAN
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    current = Span(name, attrs, stack[-1] if stack else None)
+    stack.append(current)
+    for sink in list(_sinks):
+        on_start = getattr(sink, "on_start", None)
+        if on_start:
+            on_start(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = str(e)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        stack.pop()
+        for sink in list(_sinks):
+            sink(current)
+
+def current_span():
+    """
+    获取当前线程中最内层的span，没有时返回空span，可用于给外层阶段补充属性
+    """
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else _NULL_SPAN
+
+class JsonlTraceWriter:
+    """
+    把span异步写入JSONL文件的接收器：调用方只把span放入队列，
+    由后台线程批量序列化并追加写入，不阻塞截图和模型调用
+
+    多个进程可以写同一个文件，每批数据用一次追加写入完成
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, span):
+        if not self._closed:
+            self._queue.put(span.to_dict())
+
+    def _run(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            while True:
+                records = [self._queue.get()]
+                # 把队列中已有的记录一起写入
+                while True:
+                    try:
+                        records.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in records
+                lines = [json.dumps(record, ensure_ascii=False, default=str) for record in records if record is not None]
+                if lines:
+                    os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+                if stop:
+                    break
+        finally:
+            os.close(fd)
+
+    def close(self, timeout=5.0):
+        """
+        写完队列中剩余的span后停止后台线程
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+def start_trace_file(path):
+    """
+    开始把span写入JSONL文件，进程退出时自动写完剩余记录
+
+    Args:
+        path (str): 追踪文件路径
+
+    Returns:
+        JsonlTraceWriter: 已注册的接收器，可用 stop_trace_file 停止
+    """
+    writer = JsonlTraceWriter(path)
+    add_sink(writer)
+    atexit.register(stop_trace_file, writer)
+    return writer
+
+def stop_trace_file(writer):
+    """
+    注销并关闭追踪文件接收器
+    """
+    remove_sink(writer)
+    writer.close()
+
+def percentile(values, p):
+    """
+    最近秩法计算百分位数
+
+    Args:
+        values (list): 数值列表
+        p (float): 百分位（0~100）
+
+    Returns:
+        float: 百分位数，列表为空时返回0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
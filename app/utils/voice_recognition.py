@@ -1,9 +1,30 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import speech_recognition as sr
-import sys
+"""
+语音识别 - 从麦克风或WAV文件读取音频，交给可替换的识别后端:
+    google  在线识别（speech_recognition.recognize_google），说完后整段上传
+    vosk    离线流式识别，边说边输出部分结果
+
+部分识别结果持续SPEECH_STABLE_SECONDS不变时通过on_stable回调通知调用方，
+配合EarlyStart可以在用户说完之前就开始分析指令；麦克风的环境噪声校准结果在SPEECH_CALIBRATION_TTL内复用
+
+用法:
+    python -m app.utils.voice_recognition                              麦克风识别
+    python -m app.utils.voice_recognition 指令.wav [--backend vosk]     从WAV文件识别，打印部分结果
+"""
+
 import os
+import re
+import sys
+import json
+import math
+import time
+import wave
+import argparse
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
 # 将项目根目录添加到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,52 +33,465 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 from app.utils.logger import get_logger
+from app.utils.tracing import span
+from app.utils.metrics import counter
+from app.config import (
+    SPEECH_LANG, SPEECH_BACKEND, VOSK_MODEL_PATH, SPEECH_SAMPLE_RATE, SPEECH_CHUNK_SECONDS,
+    SPEECH_CALIBRATION_SECONDS, SPEECH_CALIBRATION_TTL, SPEECH_ENERGY_RATIO, SPEECH_PAUSE_SECONDS,
+    SPEECH_PHRASE_LIMIT, SPEECH_STABLE_SECONDS, SPEECH_STABLE_MIN_CHARS
+)
 
 # 获取日志记录器
 logger = get_logger()
 
-def recognize_speech():
+SPEECH_RESULTS = counter("wechat_speech_recognitions_total", "语音识别次数", ("backend", "outcome"))
+EARLY_STARTS = counter("wechat_speech_early_starts_total", "根据部分识别结果提前开始的分析是否被最终结果采用", ("outcome",))
+
+MIN_ENERGY_THRESHOLD = 300  # 能量阈值下限，与speech_recognition的默认值一致
+SAMPLE_WIDTH = 2  # 只处理16位PCM
+
+_noise_calibration = {"threshold": None, "time": 0.0}
+_calibration_lock = threading.Lock()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def chunk_energy(chunk):
     """
-    使用麦克风录制语音并转换为文本
-    
+    计算16位单声道PCM数据的均方根能量
+    """
+    samples = array("h", chunk)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+def normalize_transcript(text):
+    """
+    去掉识别结果中汉字之间的空格（vosk的中文模型按词输出，词之间有空格）
+    """
+    return re.sub(r"(?<=[\u4e00-\u9fff])\s+(?=[\u4e00-\u9fff])", "", text).strip()
+
+def _transcript_key(text):
+    # 比较识别结果时忽略空白和标点
+    return re.sub(r"[\W_]+", "", text)
+
+def calibrate_noise(read_chunk, chunk_seconds, force=False):
+    """
+    录制一小段环境噪声确定语音能量阈值，结果在SPEECH_CALIBRATION_TTL内复用
+
+    Args:
+        read_chunk (callable): 读取一块音频数据
+        chunk_seconds (float): 每块音频的时长（秒）
+        force (bool): 是否忽略缓存重新校准
+
     Returns:
-        str: 识别出的文本
+        float: 能量阈值
     """
-    logger.info("启动语音识别")
-    recognizer = sr.Recognizer()
-    
-    try:
-        with sr.Microphone() as source:
+    with _calibration_lock:
+        threshold = _noise_calibration["threshold"]
+        if threshold is not None and not force and time.time() - _noise_calibration["time"] < SPEECH_CALIBRATION_TTL:
+            return threshold
+
+        count = max(1, round(SPEECH_CALIBRATION_SECONDS / chunk_seconds))
+        energy = sum(chunk_energy(read_chunk()) for _ in range(count)) / count
+        threshold = max(energy * SPEECH_ENERGY_RATIO, MIN_ENERGY_THRESHOLD)
+        _noise_calibration.update(threshold=threshold, time=time.time())
+        logger.info(f"已完成环境噪声校准，能量阈值: {threshold:.0f}")
+        return threshold
+
+class AudioSource:
+    """
+    音频来源接口：按块产生16位单声道PCM数据。energy_threshold不为None时，
+    识别过程按该阈值判断用户何时说完，否则一直读到来源结束
+    """
+
+    sample_rate = SPEECH_SAMPLE_RATE
+    energy_threshold = None
+
+    def chunks(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class WavFileSource(AudioSource):
+    """
+    从16位单声道WAV文件读取音频，无需麦克风即可测试识别流程
+
+    Args:
+        path (str): WAV文件路径
+        chunk_seconds (float): 每块音频的时长（秒）
+        energy_threshold (float): 判断说完的能量阈值，None表示读到文件结束
+        realtime (bool): 是否按音频时长放慢读取，模拟用户实时说话
+    """
+
+    def __init__(self, path, chunk_seconds=SPEECH_CHUNK_SECONDS, energy_threshold=None, realtime=False):
+        self._wav = wave.open(path, "rb")
+        if self._wav.getnchannels() != 1 or self._wav.getsampwidth() != SAMPLE_WIDTH:
+            self._wav.close()
+            raise ValueError(f"只支持16位单声道WAV文件: {path}")
+        self.sample_rate = self._wav.getframerate()
+        self.energy_threshold = energy_threshold
+        self._frames = max(1, int(self.sample_rate * chunk_seconds))
+        self._realtime = realtime
+
+    def chunks(self):
+        start, played = time.perf_counter(), 0.0
+        while True:
+            data = self._wav.readframes(self._frames)
+            if not data:
+                return
+            if self._realtime:
+                played += len(data) / (self.sample_rate * SAMPLE_WIDTH)
+                time.sleep(max(0.0, start + played - time.perf_counter()))
+            yield data
+
+    def close(self):
+        self._wav.close()
+
+class MicrophoneSource(AudioSource):
+    """
+    麦克风音频（通过speech_recognition使用PyAudio）。开始读取时先确定能量阈值，
+    校准结果未过期时直接复用，不再每次录制环境噪声
+
+    Args:
+        sample_rate (int): 采样率
+        chunk_seconds (float): 每块音频的时长（秒）
+    """
+
+    def __init__(self, sample_rate=SPEECH_SAMPLE_RATE, chunk_seconds=SPEECH_CHUNK_SECONDS):
+        import speech_recognition as sr
+        self.sample_rate = sample_rate
+        self._chunk_seconds = chunk_seconds
+        self._frames = max(1, int(sample_rate * chunk_seconds))
+        self._microphone = sr.Microphone(sample_rate=sample_rate, chunk_size=self._frames)
+
+    def chunks(self):
+        with self._microphone as microphone:
+            read_chunk = lambda: microphone.stream.read(self._frames)
+            self.energy_threshold = calibrate_noise(read_chunk, self._chunk_seconds)
             logger.info("开始录音，等待用户说话...")
             print("请说话...")
-            # 调整麦克风适应环境噪声
-            recognizer.adjust_for_ambient_noise(source)
-            logger.debug("已完成环境噪声调整")
-            # 录制音频
-            audio = recognizer.listen(source)
-            logger.info("录音完成，开始识别")
-            
+            while True:
+                yield read_chunk()
+
+class SpeechBackend:
+    """
+    识别后端接口。start(sample_rate)开始一次识别，返回的会话对象提供:
+        accept(chunk) -> str   送入一块音频，返回当前的部分识别结果（不支持流式的后端返回空字符串）
+        finish() -> str        结束识别，返回最终结果
+    """
+
+    name = "base"
+
+    def start(self, sample_rate):
+        raise NotImplementedError
+
+class _BufferedSession:
+    """
+    缓存全部音频，结束时整段识别
+    """
+
+    def __init__(self, recognize, sample_rate):
+        self._recognize = recognize
+        self._sample_rate = sample_rate
+        self._buffer = bytearray()
+
+    def accept(self, chunk):
+        self._buffer += chunk
+        return ""
+
+    def finish(self):
+        return self._recognize(bytes(self._buffer), self._sample_rate)
+
+class GoogleSpeechBackend(SpeechBackend):
+    """
+    speech_recognition的Google在线识别，说完后整段上传，没有部分结果
+    """
+
+    name = "google"
+
+    def __init__(self, language=SPEECH_LANG):
+        import speech_recognition as sr
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+        self.language = language
+
+    def start(self, sample_rate):
+        return _BufferedSession(self._recognize, sample_rate)
+
+    def _recognize(self, data, sample_rate):
+        audio = self._sr.AudioData(data, sample_rate, SAMPLE_WIDTH)
         try:
-            # 使用Google语音识别API (也可以替换为其他API)
-            print("正在识别...")
-            text = recognizer.recognize_google(audio, language='zh-CN')
-            logger.info(f"语音识别成功: {text}")
-            print(f"识别结果: {text}")
-            return text
-        except sr.UnknownValueError:
-            logger.warning("无法识别语音内容")
-            print("无法识别语音")
-            return ""
-        except sr.RequestError as e:
-            logger.error(f"语音识别服务请求失败: {str(e)}")
-            print(f"语音识别服务出错: {e}")
+            return self._recognizer.recognize_google(audio, language=self.language)
+        except self._sr.UnknownValueError:
             return ""
+
+class _VoskSession:
+    """
+    vosk流式识别会话，识别器判断一句话结束后该句结果不再变化
+    """
+
+    def __init__(self, recognizer):
+        self._recognizer = recognizer
+        self._segments = []
+
+    def accept(self, chunk):
+        if self._recognizer.AcceptWaveform(chunk):
+            self._segments.append(json.loads(self._recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        return normalize_transcript(" ".join(self._segments + [partial]))
+
+    def finish(self):
+        self._segments.append(json.loads(self._recognizer.FinalResult()).get("text", ""))
+        return normalize_transcript(" ".join(self._segments))
+
+class VoskSpeechBackend(SpeechBackend):
+    """
+    基于vosk的离线流式识别。模型加载需要几秒，在创建后端时完成一次
+
+    Args:
+        model_path (str): vosk模型目录（可从 https://alphacephei.com/vosk/models 下载）
+    """
+
+    name = "vosk"
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        import vosk
+        if not os.path.isdir(model_path):
+            raise ValueError(f"vosk模型目录不存在: {model_path}")
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self._model = vosk.Model(model_path)
+        logger.info(f"已加载vosk模型: {model_path}")
+
+    def start(self, sample_rate):
+        return _VoskSession(self._vosk.KaldiRecognizer(self._model, sample_rate))
+
+SPEECH_BACKENDS = {
+    "google": GoogleSpeechBackend,
+    "vosk": VoskSpeechBackend,
+}
+
+def create_speech_backend(name):
+    """
+    创建识别后端
+
+    Args:
+        name (str): 后端名称，见SPEECH_BACKENDS
+
+    Returns:
+        SpeechBackend: 识别后端实例
+    """
+    if name not in SPEECH_BACKENDS:
+        raise ValueError(f"未知的语音识别后端: {name}，可选: {', '.join(SPEECH_BACKENDS)}")
+    backend = SPEECH_BACKENDS[name]()
+    logger.info(f"使用语音识别后端: {name}")
+    return backend
+
+def get_speech_backend():
+    """
+    获取当前进程使用的识别后端（首次调用时按SPEECH_BACKEND配置创建，之后复用已加载的模型）
+
+    Returns:
+        SpeechBackend: 识别后端实例
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_speech_backend(SPEECH_BACKEND)
+    return _backend
+
+def set_speech_backend(backend):
+    """
+    替换当前进程使用的识别后端
+
+    Args:
+        backend (SpeechBackend或str): 后端实例或后端名称
+
+    Returns:
+        SpeechBackend: 新的识别后端
+    """
+    global _backend
+    with _backend_lock:
+        _backend = create_speech_backend(backend) if isinstance(backend, str) else backend
+    return _backend
+
+def transcribe(source, backend=None, on_partial=None, on_stable=None):
+    """
+    从音频来源流式识别。来源提供能量阈值时，用户开始说话后静音超过SPEECH_PAUSE_SECONDS即结束；
+    总时长不超过SPEECH_PHRASE_LIMIT。时间均按音频时长计算，WAV文件的识别结果与读取速度无关
+
+    Args:
+        source (AudioSource): 音频来源
+        backend (SpeechBackend): 识别后端，None表示使用当前进程的后端
+        on_partial (callable): on_partial(text, offset)，部分结果变化时调用，offset为音频时间（秒）
+        on_stable (callable): on_stable(text, offset)，部分结果持续SPEECH_STABLE_SECONDS不变时调用，
+                              每个结果最多调用一次
+
+    Returns:
+        str: 最终识别结果
+    """
+    backend = backend or get_speech_backend()
+    with span("speech", backend=backend.name) as speech_span:
+        session = backend.start(source.sample_rate)
+        bytes_per_second = source.sample_rate * SAMPLE_WIDTH
+        offset, silence, speaking = 0.0, 0.0, False
+        partial, partial_since, stable = "", 0.0, None
+
+        for chunk in source.chunks():
+            duration = len(chunk) / bytes_per_second
+            offset += duration
+            text = session.accept(chunk)
+            if text != partial:
+                partial, partial_since = text, offset
+                if on_partial and text:
+                    on_partial(text, offset)
+            elif (on_stable and text and text != stable and offset - partial_since >= SPEECH_STABLE_SECONDS
+                  and len(_transcript_key(text)) >= SPEECH_STABLE_MIN_CHARS):
+                stable = text
+                on_stable(text, offset)
+
+            if source.energy_threshold is not None:
+                if chunk_energy(chunk) > source.energy_threshold:
+                    speaking, silence = True, 0.0
+                elif speaking:
+                    silence += duration
+                if speaking and silence >= SPEECH_PAUSE_SECONDS:
+                    break
+            if offset >= SPEECH_PHRASE_LIMIT:
+                logger.info(f"录音达到最长时长 {SPEECH_PHRASE_LIMIT} 秒")
+                break
+
+        text = session.finish()
+        speech_span.set("audio_seconds", round(offset, 3))
+        SPEECH_RESULTS.labels(backend.name, "ok" if text else "empty").inc()
+        return text
+
+def recognize_speech(on_stable=None, backend=None):
+    """
+    使用麦克风录制语音并转换为文本
+
+    Args:
+        on_stable (callable): on_stable(text, offset)，部分识别结果稳定时调用（仅流式后端）
+        backend (SpeechBackend): 识别后端，None表示使用当前进程的后端
+
+    Returns:
+        str: 识别出的文本
+    """
+    logger.info("启动语音识别")
+    try:
+        backend = backend or get_speech_backend()
+        with MicrophoneSource() as source:
+            text = transcribe(source, backend, on_stable=on_stable)
     except Exception as e:
+        SPEECH_RESULTS.labels(SPEECH_BACKEND if backend is None else backend.name, "error").inc()
         logger.error(f"语音识别过程中发生错误: {str(e)}")
         print(f"语音识别错误: {e}")
         return ""
 
+    if not text:
+        logger.warning("无法识别语音内容")
+        print("无法识别语音")
+        return ""
+    logger.info(f"语音识别成功: {text}")
+    print(f"识别结果: {text}")
+    return text
+
+class EarlyStart:
+    """
+    在用户说完之前提前开始处理指令：作为transcribe的on_stable回调，每当部分识别结果稳定时
+    在后台线程中调用func；最终结果与某次提前调用的文本一致时直接使用其结果，否则按最终结果重新调用
+
+    用法:
+        early = EarlyStart(lambda text: analyze_text(text, wechat_guide, operation_type))
+        text = recognize_speech(on_stable=early)
+        text_analysis = early.result(text)
+
+    Args:
+        func (callable): func(text) -> 结果
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self._futures = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __call__(self, text, offset=None):
+        key = _transcript_key(text)
+        with self._lock:
+            if key in self._futures:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="early-start")
+            self._futures[key] = self._executor.submit(self.func, text)
+        logger.info(f"部分识别结果已稳定，提前开始处理: {text}")
+
+    def result(self, text):
+        """
+        获取最终识别结果对应的处理结果
+
+        Args:
+            text (str): 最终识别结果
+
+        Returns:
+            func(text)的返回值
+        """
+        with self._lock:
+            future = self._futures.get(_transcript_key(text))
+            speculated = bool(self._futures)
+            if self._executor is not None:
+                # 未被采用的提前调用在后台自行结束
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        if future is not None:
+            EARLY_STARTS.labels("hit").inc()
+            logger.info("最终识别结果与提前处理的文本一致，直接使用其结果")
+            return future.result()
+        if speculated:
+            EARLY_STARTS.labels("miss").inc()
+            logger.info("最终识别结果与提前处理的文本不同，重新处理")
+        return self.func(text)
+
+def main(argv=None):
+    """
+    语音识别命令行入口：指定WAV文件时从文件识别并打印部分结果和稳定结果出现的时间
+    """
+    parser = argparse.ArgumentParser(description="语音识别")
+    parser.add_argument("wav", nargs="?", help="16位单声道WAV文件，不指定时使用麦克风")
+    parser.add_argument("--backend", choices=list(SPEECH_BACKENDS), default=None, help="识别后端，默认使用SPEECH_BACKEND")
+    parser.add_argument("--energy-threshold", type=float, default=None,
+                        help="WAV识别时判断说完的能量阈值，不指定时识别整个文件")
+    parser.add_argument("--realtime", action="store_true", help="按音频时长实时送入识别器，模拟用户说话")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        set_speech_backend(args.backend)
+    if not args.wav:
+        result = recognize_speech()
+        print(f"识别结果: {result}")
+        return 0 if result else 1
+
+    with WavFileSource(args.wav, energy_threshold=args.energy_threshold, realtime=args.realtime) as source:
+        text = transcribe(
+            source,
+            on_partial=lambda partial, offset: print(f"  {offset:6.2f}s  部分结果: {partial}"),
+            on_stable=lambda stable, offset: print(f"  {offset:6.2f}s  稳定结果: {stable}")
+        )
+    print(f"最终结果: {text}")
+    return 0 if text else 1
+
 if __name__ == "__main__":
-    # 测试语音识别功能
-    result = recognize_speech()
-    print(f"识别结果: {result}") 
\ No newline at end of file
+    sys.exit(main())
@@ -4,6 +4,8 @@
 import os
 import re
 import sys
+import json
+import threading
 
 # 将项目根目录添加到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,137 +14,311 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 from app.utils.logger import get_logger
+from app.config import GUIDE_TOKEN_BUDGET, WECHAT_GUIDE_PATH, WECHAT_GUIDE_CACHE_PATH
 
 # 获取日志记录器
 logger = get_logger()
 
-def get_wechat_guide():
+# 预编译的解析模式
+_HEADING_PATTERN = re.compile(r'^(#{1,5})\s+(.*?)\s*$')
+_STEP_PATTERN = re.compile(r'^\d+\.\s*(.*)$')
+
+# 指南标题到操作/方法键名的映射，未列出的标题直接使用标题作为键名
+OPERATION_TITLES = {
+    '启动微信': 'launch',
+    '搜索联系人': 'search',
+    '写入发送内容': 'chat',
+}
+METHOD_PREFIXES = (
+    ('鼠标', 'mouse'),
+    ('键盘', 'keyboard'),
+)
+
+# 按文件路径缓存的指南索引: 路径 -> (修改时间, 索引)
+_index_cache = {}
+_cache_lock = threading.Lock()
+
+def _method_key(title):
     """
-    读取并解析微信操作指南文件
+    将方法标题映射为键名，如"键盘快捷搜索" -> "keyboard"
+    """
+    for prefix, key in METHOD_PREFIXES:
+        if title.startswith(prefix):
+            return key
+    return title
+
+def parse_structured_guide(content):
+    """
+    将操作指南的markdown内容解析为结构化数据
+    
+    二级标题为操作（如"搜索联系人"），三级标题为方法（如"键盘快捷搜索"），
+    以"数字."开头的标题或行为步骤，其他行为说明文字
     
+    Args:
+        content (str): 指南的markdown内容
+        
     Returns:
-        dict: 包含微信操作指南的字典
+        dict: 结构化的指南数据，如 {'search': {'keyboard': '...', 'keyboard_steps': [...]}, 'chat': {'steps': [...]}}
     """
-    logger.info("开始读取微信操作指南文件")
-    guide_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'WeChat.md')
+    structured_guide = {key: {} for key in OPERATION_TITLES.values()}
+    operation = None
+    method = None
     
-    if not os.path.exists(guide_path):
-        logger.error(f"未找到微信操作指南文件: {guide_path}")
-        print(f"警告: 未找到微信操作指南文件: {guide_path}")
-        return {}
-    
-    try:
-        with open(guide_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
         
-        logger.info(f"成功读取微信操作指南文件: {guide_path}, 大小: {len(content)} 字节")
+        heading = _HEADING_PATTERN.match(line)
+        text = heading.group(2) if heading else line
+        step = _STEP_PATTERN.match(text)
         
-        # 解析指南内容为结构化数据
-        guide = {}
+        if heading and len(heading.group(1)) <= 2 and not step:
+            if len(heading.group(1)) == 2:
+                operation = OPERATION_TITLES.get(text, text)
+                structured_guide.setdefault(operation, {})
+                method = None
+            continue
+        if operation is None:
+            continue
         
-        # 使用正则表达式提取标题和内容
-        sections = re.split(r'#{1,5}\s+', content)
-        section_titles = re.findall(r'#{1,5}\s+(.*)', content)
+        section = structured_guide[operation]
+        if step:
+            steps_key = f"{method}_steps" if method else 'steps'
+            section.setdefault(steps_key, []).append(step.group(1).strip())
+        elif heading:
+            method = _method_key(text)
+            section[method] = text
+            continue
         
-        for i, title in enumerate(section_titles):
-            if i + 1 < len(sections):
-                guide[title] = sections[i + 1].strip()
+        # 方法的原文包含标题、说明和步骤
+        if method:
+            section[method] = f"{section[method]}\n{text}"
+    
+    # 检查解析结果完整性
+    for section, content in structured_guide.items():
+        if not content:
+            logger.warning(f"指南部分 '{section}' 为空")
+    
+    return structured_guide
+
+class WeChatGuideIndex:
+    """
+    解析后的操作指南索引，按(操作, 方法)直接查找原文和步骤列表
+    """
+    
+    def __init__(self, structured_guide, source_mtime=None):
+        self.structured = structured_guide
+        self.source_mtime = source_mtime
+        self._sections = {}
+        self._steps = {}
+        for operation, section in structured_guide.items():
+            for key, content in section.items():
+                if isinstance(content, list):
+                    method = key[:-len('_steps')] if key.endswith('_steps') else None
+                    self._steps[(operation, method)] = content
+                else:
+                    self._sections[(operation, key)] = content
+    
+    @classmethod
+    def from_markdown(cls, content, source_mtime=None):
+        """
+        从markdown内容构建索引
+        """
+        return cls(parse_structured_guide(content), source_mtime)
+    
+    def operations(self):
+        """
+        返回指南包含的所有操作
+        """
+        return list(self.structured)
+    
+    def section(self, operation, method):
+        """
+        查找某个操作的某种方法的原文，不存在时返回None
+        """
+        return self._sections.get((operation, method))
+    
+    def steps(self, operation, method=None):
+        """
+        查找某个操作（某种方法）的步骤列表，不存在时返回空列表
+        """
+        return self._steps.get((operation, method), [])
+    
+    def to_dict(self):
+        """
+        返回结构化的指南数据（调用方不应修改）
+        """
+        return self.structured
+    
+    def save(self, path):
+        """
+        将索引序列化到缓存文件
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'source_mtime': self.source_mtime, 'guide': self.structured}, f, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        从缓存文件加载索引
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['guide'], data.get('source_mtime'))
+
+def get_guide_index(guide_path=WECHAT_GUIDE_PATH, cache_path=WECHAT_GUIDE_CACHE_PATH):
+    """
+    获取操作指南索引。指南文件未修改时直接返回内存中的索引；
+    进程首次加载时优先使用与文件修改时间一致的缓存文件，否则重新解析并写入缓存
+    
+    Args:
+        guide_path (str): 指南文件路径
+        cache_path (str): 索引缓存文件路径，为None时不使用缓存文件
+        
+    Returns:
+        WeChatGuideIndex: 指南索引，文件不存在或解析失败时为空索引
+    """
+    try:
+        mtime = os.stat(guide_path).st_mtime_ns
+    except OSError:
+        logger.error(f"未找到微信操作指南文件: {guide_path}")
+        print(f"警告: 未找到微信操作指南文件: {guide_path}")
+        return WeChatGuideIndex({})
+    
+    cached = _index_cache.get(guide_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    with _cache_lock:
+        cached = _index_cache.get(guide_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
         
-        logger.info(f"解析出 {len(guide)} 个指南部分: {', '.join(guide.keys())}")
+        index = None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                index = WeChatGuideIndex.load(cache_path)
+                if index.source_mtime != mtime:
+                    index = None
+                else:
+                    logger.info(f"从缓存加载微信操作指南索引: {cache_path}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"读取指南索引缓存失败: {str(e)}")
+                index = None
         
-        # 进一步结构化指南数据
-        structured_guide = parse_structured_guide(guide)
-        logger.info("指南结构化完成")
+        if index is None:
+            try:
+                with open(guide_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                logger.info(f"成功读取微信操作指南文件: {guide_path}, 大小: {len(content)} 字节")
+                index = WeChatGuideIndex.from_markdown(content, mtime)
+                logger.info(f"解析出 {len(index.operations())} 个指南部分: {', '.join(index.operations())}")
+            except Exception as e:
+                logger.error(f"读取或解析微信操作指南时出错: {str(e)}")
+                print(f"解析微信操作指南出错: {str(e)}")
+                return WeChatGuideIndex({})
+            if cache_path:
+                try:
+                    index.save(cache_path)
+                except OSError as e:
+                    logger.warning(f"写入指南索引缓存失败: {str(e)}")
         
-        return structured_guide
-    except Exception as e:
-        logger.error(f"读取或解析微信操作指南时出错: {str(e)}")
-        print(f"解析微信操作指南出错: {str(e)}")
-        return {}
+        _index_cache[guide_path] = (mtime, index)
+        return index
 
-def parse_structured_guide(guide):
+def get_wechat_guide():
     """
-    进一步解析操作指南为结构化数据
+    读取并解析微信操作指南文件
+    
+    Returns:
+        dict: 包含微信操作指南的字典
+    """
+    return get_guide_index().to_dict()
+
+# 各操作类型对应的指令关键词
+OPERATION_KEYWORDS = {
+    'launch': ('打开', '启动', '运行', '登录'),
+    'search': ('搜索', '查找', '找', '联系人'),
+    'chat': ('发送', '发消息', '消息', '告诉', '回复', '聊天', '说'),
+}
+
+# 每种操作需要参考的指南部分，按优先级排列（发消息前通常需要先搜索联系人，搜索前需要启动微信）
+OPERATION_DEPENDENCIES = {
+    'launch': ('launch',),
+    'search': ('search', 'launch'),
+    'chat': ('chat', 'search', 'launch'),
+}
+
+def classify_instruction(instruction):
+    """
+    根据关键词判断指令涉及的操作类型
     
     Args:
-        guide (dict): 原始指南数据
+        instruction (str): 用户指令
         
     Returns:
-        dict: 结构化的指南数据
+        list: 需要参考的指南部分，按优先级排列
+    """
+    matched = [operation for operation, keywords in OPERATION_KEYWORDS.items()
+               if any(keyword in instruction for keyword in keywords)]
+    # 优先级最高的操作决定需要参考哪些部分
+    for operation in ('chat', 'search', 'launch'):
+        if operation in matched:
+            return list(OPERATION_DEPENDENCIES[operation])
+    return []
+
+def estimate_tokens(text):
+    """
+    粗略估算文本的token数（中文约每字1个token，其他字符约每4个1个token）
     """
-    logger.info("开始结构化解析操作指南")
-    structured_guide = {
-        'launch': {},
-        'search': {},
-        'chat': {}
-    }
+    cjk = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+    return cjk + (len(text) - cjk + 3) // 4
+
+def select_guide_sections(guide, instruction, method=None, token_budget=GUIDE_TOKEN_BUDGET):
+    """
+    只选取与指令相关的指南部分，以紧凑文本形式返回，并控制在token预算内
     
-    try:
-        # 解析启动微信的方法
-        if '启动微信' in guide:
-            logger.debug("解析'启动微信'部分")
-            content = guide['启动微信']
-            if '键盘启动' in content:
-                keyboard_part = re.search(r'键盘启动[\s\S]*?(?=###|$)', content)
-                if keyboard_part:
-                    structured_guide['launch']['keyboard'] = keyboard_part.group().strip()
-                    logger.debug("已解析键盘启动方法")
-            
-            if '鼠标启动' in content:
-                mouse_part = re.search(r'鼠标启动[\s\S]*?(?=###|$)', content)
-                if mouse_part:
-                    structured_guide['launch']['mouse'] = mouse_part.group().strip()
-                    logger.debug("已解析鼠标启动方法")
-        else:
-            logger.warning("未找到'启动微信'部分")
-        
-        # 解析搜索联系人的方法
-        if '搜索联系人' in guide:
-            logger.debug("解析'搜索联系人'部分")
-            content = guide['搜索联系人']
-            
-            keyboard_part = re.search(r'键盘快捷搜索[\s\S]*?(?=###|$)', content)
-            if keyboard_part:
-                structured_guide['search']['keyboard'] = keyboard_part.group().strip()
-                
-                # 提取具体步骤
-                steps = re.findall(r'(?<=\d\.\s).*', keyboard_part.group())
-                structured_guide['search']['keyboard_steps'] = steps
-                logger.debug(f"已解析键盘搜索步骤，共 {len(steps)} 步")
-            
-            mouse_part = re.search(r'鼠标配合键盘搜索[\s\S]*?(?=###|$)', content)
-            if mouse_part:
-                structured_guide['search']['mouse'] = mouse_part.group().strip()
-                
-                # 提取具体步骤
-                steps = re.findall(r'(?<=\d\.\s).*', mouse_part.group())
-                structured_guide['search']['mouse_steps'] = steps
-                logger.debug(f"已解析鼠标搜索步骤，共 {len(steps)} 步")
-        else:
-            logger.warning("未找到'搜索联系人'部分")
+    Args:
+        guide (dict): parse_structured_guide返回的结构化指南
+        instruction (str): 用户指令
+        method (str): 操作方式 keyboard/mouse/mixed，为keyboard或mouse时只保留对应方法
+        token_budget (int): token预算
         
-        # 解析写入发送内容的方法
-        if '写入发送内容' in guide:
-            logger.debug("解析'写入发送内容'部分")
-            content = guide['写入发送内容']
-            steps = re.findall(r'(?<=\d\.\s).*', content)
-            structured_guide['chat']['steps'] = steps
-            logger.debug(f"已解析聊天步骤，共 {len(steps)} 步")
-        else:
-            logger.warning("未找到'写入发送内容'部分")
-    except Exception as e:
-        logger.error(f"结构化解析指南时出错: {str(e)}")
+    Returns:
+        str: 紧凑的指南文本，没有相关内容时为空字符串
+    """
+    if not guide:
+        return ""
     
-    # 检查解析结果完整性
-    for section, content in structured_guide.items():
-        if not content:
-            logger.warning(f"指南部分 '{section}' 为空")
+    lines = []
+    used_tokens = 0
+    for operation in classify_instruction(instruction):
+        section = guide.get(operation) or {}
+        for key, content in section.items():
+            # 有步骤列表时只使用步骤列表，跳过对应的原文
+            if isinstance(content, str) and f"{key}_steps" in section:
+                continue
+            section_method = key.replace('_steps', '')
+            if method in ('keyboard', 'mouse') and section_method in ('keyboard', 'mouse') and section_method != method:
+                continue
+            text = '；'.join(content) if isinstance(content, list) else ' '.join(content.split())
+            if not text:
+                continue
+            line = f"{operation}.{section_method}: {text}"
+            line_tokens = estimate_tokens(line)
+            if used_tokens + line_tokens > token_budget:
+                logger.debug(f"指南部分 {operation}.{section_method} 超出token预算，已跳过")
+                continue
+            lines.append(line)
+            used_tokens += line_tokens
     
-    return structured_guide
+    logger.debug(f"为指令选取了 {len(lines)} 个指南部分，约 {used_tokens} tokens")
+    return '\n'.join(lines)
 
 if __name__ == "__main__":
     # 测试解析功能
     guide = get_wechat_guide()
     print("解析结果:")
-    import json
     print(json.dumps(guide, ensure_ascii=False, indent=2)) 
\ No newline at end of file
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+微信自动化助手批处理启动脚本
+
+用法: python batch.py tasks.txt [-o results.jsonl] [--operation-type mixed] [--max-steps 15]
+"""
+
+import os
+import sys
+
+# 确保项目根目录在Python路径中
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# 导入并运行批处理程序
+from app.batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,15 @@
 
 """
 微信自动化助手启动脚本
+
+用法:
+    python run.py                  交互模式
+    python run.py --profile [目录]  交互模式，同时进行CPU采样和内存剖析
 """
 
 import os
 import sys
+import argparse
 
 # 确保项目根目录在Python路径中
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -16,4 +21,15 @@ sys.path.insert(0, project_root)
 from app.main import main
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="微信自动化助手")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="目录",
+                        help="对主循环进行CPU采样和内存剖析，结果写入指定目录（默认logs/profile/<时间>）")
+    parser.add_argument("--profile-all-threads", action="store_true", help="CPU采样包含所有线程")
+    args = parser.parse_args()
+
+    if args.profile is None:
+        main()
+    else:
+        from app.utils.profiler import ProfileSession
+        with ProfileSession(args.profile or None, all_threads=args.profile_all_threads):
+            main()
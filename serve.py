@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+微信自动化助手本地任务服务启动脚本
+
+用法: python serve.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import os
+import sys
+
+# 确保项目根目录在Python路径中
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# 导入并运行任务服务
+from app.service import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务检查点测试 - 检查检查点的记录、恢复和压缩，中断时正在执行的输入和回车不直接重新执行，
+恢复后已执行的步骤计入最大步骤数，以及服务、批处理重新提交的同一指令不从检查点恢复
+
+用法:
+    python -m pytest test_checkpoint.py
+"""
+
+import os
+import sys
+import io
+import json
+import base64
+
+from PIL import Image, ImageDraw
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app import main, batch
+from app.utils import checkpoint
+from app.utils.checkpoint import TaskJournal, checkpoint_matches, is_replayable, task_key
+from app.utils.scene_index import compute_fingerprint
+from app.utils.speculation import TrajectoryStore
+
+INSTRUCTION = "给张三发消息说你好"
+TEXT_ANALYSIS = {"task": "给张三发送消息", "context": "微信"}
+CLICK = {"description": "点击张三", "type": "mouse", "action": "click", "x": 190, "y": 96}
+WRITE = {"description": "输入消息", "type": "keyboard", "action": "write", "value": "你好"}
+ENTER = {"description": "发送消息", "type": "keyboard", "action": "press", "value": "enter"}
+
+def screen(color=(245, 245, 245)):
+    image = Image.new("RGB", (1280, 800), color)
+    ImageDraw.Draw(image).rectangle((60, 0, 320, 800), fill=(230, 230, 230))
+    return image
+
+def analysis(action):
+    return {"status": "进行中", "environment_ready": True, "steps": [action]}
+
+def context(steps_executed=0, last_action=None):
+    return {"instruction": INSTRUCTION, "operation_type": "mixed", "steps_executed": steps_executed,
+            "last_action": last_action or {}, "summary": []}
+
+def interrupted_journal(action, steps_executed=1, path=None):
+    """
+    执行了steps_executed步之后，在执行action的过程中中断的检查点
+    """
+    journal = TaskJournal(path)
+    journal.start(INSTRUCTION, "mixed", TEXT_ANALYSIS)
+    for step in range(steps_executed):
+        task_context = context(step + 1, CLICK)
+        task_context["summary"] = [CLICK["description"]] * (step + 1)
+        journal.action(task_context)
+    journal.step(context(steps_executed, CLICK), compute_fingerprint(screen()), analysis(action))
+    return journal
+
+def test_step_marks_action_in_flight_until_done():
+    journal = interrupted_journal(WRITE)
+    state = journal.resume(INSTRUCTION, "mixed")
+    assert state["steps_executed"] == 1 and state["in_flight"] == WRITE
+    assert state["analysis"]["steps"] == [WRITE]
+
+    done = context(2, WRITE)
+    done["summary"] = ["点击张三", "输入消息"]
+    journal.action(done)
+    state = journal.resume(INSTRUCTION, "mixed")
+    assert state["steps_executed"] == 2 and state["summary"] == ["点击张三", "输入消息"]
+    assert "in_flight" not in state and "analysis" not in state and "fingerprint" not in state
+
+    journal.end(INSTRUCTION, "mixed")
+    assert journal.resume(INSTRUCTION, "mixed") is None
+
+def test_is_replayable():
+    assert is_replayable(CLICK)
+    assert is_replayable({"type": "keyboard", "action": "hotkey", "value": "ctrl+f"})
+    assert not is_replayable(WRITE)
+    assert not is_replayable(ENTER)
+    assert not is_replayable({"type": "keyboard", "action": "hotkey", "value": "ctrl + Enter"})
+
+def test_non_idempotent_in_flight_action_is_not_reused():
+    fingerprint = compute_fingerprint(screen())
+    assert checkpoint_matches(interrupted_journal(CLICK).resume(INSTRUCTION, "mixed"), fingerprint)
+    for action in (WRITE, ENTER):
+        # 画面相同也不直接重新执行：中断前可能已经输入或发送
+        assert not checkpoint_matches(interrupted_journal(action).resume(INSTRUCTION, "mixed"), fingerprint)
+    other = compute_fingerprint(screen((30, 90, 160)))
+    assert not checkpoint_matches(interrupted_journal(CLICK).resume(INSTRUCTION, "mixed"), other)
+
+def test_reload_keeps_latest_state_and_compacts(tmp_path):
+    path = str(tmp_path / "task_journal.jsonl")
+    journal = interrupted_journal(CLICK, steps_executed=120, path=path)
+    journal.start("打开微信", "mixed", {"task": "打开微信"})
+    journal.end("打开微信", "mixed")
+    with open(path, "a", encoding="utf-8") as f:
+        # 进程被强制结束时最后一行可能不完整
+        f.write('{"key": "' + task_key(INSTRUCTION, "mixed") + '", "event": "act')
+
+    loaded = TaskJournal(path)
+    state = loaded.resume(INSTRUCTION, "mixed")
+    assert state["steps_executed"] == 120 and state["in_flight"] == CLICK
+    assert loaded.resume("打开微信", "mixed") is None
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 1 and lines[0]["key"] == task_key(INSTRUCTION, "mixed")
+    # 压缩后的文件中每个任务一行完整的状态
+    assert dict(TaskJournal(path).resume(INSTRUCTION, "mixed"), event="step") == state
+
+def test_worker_journal_uses_own_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_ENABLED", True)
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_PATH", str(tmp_path / "task_journal.jsonl"))
+    try:
+        checkpoint.use_worker_journal("worker1")
+        journal = checkpoint.get_task_journal()
+        assert journal.path == str(tmp_path / "task_journal.worker1.jsonl")
+    finally:
+        checkpoint.set_task_journal(None)
+
+class FakeRun:
+    """
+    代替run_task用到的截图、分析和执行，记录调用
+    """
+
+    def __init__(self, monkeypatch, journal, status="已完成", fresh=False):
+        self.analyses = []
+        self.executed = []
+        self.text_analyses = []
+        self.status = status
+        buffer = io.BytesIO()
+        screen().save(buffer, format="PNG")
+        image = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        monkeypatch.setattr(main, "get_task_journal", lambda: journal)
+        monkeypatch.setattr(main, "get_trajectory_store", lambda: TrajectoryStore())
+        monkeypatch.setattr(main, "get_screenshot", lambda screenshots_dir: (image, "screenshot.png"))
+        monkeypatch.setattr(main, "multi_round_image_analysis", self.analyze)
+        monkeypatch.setattr(main, "safe_execute_action", self.execute)
+        monkeypatch.setattr(main, "analyze_text", self.analyze_text if fresh else self.fail)
+
+    def fail(self, *args):
+        raise AssertionError("从检查点恢复时不应重新分析指令")
+
+    def analyze_text(self, user_input, wechat_guide=None, method=None):
+        self.text_analyses.append(user_input)
+        return dict(TEXT_ANALYSIS)
+
+    def analyze(self, img_base64, task_context):
+        self.analyses.append(json.loads(json.dumps(task_context)))
+        return {"status": self.status, "environment_ready": True, "steps": []}
+
+    def execute(self, action, task_context=None):
+        self.executed.append(action)
+        return True
+
+def run(tmp_path, max_steps=5, resume=True):
+    return main.run_task(INSTRUCTION, "mixed", str(tmp_path), None, confirm=lambda *args: False,
+                         max_steps=max_steps, confirm_every=0, resume=resume)
+
+def test_resume_reanalyses_instead_of_replaying_write(monkeypatch, tmp_path):
+    journal = interrupted_journal(WRITE)
+    fake = FakeRun(monkeypatch, journal)
+    result = run(tmp_path)
+    assert result["stop_reason"] == "completed"
+    assert fake.executed == []
+    assert len(fake.analyses) == 1
+    assert "输入消息（中断时正在执行，可能已完成）" in fake.analyses[0]["summary"]
+    assert journal.resume(INSTRUCTION, "mixed") is None
+
+def test_resume_replays_click_on_same_screen(monkeypatch, tmp_path):
+    journal = interrupted_journal(CLICK)
+    fake = FakeRun(monkeypatch, journal)
+    result = run(tmp_path)
+    assert fake.executed[0] == CLICK
+    assert result["stop_reason"] == "completed" and result["steps_executed"] == 2
+
+def test_resumed_steps_count_against_max_steps(monkeypatch, tmp_path):
+    journal = interrupted_journal(CLICK, steps_executed=3)
+    fake = FakeRun(monkeypatch, journal, status="进行中")
+    result = run(tmp_path, max_steps=3)
+    assert result["stop_reason"] == "max_steps"
+    assert fake.analyses == [] and fake.executed == []
+    # 达到最大步骤数后不再恢复
+    assert journal.resume(INSTRUCTION, "mixed") is None
+
+def test_new_submission_does_not_resume(monkeypatch, tmp_path):
+    # 不要求恢复时（服务、批处理提交的任务）是新的任务：重新分析指令，不继承已执行的步骤和摘要
+    journal = interrupted_journal(WRITE, steps_executed=3)
+    fake = FakeRun(monkeypatch, journal, fresh=True)
+    result = run(tmp_path, resume=False)
+    assert fake.text_analyses == [INSTRUCTION]
+    assert fake.analyses[0]["steps_executed"] == 0 and fake.analyses[0]["summary"] == []
+    assert result["stop_reason"] == "completed" and result["steps_executed"] == 0
+
+def test_batch_resubmission_does_not_resume(monkeypatch, tmp_path):
+    journal = interrupted_journal(ENTER, steps_executed=2)
+    fake = FakeRun(monkeypatch, journal, fresh=True)
+    monkeypatch.setattr(batch, "get_wechat_guide", lambda: None)
+    summary = batch.run_batch([{"instruction": INSTRUCTION}], str(tmp_path / "results.jsonl"))
+    assert summary["completed"] == 1 and summary["steps"] == 0
+    assert fake.text_analyses == [INSTRUCTION]
+    assert fake.analyses[0]["summary"] == []
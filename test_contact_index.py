@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+联系人导航索引测试 - 用合成的微信主界面检查名称相近的联系人（"Bob"与"Rob"、"Team A"与"Team B"）
+不会被当作已记录的联系人，选中与未选中的背景不影响匹配，以及点击后聊天窗口标题不一致时改用搜索
+
+用法:
+    python -m pytest test_contact_index.py
+"""
+
+import os
+import sys
+import json
+
+from PIL import Image, ImageDraw, ImageFont
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app.utils import contact_index
+from app.utils.contact_index import ContactIndex, ink_mismatch, row_signature
+from app.controllers.skills import ChatSkills
+from app.controllers.input_drivers import NullDriver
+from app.config import CONTACT_MATCH_MAX_PIXELS
+
+SIZE = (1280, 800)
+LIST_LEFT, LIST_TOP, ROW_HEIGHT = SIZE[0] // 18, 60, 64
+FONT = ImageFont.load_default()
+
+def wechat_main(names, selected=None, title=None):
+    """
+    合成的微信主界面：会话列表的行与default_region的按行切分对齐，所有联系人使用相同的头像
+    """
+    image = Image.new("RGB", SIZE, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, LIST_LEFT, SIZE[1]), fill=(46, 46, 46))
+    draw.rectangle((LIST_LEFT, 0, SIZE[0] // 4, SIZE[1]), fill=(230, 230, 230))
+    for row, name in enumerate(names):
+        top = LIST_TOP + row * ROW_HEIGHT
+        if row == selected:
+            draw.rectangle((LIST_LEFT, top, SIZE[0] // 4 - 1, top + ROW_HEIGHT - 1), fill=(198, 198, 198))
+        draw.rectangle((LIST_LEFT + 8, top + 10, LIST_LEFT + 52, top + 54), fill=(80, 160, 90))
+        draw.text((LIST_LEFT + 64, top + 12), name, fill=(20, 20, 20), font=FONT)
+        draw.text((LIST_LEFT + 64, top + 40), "ok", fill=(150, 150, 150), font=FONT)
+    if title:
+        draw.text((SIZE[0] // 4 + 20, 22), title, fill=(20, 20, 20), font=FONT)
+    return image
+
+class FakeCapture:
+    """
+    截图后端：grab返回当前画面（或其中的区域）
+    """
+
+    def __init__(self, image):
+        self.image = image
+
+    def grab(self, region=None):
+        if region is None:
+            return self.image.copy()
+        left, top, width, height = region
+        return self.image.crop((left, top, left + width, top + height))
+
+def learned_index(monkeypatch, names, path=None):
+    """
+    模拟通过搜索进入每个联系人的聊天（该行选中、标题为联系人名称）后记录索引
+    """
+    capture = FakeCapture(None)
+    monkeypatch.setattr(contact_index, "get_capture_backend", lambda: capture)
+    index = ContactIndex(path)
+    for row, name in enumerate(names):
+        capture.image = wechat_main(names, selected=row, title=name)
+        selected, signature = index.selected_fingerprint()
+        assert selected == row
+        index.learn(name, selected, signature)
+    return index, capture
+
+def name_ink(image, row=0):
+    row_image = image.crop((LIST_LEFT, LIST_TOP + row * ROW_HEIGHT, SIZE[0] // 4, LIST_TOP + (row + 1) * ROW_HEIGHT))
+    return row_signature(row_image)["ink"]
+
+def test_selection_background_does_not_change_ink():
+    assert ink_mismatch(name_ink(wechat_main(["Bob"])), name_ink(wechat_main(["Bob"], selected=0))) == 0
+
+def test_lookalike_names_differ_in_ink():
+    for name, lookalike in (("Bob", "Rob"), ("Team A", "Team B")):
+        pixels = ink_mismatch(name_ink(wechat_main([name], selected=0)), name_ink(wechat_main([lookalike])))
+        assert pixels > CONTACT_MATCH_MAX_PIXELS, f"{name} 与 {lookalike} 相差 {pixels} 个像素"
+
+def test_learned_contact_is_found_after_reorder(monkeypatch):
+    index, capture = learned_index(monkeypatch, ["Alice", "Bob", "Team A"])
+    capture.image = wechat_main(["Team A", "Carol", "Alice", "Bob"])
+    assert index.locate("Bob") == 3
+    assert index.locate("Team A") == 0
+    assert index.entries["Bob"]["row"] == 3
+
+def test_lookalike_row_is_rejected(monkeypatch):
+    index, capture = learned_index(monkeypatch, ["Bob", "Team A"])
+    # 只有名称相近的联系人可见时不点击任何一行
+    capture.image = wechat_main(["Rob", "Team B", "Alice"])
+    assert index.locate("Bob") is None
+    assert index.locate("Team A") is None
+
+def test_both_lookalikes_learned_are_told_apart(monkeypatch):
+    index, capture = learned_index(monkeypatch, ["Bob", "Rob", "Team A", "Team B"])
+    capture.image = wechat_main(["Team B", "Rob", "Team A", "Bob"])
+    assert [index.locate(name) for name in ("Bob", "Rob", "Team A", "Team B")] == [3, 1, 2, 0]
+
+def test_header_is_verified(monkeypatch):
+    index, capture = learned_index(monkeypatch, ["Bob", "Rob"])
+    capture.image = wechat_main(["Bob", "Rob"], selected=0, title="Bob")
+    assert index.verify_header("Bob")
+    capture.image = wechat_main(["Bob", "Rob"], selected=0, title="Rob")
+    assert not index.verify_header("Bob")
+
+def test_open_chat_falls_back_to_search_on_header_mismatch(monkeypatch):
+    index, capture = learned_index(monkeypatch, ["Bob", "Alice"])
+    capture.image = wechat_main(["Alice", "Bob"], title="Rob")
+    driver = NullDriver()
+    skills = ChatSkills(driver=driver, verify=False, contact_index=index)
+    skills.open_chat("Bob")
+    names = [name for name, _ in driver.actions]
+    assert "hotkey" in names and ("write", ("Bob",)) in driver.actions
+    assert skills._opened == ("Bob", "search")
+
+    capture.image = wechat_main(["Alice", "Bob"], title="Bob")
+    driver.actions.clear()
+    skills.open_chat("Bob")
+    assert "hotkey" not in [name for name, _ in driver.actions]
+    assert skills._opened == ("Bob", "index")
+
+def test_save_and_load(monkeypatch, tmp_path):
+    path = str(tmp_path / "contact_index.json")
+    index, capture = learned_index(monkeypatch, ["Bob", "Team A"], path)
+    loaded = ContactIndex(path)
+    assert set(loaded.entries) == {"Bob", "Team A"}
+    capture.image = wechat_main(["Rob", "Bob"])
+    assert loaded.locate("Bob") == 1
+    capture.image = wechat_main(["Bob", "Rob"], title="Bob")
+    assert loaded.verify_header("Bob")
+
+    # 旧版本只有差值哈希的记录不再使用
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["Old"] = {"hash": data["Bob"]["hash"], "row": 0, "used_at": 0}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert "Old" not in ContactIndex(path).entries
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+字段缺陷追问测试 - 检查find_field_defects对各类缺陷字段的识别，
+reask_defective_fields只追问有缺陷的字段、追问轮数不超过FIELD_REASK_MAX_ROUNDS，
+以及追问后仍有缺陷的步骤不会被执行
+
+用法:
+    python -m pytest test_field_reask.py
+"""
+
+import os
+import sys
+import io
+import json
+import base64
+from types import SimpleNamespace
+
+from PIL import Image
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app import main
+from app.models import qwen_interface
+from app.models.qwen_interface import find_field_defects, reask_defective_fields, executable_steps
+from app.utils.speculation import TrajectoryStore
+
+VALID_RESULT = {
+    "status": "进行中",
+    "environment_ready": True,
+    "steps": [
+        {"description": "打开搜索", "type": "keyboard", "action": "hotkey", "value": "ctrl+f"},
+        {"description": "点击联系人", "type": "mouse", "action": "click", "x": 120, "y": 240},
+    ]
+}
+
+def _reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class FakeCompletion:
+    """
+    代替chat_completion，按顺序返回预设的回复并记录每次追问的对话
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def __call__(self, route, messages, client=None, **kwargs):
+        self.calls.append(list(messages))
+        return _reply(self.replies.pop(0))
+
+def test_valid_result_has_no_defects():
+    assert find_field_defects(json.loads(json.dumps(VALID_RESULT))) == {}
+
+def test_step_defects_are_detected():
+    result = dict(VALID_RESULT, steps=[
+        {"type": "keyboard", "action": "hotkey", "value": "ctrl"},
+        {"type": "mouse", "action": "click", "x": 10},
+        {"type": "mouse", "action": "drag", "x": 1, "y": 2, "end_x": True, "end_y": 3},
+        {"type": "mouse", "action": "scroll", "value": "down"},
+        {"type": "voice", "action": "say"},
+        "打开微信",
+    ])
+    defects = find_field_defects(result)
+    assert list(defects) == ["steps"]
+    problems = "\n".join(defects["steps"])
+    assert "第1步的组合键格式" in problems
+    assert "第2步缺少有效的y坐标" in problems
+    assert "第3步缺少有效的end_x坐标" in problems
+    assert "第4步的value应为滚动量" in problems
+    assert "第5步的type" in problems
+    assert "第6步不是JSON对象" in problems
+
+def test_status_and_environment_defects_are_detected():
+    defects = find_field_defects(dict(VALID_RESULT, status="done", environment_ready="yes"))
+    assert set(defects) == {"status", "environment_ready"}
+
+def test_in_progress_without_steps_is_a_defect():
+    assert "steps" in find_field_defects(dict(VALID_RESULT, steps=[]))
+    # 需要用户确认或环境未就绪时可以没有操作步骤
+    assert find_field_defects(dict(VALID_RESULT, steps=[], status="需要用户确认")) == {}
+    assert find_field_defects(dict(VALID_RESULT, steps=[], environment_ready=False)) == {}
+
+def test_reask_only_repairs_defective_fields(monkeypatch):
+    fake = FakeCompletion([json.dumps({"status": "已完成", "steps": []})])
+    monkeypatch.setattr(qwen_interface, "chat_completion", fake)
+    parsed = dict(VALID_RESULT, status="done", reasoning="原始推理")
+    messages = [{"role": "user", "content": [{"type": "text", "text": "分析截图"},
+                                             {"type": "image_url", "image_url": {"url": "data:image/png;base64,AA=="}}]}]
+
+    result = reask_defective_fields(None, messages, "原始回复", parsed)
+
+    assert len(fake.calls) == 1
+    conversation = fake.calls[0]
+    # 追问中去掉了截图，只保留文本，并要求只重新输出status
+    assert conversation[0]["content"] == "分析截图"
+    assert "status" in conversation[-1]["content"] and "environment_ready" not in conversation[-1]["content"]
+    assert result["status"] == "已完成"
+    # 没有缺陷的字段不被追问结果覆盖
+    assert result["steps"] == VALID_RESULT["steps"]
+    assert result["reasoning"] == "原始推理"
+    assert result["field_reask_rounds"] == 1
+    assert "field_defects" not in result
+
+def test_reask_stops_at_round_cap(monkeypatch):
+    fake = FakeCompletion([json.dumps({"status": "unknown"})] * 5)
+    monkeypatch.setattr(qwen_interface, "chat_completion", fake)
+    monkeypatch.setattr(qwen_interface, "FIELD_REASK_MAX_ROUNDS", 2)
+
+    result = reask_defective_fields(None, [{"role": "user", "content": "分析截图"}], "原始回复",
+                                    dict(VALID_RESULT, status="done"))
+
+    assert len(fake.calls) == 2
+    assert result["field_reask_rounds"] == 2
+    assert set(result["field_defects"]) == {"status"}
+
+def test_reask_is_skipped_without_defects(monkeypatch):
+    fake = FakeCompletion([])
+    monkeypatch.setattr(qwen_interface, "chat_completion", fake)
+    result = reask_defective_fields(None, [], "原始回复", json.loads(json.dumps(VALID_RESULT)))
+    assert fake.calls == []
+    assert "field_reask_rounds" not in result
+
+def test_executable_steps_stop_at_first_defect():
+    click, check = VALID_RESULT["steps"][1], {"description": "检查环境", "type": "check_environment"}
+    assert executable_steps(VALID_RESULT["steps"]) == VALID_RESULT["steps"]
+    assert executable_steps([click, {"type": "mouse", "action": "click", "x": 10}, click]) == [click]
+    assert executable_steps([check, click]) == []
+    assert executable_steps("打开微信") == []
+
+def run_with_analysis(monkeypatch, analysis, tmp_path, confirm_result=False):
+    """
+    用固定的截图分析结果执行run_task（第二轮起报告任务完成），返回结果、执行的操作和确认的事件
+    """
+    buffer = io.BytesIO()
+    Image.new("RGB", (1280, 800), (245, 245, 245)).save(buffer, format="PNG")
+    image = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    analyses = [analysis, {"status": "已完成", "environment_ready": True, "steps": []}]
+    executed, confirmed = [], []
+    monkeypatch.setattr(main, "get_task_journal", lambda: None)
+    monkeypatch.setattr(main, "get_trajectory_store", lambda: TrajectoryStore())
+    monkeypatch.setattr(main, "get_screenshot", lambda screenshots_dir: (image, "screenshot.png"))
+    monkeypatch.setattr(main, "multi_round_image_analysis", lambda img, context: analyses.pop(0))
+    monkeypatch.setattr(main, "safe_execute_action", lambda action, context=None: executed.append(action) or True)
+
+    def confirm(event, message):
+        confirmed.append(event)
+        return confirm_result
+
+    result = main.run_task("给张三发消息", "mixed", str(tmp_path), None, confirm=confirm, max_steps=5,
+                           confirm_every=0, text_analysis={"task": "给张三发消息"})
+    return result, executed, confirmed
+
+def test_defective_first_step_is_not_executed(monkeypatch, tmp_path):
+    for step in ({"description": "点击联系人", "type": "mouse", "action": "click"},
+                 {"description": "检查环境", "type": "check_environment"}):
+        analysis = {"status": "进行中", "environment_ready": True, "steps": [step, VALID_RESULT["steps"][1]],
+                    "field_reask_rounds": 2, "field_defects": {"steps": ["第1步有缺陷"]}}
+        result, executed, confirmed = run_with_analysis(monkeypatch, analysis, tmp_path)
+        assert executed == []
+        assert confirmed == ["no_steps"]
+        assert result["stop_reason"] == "stopped" and result["steps_executed"] == 0
+
+def test_valid_steps_before_defect_still_run(monkeypatch, tmp_path):
+    click = VALID_RESULT["steps"][1]
+    analysis = {"status": "进行中", "environment_ready": True,
+                "steps": [click, {"description": "拖动", "type": "mouse", "action": "drag", "x": 1, "y": 2}],
+                "field_reask_rounds": 2, "field_defects": {"steps": ["第2步缺少有效的end_x坐标"]}}
+    result, executed, confirmed = run_with_analysis(monkeypatch, analysis, tmp_path)
+    assert executed == [click]
+    assert result["stop_reason"] == "completed" and result["steps_executed"] == 1
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+操作指南选取测试 - 检查select_guide_sections只选取与指令相关的指南部分、
+按操作方式过滤，并且注入的内容不超过token预算
+
+用法:
+    python -m pytest test_guide_sections.py
+"""
+
+import os
+import sys
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app.utils.wechat_guide_parser import (
+    parse_structured_guide, select_guide_sections, classify_instruction, estimate_tokens, get_guide_index
+)
+
+with open(os.path.join(current_dir, "WeChat.md"), "r", encoding="utf-8") as f:
+    GUIDE = parse_structured_guide(f.read())
+
+def _operations(text):
+    return [line.split(".", 1)[0] for line in text.splitlines()]
+
+def test_guide_is_parsed_into_operations_and_methods():
+    assert GUIDE["search"]["keyboard_steps"][0].startswith("使用组合键ctrl+F")
+    assert len(GUIDE["search"]["mouse_steps"]) == 4
+    assert len(GUIDE["chat"]["steps"]) == 3
+    assert "keyboard" in GUIDE["launch"] and "mouse" in GUIDE["launch"]
+
+def test_instruction_selects_dependent_sections():
+    assert classify_instruction("给张三发消息说明天开会") == ["chat", "search", "launch"]
+    assert classify_instruction("搜索联系人李四") == ["search", "launch"]
+    assert classify_instruction("打开微信") == ["launch"]
+    assert classify_instruction("今天天气怎么样") == []
+    assert select_guide_sections(GUIDE, "今天天气怎么样", token_budget=10000) == ""
+
+def test_method_filter_keeps_only_matching_method():
+    text = select_guide_sections(GUIDE, "搜索联系人李四", method="keyboard", token_budget=10000)
+    assert "search.keyboard:" in text and "launch.keyboard:" in text
+    assert ".mouse:" not in text
+    # mixed时两种方法都保留
+    text = select_guide_sections(GUIDE, "搜索联系人李四", method="mixed", token_budget=10000)
+    assert "search.mouse:" in text and "search.keyboard:" in text
+
+def test_selected_sections_fit_token_budget():
+    unlimited = select_guide_sections(GUIDE, "给张三发消息", method="keyboard", token_budget=10000)
+    total = sum(estimate_tokens(line) for line in unlimited.splitlines())
+    for budget in (0, 20, 60, total // 2, total):
+        text = select_guide_sections(GUIDE, "给张三发消息", method="keyboard", token_budget=budget)
+        used = sum(estimate_tokens(line) for line in text.splitlines())
+        assert used <= budget, f"预算 {budget} 时使用了 {used} tokens"
+    assert select_guide_sections(GUIDE, "给张三发消息", method="keyboard", token_budget=total) == unlimited
+
+def test_budget_keeps_highest_priority_sections_first():
+    chat_line = select_guide_sections(GUIDE, "给张三发消息", method="keyboard", token_budget=10000).splitlines()[0]
+    assert chat_line.startswith("chat.")
+    text = select_guide_sections(GUIDE, "给张三发消息", method="keyboard", token_budget=estimate_tokens(chat_line))
+    assert _operations(text) == ["chat"]
+
+def test_oversized_section_is_skipped_but_later_sections_fit():
+    guide = {
+        "chat": {"steps": ["输入" * 200]},
+        "search": {"keyboard_steps": ["ctrl+f", "输入姓名", "回车"]},
+        "launch": {},
+    }
+    text = select_guide_sections(guide, "给张三发消息", method="keyboard", token_budget=50)
+    assert _operations(text) == ["search"]
+
+def test_guide_index_cache_round_trip(tmp_path):
+    guide_path = tmp_path / "WeChat.md"
+    cache_path = tmp_path / "cache" / "wechat_guide_index.json"
+    guide_path.write_text("## 搜索联系人\n### 键盘快捷搜索\n### 1.按ctrl+f\n### 2.输入姓名\n", encoding="utf-8")
+    index = get_guide_index(str(guide_path), str(cache_path))
+    assert index.steps("search", "keyboard") == ["按ctrl+f", "输入姓名"]
+    assert cache_path.exists()
+    # 同一文件再次获取时直接返回内存中的索引
+    assert get_guide_index(str(guide_path), str(cache_path)) is index
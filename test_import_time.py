@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时测试 - 在新的解释器中用 python -X importtime 导入各入口模块，
+检查openai、numpy、PIL等重量级依赖没有在导入时被加载（它们应在第一次使用时才导入）。
+累计导入耗时与机器和负载有关，只在设置了 IMPORT_TIME_BUDGET=1 时检查是否超过预算
+
+用法:
+    python test_import_time.py          打印各入口模块的导入耗时和最慢的项目子模块
+    python -m pytest test_import_time.py
+    IMPORT_TIME_BUDGET=1 python -m pytest test_import_time.py      同时检查导入耗时预算
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 入口模块 -> 累计导入耗时预算（毫秒）。当前实测均在100毫秒以内，预算留有余量以适应较慢的机器
+IMPORT_BUDGETS_MS = {
+    "app.main": 400,
+    "app.batch": 300,
+    "app.service": 400,
+    "app.pool": 300,
+}
+
+# 导入耗时是绝对的墙钟时间，在负载较高的CI机器上会波动，默认不检查
+CHECK_BUDGETS = os.environ.get("IMPORT_TIME_BUDGET") == "1"
+
+# 不应在导入入口模块时加载的依赖
+HEAVY_MODULES = ("openai", "numpy", "PIL", "cv2", "requests", "speech_recognition", "vosk", "pyautogui", "mss")
+
+def measure_import(module):
+    """
+    在新的解释器中导入模块
+
+    Args:
+        module (str): 模块名
+
+    Returns:
+        tuple: (累计导入耗时（毫秒）, {子模块: 累计耗时（毫秒）}, 导入后已加载的重量级依赖列表)
+    """
+    code = (f"import sys, {module}; "
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=current_dir,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr}")
+
+    # importtime的每行格式为 "import time: 自身(us) | 累计(us) | 模块名"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative[parts[2].strip()] = int(parts[1]) / 1000
+    heavy = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative.get(module, 0.0), cumulative, heavy
+
+def test_entry_points_do_not_load_heavy_dependencies():
+    for module in IMPORT_BUDGETS_MS:
+        _, _, heavy = measure_import(module)
+        assert not heavy, f"导入 {module} 时加载了重量级依赖: {heavy}"
+
+@pytest.mark.skipif(not CHECK_BUDGETS, reason="设置IMPORT_TIME_BUDGET=1时才检查导入耗时预算")
+def test_entry_point_import_time_within_budget():
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        total, _, _ = measure_import(module)
+        assert total <= budget, f"导入 {module} 耗时 {total:.1f}ms，超过预算 {budget}ms"
+
+if __name__ == "__main__":
+    failed = False
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        total, cumulative, heavy = measure_import(module)
+        ok = (total <= budget or not CHECK_BUDGETS) and not heavy
+        failed = failed or not ok
+        print(f"\n{'✓' if ok else '✗'} {module}: {total:.1f}ms（预算 {budget}ms）"
+              + (f"，加载了重量级依赖: {', '.join(heavy)}" if heavy else ""))
+        slowest = sorted(((ms, name) for name, ms in cumulative.items()
+                          if name.startswith("app.") and name != module), reverse=True)[:5]
+        for ms, name in slowest:
+            print(f"    {ms:>8.1f}ms  {name}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+新消息监视测试 - 检查第一次采样只作为比较基准、只报告新出现的未读角标，
+自动回复任务在会话列表重新排序后按名称的笔画找到原来的会话，找不到时不发送，
+以及外部通过 POST /jobs 不能创建自动回复任务
+
+用法:
+    python -m pytest test_message_watcher.py
+"""
+
+import os
+import sys
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from PIL import Image, ImageDraw, ImageFont
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app.utils import contact_index, message_watcher
+from app.utils.message_watcher import ChatListDetector, MessageWatcher
+from app.utils.contact_index import ContactIndex
+from app.controllers.skills import ChatSkills
+from app.controllers.input_drivers import NullDriver
+from app.service import JobQueue, acknowledge, make_handler
+from app.config import WATCHER_BADGE_COLOR, WATCHER_ACK_MESSAGE
+
+SIZE = (1280, 800)
+LIST_LEFT, LIST_TOP, ROW_HEIGHT = SIZE[0] // 18, 60, 64
+FONT = ImageFont.load_default()
+
+def wechat_main(names, unread=()):
+    """
+    合成的微信主界面：会话列表的行与default_region的按行切分对齐，unread中的会话头像右上角有未读角标
+    """
+    image = Image.new("RGB", SIZE, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, LIST_LEFT, SIZE[1]), fill=(46, 46, 46))
+    draw.rectangle((LIST_LEFT, 0, SIZE[0] // 4, SIZE[1]), fill=(230, 230, 230))
+    for row, name in enumerate(names):
+        top = LIST_TOP + row * ROW_HEIGHT
+        draw.rectangle((LIST_LEFT + 8, top + 10, LIST_LEFT + 52, top + 54), fill=(80, 160, 90))
+        draw.text((LIST_LEFT + 64, top + 12), name, fill=(20, 20, 20), font=FONT)
+        if name in unread:
+            draw.ellipse((LIST_LEFT + 40, top + 4, LIST_LEFT + 54, top + 18), fill=WATCHER_BADGE_COLOR)
+    return image
+
+class FakeCapture:
+    """
+    截图后端：grab返回当前画面（或其中的区域）
+    """
+
+    def __init__(self, image=None):
+        self.image = image
+
+    def grab(self, region=None):
+        if region is None:
+            return self.image.copy()
+        left, top, width, height = region
+        return self.image.crop((left, top, left + width, top + height))
+
+def list_region(image):
+    return image.crop((LIST_LEFT, LIST_TOP, SIZE[0] // 4, SIZE[1]))
+
+def test_first_sample_is_baseline():
+    detector = ChatListDetector()
+    assert detector.update(list_region(wechat_main(["Alice", "Bob", "Carol"], unread=("Alice",)))) == []
+    events = detector.update(list_region(wechat_main(["Alice", "Bob", "Carol"], unread=("Alice", "Carol"))))
+    assert [(event["type"], event["row"]) for event in events] == [("unread", 2)]
+    # 暂停采样后恢复时不重复报告已有的角标
+    detector.reset()
+    assert detector.update(list_region(wechat_main(["Alice", "Bob", "Carol"], unread=("Alice", "Carol")))) == []
+
+def watch(monkeypatch, capture, names, unread):
+    monkeypatch.setattr(message_watcher, "get_capture_backend", lambda: capture)
+    monkeypatch.setattr(contact_index, "get_capture_backend", lambda: capture)
+    events = []
+    watcher = MessageWatcher(events.append)
+    capture.image = wechat_main(names)
+    watcher.sample()
+    capture.image = wechat_main(names, unread=unread)
+    watcher.sample()
+    assert len(events) == 1 and events[0]["type"] == "unread"
+    return events[0]
+
+def ack(event, queue=None):
+    queue = queue or JobQueue()
+    job = queue.submit({"instruction": "回复", "ack": {"signature": event["signature"], "row": event["row"]}})
+    driver = NullDriver()
+    skills = ChatSkills(driver=driver, verify=False, use_index=False, contact_index=ContactIndex())
+    return acknowledge(job, skills), driver
+
+def test_ack_follows_reordered_conversation(monkeypatch):
+    capture = FakeCapture()
+    event = watch(monkeypatch, capture, ["Alice", "Rob", "Bob"], unread=("Bob",))
+    assert event["row"] == 2 and event["signature"]["bits"]
+    # 排队期间Bob被顶到最前，原来的第3行变成了名称相近的Rob
+    capture.image = wechat_main(["Bob", "Alice", "Rob"], unread=("Bob",))
+    result, driver = ack(event)
+    assert result["stop_reason"] == "completed" and result["row"] == 0
+    clicks = [args for name, args in driver.actions if name == "click"]
+    assert clicks and clicks[0][1] == LIST_TOP + ROW_HEIGHT // 2
+    assert ("write", (WATCHER_ACK_MESSAGE,)) in driver.actions
+
+def test_ack_is_skipped_when_conversation_is_gone(monkeypatch):
+    capture = FakeCapture()
+    event = watch(monkeypatch, capture, ["Alice", "Team A", "Carol"], unread=("Team A",))
+    capture.image = wechat_main(["Alice", "Team B", "Carol"])
+    result, driver = ack(event)
+    assert result["stop_reason"] == "failed" and result["row"] is None
+    assert not [name for name, _ in driver.actions if name in ("click", "write")]
+
+def test_queued_ack_is_not_duplicated(monkeypatch):
+    capture = FakeCapture()
+    event = watch(monkeypatch, capture, ["Alice", "Bob"], unread=("Bob",))
+    queue = JobQueue()
+    assert not queue.has_queued_ack(event["signature"])
+    queue.submit({"instruction": "回复", "ack": {"signature": event["signature"], "row": event["row"]}})
+    assert queue.has_queued_ack(event["signature"])
+
+def test_jobs_endpoint_cannot_create_ack_jobs():
+    queue = JobQueue()
+    ready = threading.Event()
+    ready.set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(queue, ready))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        body = json.dumps({"instruction": "回复", "ack": {"row": 0}}).encode("utf-8")
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/jobs", data=body,
+                                         method="POST")
+        with urllib.request.urlopen(request) as response:
+            created = json.loads(response.read().decode("utf-8"))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "ack" not in created
+    assert "ack" not in queue.get(created["id"])
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多桌面并行执行测试 - 检查调度器在工作进程中途退出或任务超时时把该任务记为error并继续，
+不会无限等待；安装了Xvfb时再用null输入驱动和合成截图跑一遍虚拟显示器上的自检
+
+用法:
+    python -m pytest test_pool.py
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+
+import pytest
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app.pool import run_pool, serve_tasks, selftest_tasks
+
+def _run(task):
+    if task.get("crash"):
+        # 模拟工作进程在任务中途崩溃（如段错误、显示器消失）
+        time.sleep(0.2)
+        os._exit(3)
+    if task.get("hang"):
+        time.sleep(60)
+    return {"instruction": task["instruction"], "stop_reason": "completed", "steps_executed": 1}
+
+def fake_worker(worker_id, display_number, task_queue, result_queue, options):
+    """
+    不启动虚拟显示器的工作进程，任务协议与worker_main相同
+    """
+    serve_tasks(worker_id, _run, task_queue, result_queue, f":{display_number}")
+
+def failing_worker(worker_id, display_number, task_queue, result_queue, options):
+    result_queue.put({"event": "failed", "worker": worker_id, "error": "Xvfb未安装"})
+
+def test_all_tasks_complete():
+    tasks = [{"instruction": f"任务 {i}"} for i in range(6)]
+    summary = run_pool(tasks, workers=2, target=fake_worker)
+    assert summary["completed"] == 6 and summary["failed_workers"] == 0
+
+def test_task_of_crashed_worker_is_marked_failed(tmp_path):
+    results_path = tmp_path / "results.jsonl"
+    tasks = [{"instruction": "任务 1"}, {"instruction": "崩溃", "crash": True}] + \
+            [{"instruction": f"任务 {i}"} for i in range(2, 6)]
+    start = time.time()
+    summary = run_pool(tasks, workers=2, results_path=str(results_path), target=fake_worker)
+    assert time.time() - start < 30
+    assert summary["completed"] == 5
+    assert summary["failed_workers"] == 1
+    results = {record["index"]: record for record in map(json.loads, results_path.read_text(encoding="utf-8").splitlines())}
+    assert sorted(results) == list(range(1, 7))
+    assert results[2]["stop_reason"] == "error" and "退出码 3" in results[2]["error"]
+
+def test_hung_task_times_out():
+    tasks = [{"instruction": "卡住", "hang": True}, {"instruction": "任务 2"}]
+    start = time.time()
+    summary = run_pool(tasks, workers=1, task_timeout=1, target=fake_worker)
+    assert time.time() - start < 30
+    # 唯一的工作进程被结束后，剩余任务也记为error，调度器不再等待
+    assert summary["completed"] == 0 and summary["failed_workers"] == 1
+
+def test_all_workers_failing_to_start_does_not_hang():
+    summary = run_pool([{"instruction": "任务"}] * 3, workers=2, target=failing_worker)
+    assert summary["completed"] == 0 and summary["failed_workers"] == 2
+
+@pytest.mark.skipif(shutil.which("Xvfb") is None, reason="需要安装Xvfb")
+def test_selftest_on_virtual_displays(monkeypatch):
+    # 工作进程用spawn启动，环境变量在启动时传给它们
+    monkeypatch.setenv("INPUT_DRIVER", "null")
+    monkeypatch.setenv("CAPTURE_BACKEND", "synthetic")
+    tasks = selftest_tasks(2, per_worker=2)
+    summary = run_pool(tasks, workers=2, selftest=True, task_timeout=60)
+    assert summary["completed"] == len(tasks)
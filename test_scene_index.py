@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地场景识别测试 - 用合成的界面截图检查指纹匹配：同一场景的轻微变化在SCENE_MATCH_THRESHOLD以内命中，
+布局或配色不同的场景超过阈值不命中
+
+用法:
+    python -m pytest test_scene_index.py
+"""
+
+import os
+import sys
+import io
+import base64
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app.utils import scene_index
+from app.utils.scene_index import SceneIndex, compute_fingerprint, classify_scene
+from app.config import SCENE_MATCH_THRESHOLD
+
+SIZE = (1280, 800)
+
+def desktop(seed=0):
+    """
+    蓝色桌面，左侧一列图标
+    """
+    image = Image.new("RGB", SIZE, (30, 90, 160))
+    draw = ImageDraw.Draw(image)
+    for row in range(6):
+        draw.rectangle((20, 20 + row * 110, 90, 90 + row * 110), fill=(240, 200, 60))
+    draw.rectangle((0, SIZE[1] - 48, SIZE[0], SIZE[1]), fill=(20, 20, 30))
+    return _noise(image, seed)
+
+def wechat_main(seed=0, selected=2):
+    """
+    微信主界面：深色侧边栏、会话列表（一行选中）、白色聊天区域
+    """
+    image = Image.new("RGB", SIZE, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 60, SIZE[1]), fill=(46, 46, 46))
+    draw.rectangle((60, 0, 320, SIZE[1]), fill=(230, 230, 230))
+    for row in range(10):
+        top = 64 + row * 64
+        if row == selected:
+            draw.rectangle((60, top, 320, top + 64), fill=(200, 200, 200))
+        draw.rectangle((72, top + 10, 116, top + 54), fill=(80, 160, 90))
+        draw.rectangle((126, top + 14, 200 + row * 8, top + 26), fill=(40, 40, 40))
+    draw.rectangle((320, SIZE[1] - 160, SIZE[0], SIZE[1]), fill=(255, 255, 255))
+    return _noise(image, seed)
+
+def login_window(seed=0):
+    """
+    桌面上居中的微信登录窗口
+    """
+    image = desktop(seed)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((490, 180, 790, 620), fill=(255, 255, 255))
+    draw.rectangle((560, 260, 720, 420), fill=(30, 30, 30))
+    draw.rectangle((540, 500, 740, 540), fill=(7, 193, 96))
+    return image
+
+def _noise(image, seed):
+    if not seed:
+        return image
+    rng = np.random.default_rng(seed)
+    pixels = np.asarray(image, dtype=np.int16) + rng.integers(-6, 7, size=(SIZE[1], SIZE[0], 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+def build_index():
+    index = SceneIndex()
+    index.add("desktop", desktop())
+    index.add("wechat_main", wechat_main())
+    index.add("wechat_login", login_window())
+    return index
+
+def test_empty_index_matches_nothing():
+    assert SceneIndex().match(desktop()) == (None, 1.0)
+
+def test_fingerprint_shape():
+    dhash, hist = compute_fingerprint(desktop())
+    assert dhash.shape == (64,) and dhash.dtype == bool
+    assert hist.shape == (64,) and abs(float(hist.sum()) - 1.0) < 1e-5
+
+def test_same_scene_with_small_changes_matches():
+    index = build_index()
+    for label, image in (("desktop", desktop(seed=1)),
+                         ("wechat_main", wechat_main(seed=2, selected=5)),
+                         ("wechat_login", login_window(seed=3))):
+        matched, distance = index.match(image)
+        assert matched == label
+        assert distance <= SCENE_MATCH_THRESHOLD, f"{label} 距离 {distance:.3f}"
+
+def test_scaled_screenshot_matches():
+    matched, distance = build_index().match(wechat_main().resize((1920, 1200), Image.BILINEAR))
+    assert matched == "wechat_main" and distance <= SCENE_MATCH_THRESHOLD
+
+def test_different_scene_misses():
+    index = SceneIndex()
+    index.add("desktop", desktop())
+    # 白色背景的未知界面与桌面布局和配色都不同
+    unknown = Image.new("RGB", SIZE, (255, 255, 255))
+    ImageDraw.Draw(unknown).rectangle((200, 100, 1000, 700), fill=(20, 120, 220))
+    _, distance = index.match(unknown)
+    assert distance > SCENE_MATCH_THRESHOLD
+    _, distance = index.match(wechat_main())
+    assert distance > SCENE_MATCH_THRESHOLD
+
+def test_save_and_load_keep_matches(tmp_path):
+    path = str(tmp_path / "scenes" / "scene_index.npz")
+    build_index().save(path)
+    loaded = SceneIndex.load(path)
+    assert loaded.labels == ["desktop", "wechat_main", "wechat_login"]
+    assert loaded.match(login_window(seed=4))[0] == "wechat_login"
+
+def test_classify_scene_applies_threshold(monkeypatch):
+    monkeypatch.setattr(scene_index, "_scene_index", build_index())
+
+    def encode(image):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+    result = classify_scene(encode(wechat_main(seed=5)))
+    assert result["label"] == "wechat_main" and result["distance"] <= SCENE_MATCH_THRESHOLD
+    unknown = Image.new("RGB", SIZE, (255, 255, 255))
+    ImageDraw.Draw(unknown).ellipse((300, 100, 900, 700), fill=(200, 40, 40))
+    assert classify_scene(encode(unknown)) is None
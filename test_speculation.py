@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+推测执行测试 - 检查轨迹缓存的记录、删除和压缩，截图指纹的命中和未命中阈值，
+以及带坐标的操作在坐标处内容变化时不使用缓存的分析结果
+
+用法:
+    python -m pytest test_speculation.py
+"""
+
+import os
+import sys
+import io
+import json
+import base64
+
+from PIL import Image, ImageDraw, ImageFont
+
+# 将项目根目录添加到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app.utils.scene_index import compute_fingerprint
+from app.utils.speculation import TrajectoryStore, Speculator, trajectory_key, step_points
+
+SIZE = (1280, 800)
+TASK_CONTEXT = {"instruction": "给Bob发消息说你好", "operation_type": "mouse", "steps_executed": 1,
+                "last_action": {"type": "keyboard", "action": "hotkey", "value": "ctrl+f"}}
+
+CLICK_ANALYSIS = {
+    "status": "进行中",
+    "environment_ready": True,
+    "current_scene": "微信主界面",
+    "steps": [{"description": "点击会话列表第一行", "type": "mouse", "action": "click", "x": 190, "y": 96}],
+}
+KEYBOARD_ANALYSIS = dict(CLICK_ANALYSIS, steps=[
+    {"description": "打开搜索", "type": "keyboard", "action": "hotkey", "value": "ctrl+f"}
+])
+
+def wechat_main(names=("Bob", "Alice", "Team A"), background=(245, 245, 245)):
+    """
+    合成的微信主界面，会话列表每行一个联系人名称
+    """
+    image = Image.new("RGB", SIZE, background)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 60, SIZE[1]), fill=(46, 46, 46))
+    draw.rectangle((60, 0, 320, SIZE[1]), fill=(230, 230, 230))
+    font = ImageFont.load_default()
+    for row, name in enumerate(names):
+        top = 64 + row * 64
+        draw.rectangle((72, top + 10, 116, top + 54), fill=(80, 160, 90))
+        draw.text((130, top + 24), name, fill=(20, 20, 20), font=font)
+    draw.rectangle((320, SIZE[1] - 160, SIZE[0], SIZE[1]), fill=(255, 255, 255))
+    return image
+
+def encode(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+def cached_store(analysis, image):
+    store = TrajectoryStore()
+    assert store.record(trajectory_key(TASK_CONTEXT), compute_fingerprint(image), analysis, image)
+    return store
+
+def test_step_points():
+    assert step_points(CLICK_ANALYSIS["steps"]) == [(190, 96)]
+    assert step_points([{"type": "mouse", "action": "drag", "x": 1, "y": 2, "end_x": 3, "end_y": 4}]) == [(1, 2), (3, 4)]
+    assert step_points(KEYBOARD_ANALYSIS["steps"]) == []
+    assert step_points([{"type": "mouse", "action": "click", "x": True, "y": 2}]) == []
+
+def test_same_screen_hits():
+    image = wechat_main()
+    speculator = Speculator(cached_store(CLICK_ANALYSIS, image))
+    analysis = speculator.lookup(encode(image), TASK_CONTEXT)
+    assert analysis["speculative"] is True
+    assert analysis["steps"] == CLICK_ANALYSIS["steps"]
+
+def test_different_screen_misses_on_fingerprint():
+    speculator = Speculator(cached_store(CLICK_ANALYSIS, wechat_main()))
+    desktop = Image.new("RGB", SIZE, (30, 90, 160))
+    assert speculator.lookup(encode(desktop), TASK_CONTEXT) is None
+
+def test_other_position_has_no_candidates():
+    speculator = Speculator(cached_store(CLICK_ANALYSIS, wechat_main()))
+    assert speculator.lookup(encode(wechat_main()), dict(TASK_CONTEXT, steps_executed=2)) is None
+
+def test_changed_click_target_is_not_reused():
+    # 第一行从Bob变成了Rob：整屏指纹几乎不变，但点击坐标处的内容不同
+    speculator = Speculator(cached_store(CLICK_ANALYSIS, wechat_main()))
+    moved = wechat_main(names=("Rob", "Alice", "Team A"))
+    assert speculator.lookup(encode(moved), TASK_CONTEXT) is None
+
+def test_keyboard_steps_do_not_need_regions():
+    speculator = Speculator(cached_store(KEYBOARD_ANALYSIS, wechat_main()))
+    analysis = speculator.lookup(encode(wechat_main(names=("Rob", "Alice", "Team A"))), TASK_CONTEXT)
+    assert analysis is not None and analysis["steps"] == KEYBOARD_ANALYSIS["steps"]
+
+def test_click_steps_are_not_cached_without_image():
+    store = TrajectoryStore()
+    image = wechat_main()
+    assert not store.record(trajectory_key(TASK_CONTEXT), compute_fingerprint(image), CLICK_ANALYSIS)
+    assert store.candidates(trajectory_key(TASK_CONTEXT)) == []
+
+def test_commit_and_reject():
+    store = TrajectoryStore()
+    image = wechat_main()
+    speculator = Speculator(store)
+    assert speculator.lookup(encode(image), TASK_CONTEXT) is None
+    speculator.commit(CLICK_ANALYSIS)
+    assert len(store.candidates(trajectory_key(TASK_CONTEXT))) == 1
+    # 使用缓存结果的操作执行失败时删除该记录
+    assert speculator.lookup(encode(image), TASK_CONTEXT) is not None
+    speculator.reject()
+    assert store.candidates(trajectory_key(TASK_CONTEXT)) == []
+
+def test_unfinished_analysis_is_not_committed():
+    store = TrajectoryStore()
+    speculator = Speculator(store)
+    speculator.lookup(encode(wechat_main()), TASK_CONTEXT)
+    speculator.commit(dict(CLICK_ANALYSIS, status="已完成"))
+    assert store.candidates(trajectory_key(TASK_CONTEXT)) == []
+
+def test_store_persists_and_compacts(tmp_path):
+    path = str(tmp_path / "trajectories.jsonl")
+    key = trajectory_key(TASK_CONTEXT)
+    store = TrajectoryStore(path, max_entries=2)
+    images = [wechat_main(background=(245 - 40 * i, 245, 245)) for i in range(3)]
+    for image in images:
+        store.record(key, compute_fingerprint(image), CLICK_ANALYSIS, image)
+    store.discard(store.candidates(key)[0])
+    # 被替换和删除的记录留在文件中，重新加载时只保留最新状态
+    loaded = TrajectoryStore(path, max_entries=2)
+    assert [entry["fingerprint"] for entry in loaded.candidates(key)] == \
+           [entry["fingerprint"] for entry in store.candidates(key)]
+    assert len(loaded.candidates(key)) == 1
+
+    for i in range(120):
+        store.record(trajectory_key(TASK_CONTEXT, steps_executed=i), compute_fingerprint(images[0]),
+                     KEYBOARD_ANALYSIS)
+        store.discard(store.candidates(trajectory_key(TASK_CONTEXT, steps_executed=i))[0])
+    TrajectoryStore(path)
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 1 and lines[0]["key"] == key